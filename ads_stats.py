@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Per-module and per-symbol accounting of the ADS round trips
+
+  python ads_stats.py                       # modules and symbols by round-trip time spent
+  python ads_stats.py --sort p99 --limit 20 --url http://localhost:5000
+
+Every ADS call is accounted to the module that issued it and to every symbol
+it carried. A call's round-trip time is split evenly between its symbols for
+their time spent, while their latency percentiles are those of the whole
+calls they were part of.
+"""
+
+import argparse
+import ctypes
+import json
+import math
+import threading
+import urllib.request
+
+# log-spaced latency buckets, four per octave from 1 us, percentiles are the
+# bucket's upper bound and so at most 19 % high
+bucket_base = 1e-6
+buckets_per_octave = 4
+bucket_count = 120
+
+def bucket_of(seconds):
+  if seconds <= bucket_base:
+    return 0
+  return min(bucket_count - 1, int(math.log2(seconds / bucket_base) * buckets_per_octave) + 1)
+
+def bucket_bound(index):
+  return bucket_base * 2 ** (index / buckets_per_octave)
+
+def estimated_size(value, plc_datatype=None):
+  """Bytes of a value on the wire, from its PLC datatype if known"""
+  if plc_datatype is not None:
+    try:
+      return ctypes.sizeof(plc_datatype)
+    except TypeError:
+      pass
+  if isinstance(value, bool):
+    return 1
+  if isinstance(value, int):
+    return 2 # INT
+  if isinstance(value, float):
+    return 4 # REAL
+  if isinstance(value, str):
+    return len(value) + 1
+  return 0
+
+class CallStats:
+  def __init__(self):
+    self.calls = 0
+    self.seconds = 0.0 # round-trip time accounted to this key
+    self.max = 0.0
+    self.bytes = 0
+    self.errors = {} # ADS error code or write result -> count
+    self.buckets = [0] * bucket_count
+
+  def add(self, seconds, bucket, nbytes, error=None):
+    self.calls += 1
+    self.seconds += seconds
+    if seconds > self.max:
+      self.max = seconds
+    self.bytes += nbytes
+    self.buckets[bucket] += 1
+    if error is not None:
+      self.errors[error] = self.errors.get(error, 0) + 1
+
+  def merge(self, other, share=1.0, nbytes=None):
+    self.calls += other.calls
+    self.seconds += other.seconds * share
+    self.max = max(self.max, other.max)
+    self.bytes += other.bytes if nbytes is None else nbytes
+    self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+    for error, count in other.errors.items():
+      self.errors[error] = self.errors.get(error, 0) + count
+
+  def percentile(self, q):
+    rank = q * self.calls
+    cumulative = 0
+    for index, count in enumerate(self.buckets):
+      cumulative += count
+      if cumulative >= rank and count:
+        return min(bucket_bound(index), self.max)
+    return None
+
+  def as_dict(self):
+    return {
+      'calls': self.calls,
+      'seconds': self.seconds,
+      'mean': self.seconds / self.calls if self.calls else None,
+      'p50': self.percentile(0.5),
+      'p90': self.percentile(0.9),
+      'p99': self.percentile(0.99),
+      'max': self.max,
+      'bytes': self.bytes,
+      'errors': {str(code): count for code, count in self.errors.items()},
+    }
+
+class SymbolListStats(CallStats):
+  """Calls of one method with the same list of symbols, like the repeated sum-reads of a tick"""
+
+  def __init__(self):
+    super().__init__()
+    self.sizes = {} # symbol -> bytes per call, known after the first successful call
+    self.call_bytes = None
+    self.symbol_errors = {} # symbol -> {write result -> count}
+
+class AdsStats:
+  """In-process store of ADS call statistics per module, method and symbol
+
+  Calls are accounted per distinct symbol list and only spread over the
+  symbols when a snapshot is taken, so a sum-read of many symbols costs
+  about as much to record as a single read.
+  """
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.modules = {} # owner -> CallStats
+    self.calls = {} # (connection, method, symbols) -> SymbolListStats
+
+  def record(self, connection, owner, method, seconds, symbols, sizes, error=None, symbol_errors=None):
+    """Account one call; symbols is a tuple, sizes a function returning their bytes, called once per symbol list"""
+    bucket = bucket_of(seconds)
+    key = (connection, method, symbols)
+    with self.lock:
+      stats = self.calls.get(key)
+      if stats is None:
+        stats = self.calls[key] = SymbolListStats()
+      if error is None and stats.call_bytes is None:
+        stats.sizes = sizes()
+        stats.call_bytes = sum(stats.sizes.values())
+      nbytes = stats.call_bytes if error is None else 0
+      stats.add(seconds, bucket, nbytes, error)
+      for symbol, code in (symbol_errors or {}).items():
+        counts = stats.symbol_errors.setdefault(symbol, {})
+        counts[code] = counts.get(code, 0) + 1
+      module = self.modules.get(owner or '(shared)')
+      if module is None:
+        module = self.modules[owner or '(shared)'] = CallStats()
+      module.add(seconds, bucket, nbytes, error)
+
+  def snapshot(self):
+    with self.lock:
+      modules = {owner: stats.as_dict() for owner, stats in self.modules.items()}
+      methods = {}
+      symbols = {}
+      for (connection, method, names), stats in self.calls.items():
+        methods.setdefault((connection, method), CallStats()).merge(stats)
+        for name in names:
+          symbol = symbols.setdefault((connection, name), CallStats())
+          symbol.merge(stats, 1 / len(names), stats.sizes.get(name, 0) * (stats.calls - sum(stats.errors.values())))
+          for code, count in stats.symbol_errors.get(name, {}).items():
+            symbol.errors[code] = symbol.errors.get(code, 0) + count
+    return {
+      'modules': modules,
+      'methods': [{'connection': connection, 'method': method} | stats.as_dict() for (connection, method), stats in methods.items()],
+      'symbols': [{'connection': connection, 'symbol': symbol} | stats.as_dict() for (connection, symbol), stats in symbols.items()],
+    }
+
+  def reset(self):
+    with self.lock:
+      self.modules = {}
+      self.calls = {}
+
+ads_stats = AdsStats()
+
+def format_seconds(seconds):
+  if seconds is None:
+    return '-'
+  if seconds < 1e-3:
+    return f'{seconds * 1e6:.0f}us'
+  if seconds < 1:
+    return f'{seconds * 1e3:.1f}ms'
+  return f'{seconds:.2f}s'
+
+def print_table(title, rows, key_names, sort, limit):
+  rows = sorted(rows, key=lambda row: row[sort] or 0, reverse=True)[:limit]
+  print(f'{title}:')
+  print('  ' + ' '.join(f'{name:>9}' for name in ['calls', 'time', 'p50', 'p90', 'p99', 'max', 'bytes', 'errors']) + '  ' + key_names)
+  for row in rows:
+    errors = sum(row['errors'].values())
+    print(f"  {row['calls']:>9} {format_seconds(row['seconds']):>9} {format_seconds(row['p50']):>9} {format_seconds(row['p90']):>9}"
+          f" {format_seconds(row['p99']):>9} {format_seconds(row['max']):>9} {row['bytes']:>9} {errors:>9}  "
+          + ' '.join(str(row[key]) for key in key_names.split()))
+  print()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--url', default='http://localhost:5000', help='web API of the running service')
+  parser.add_argument('--sort', choices=['seconds', 'calls', 'p50', 'p90', 'p99', 'max', 'bytes'], default='seconds')
+  parser.add_argument('--limit', type=int, default=30, help='symbols to show')
+  parser.add_argument('--json', action='store_true', help='print the raw statistics')
+  args = parser.parse_args()
+
+  with urllib.request.urlopen(args.url.rstrip('/') + '/api/ads/stats') as response:
+    stats = json.load(response)
+  if args.json:
+    print(json.dumps(stats, indent=2))
+    return 0
+  print_table('Modules', [{'module': owner} | row for owner, row in stats['modules'].items()], 'module', args.sort, None)
+  print_table('Methods', stats['methods'], 'connection method', args.sort, None)
+  print_table('Symbols', stats['symbols'], 'connection symbol', args.sort, args.limit)
+  return 0
+
+if __name__ == '__main__':
+  exit(main())
@@ -1,54 +1,108 @@
+import asyncio
+import copy
 import pyads
 import threading
 import json
 import os
-import datetime
+import time
+import clock
+import metrics
+import parameter_store
+import plc_trace
 from abc import ABC, abstractmethod
+from plc_pool import plc_pool
+from write_buffer import WriteBuffer
+
+cycle_seconds = metrics.registry.histogram('control_cycle_seconds', 'Duration of the control cycle phases', ['module', 'phase'])
+cycle_exceptions = metrics.registry.counter('control_cycle_exceptions', 'Control cycles that ended in an exception', ['module', 'kind'])
 
 class BaseControlModule(ABC):
-  def __init__(self, plc_ams_net_id, plc_ams_port, param_filename, param_dir=None):
+  def __init__(self, plc_ams_net_id, plc_ams_port, param_filename, param_dir=None, write_refresh_interval=60):
     self.plc_ams_net_id = plc_ams_net_id
     self.plc_ams_port = plc_ams_port
     self.plc = None
+    # held while parameters are applied and during the control action, never during PLC I/O
     self.parameter_lock = threading.Lock()
+    self.snapshot = None # parameters as of the last change, replaced as a whole, never modified
     self.param_filename = param_filename
-    self.param_dir = param_dir or os.path.dirname(__file__)
-    self.PARAMS_FILE = os.path.join(self.param_dir, self.param_filename)
+    self.param_dir = param_dir or os.getenv('PARAM_DIR') or os.path.dirname(__file__)
+    self.PARAMS_FILE = os.path.join(self.param_dir, self.param_filename) # before parameters.json, read once to migrate
+    self.parameter_store = parameter_store.open_store(self.param_dir)
+    # key in parameters.json and label of metrics and traces: the python module
+    # name, which is '__main__' when a module runs on its own, so it is taken
+    # from the parameter file name instead
+    self.module_name = os.path.splitext(param_filename)[0].removesuffix('_params')
     self.enabled = True
-    self.plc = pyads.Connection(self.plc_ams_net_id, self.plc_ams_port)
-    self.plc.open()
+    self.values = {}
+    self.subscribed = False
+    self.trace_inputs = None
+    self.plc = plc_pool.acquire(self.plc_ams_net_id, self.plc_ams_port, type(self).__name__)
+    if plc_trace.recorder is not None:
+      self.plc = plc_trace.TracingConnection(self.plc)
+    self.writes = WriteBuffer(self.plc, write_refresh_interval)
+    self.cycle_seconds = {phase: cycle_seconds.labels(self.module_name, phase) for phase in ('read', 'compute', 'write', 'total')}
+    self.cycle_exceptions = {kind: cycle_exceptions.labels(self.module_name, kind) for kind in ('ads', 'other')}
 
-  def reopen_plc(self):
-    try:
-      self.plc.close()
-    except Exception:
-      pass
-    self.plc.open()
+  def reopen_plc(self, generation=None):
+    self.writes.invalidate()
+    self.plc.reconnect(generation)
 
   def load_parameters(self):
-    try:
-      with open(self.PARAMS_FILE, 'r') as f:
-        params = json.load(f)
-        self.set_parameters(params)
-    except FileNotFoundError:
+    params = self.parameter_store.get(self.module_name)
+    if params is None:
+      try:
+        with open(self.PARAMS_FILE, 'r') as f:
+          params = json.load(f)
+      except FileNotFoundError:
+        pass
+    if params is not None:
+      self.set_parameters(params)
+    else:
       self.save_parameters()
 
   def save_parameters(self):
-    params = self.get_parameters()
-    with open(self.PARAMS_FILE, 'w') as f:
-      json.dump(params, f)
+    # written to disk behind, see ParameterStore
+    self.parameter_store.set(self.module_name, self.get_parameters())
+
+  def rollback_parameters(self, version):
+    """Set the parameters saved as the given journal version again; False if it is not in the journal"""
+    entry = self.parameter_store.entry(self.module_name, version)
+    if entry is None:
+      return False
+    self.set_parameters(entry['parameters'])
+    return True
+
+  @property
+  def enabled(self):
+    return self._enabled
+
+  @enabled.setter
+  def enabled(self, enabled):
+    self._enabled = enabled
+    if self.snapshot is not None:
+      self.snapshot = self.snapshot | {'enabled': enabled}
 
   def set_parameters(self, params):
     with self.parameter_lock:
       self.enabled = params.get('enabled', self.enabled)
       self._set_module_parameters(params)
+      self.snapshot = self._parameters()
+      if plc_trace.recorder is not None:
+        plc_trace.recorder.parameters(self, clock.now(), self.snapshot)
     self.save_parameters()
 
   def get_parameters(self):
-    with self.parameter_lock:
-      params = {'enabled': self.enabled}
-      params.update(self._get_module_parameters())
-      return params
+    """The current parameters, without waiting for a running cycle"""
+    snapshot = self.snapshot
+    if snapshot is None:
+      with self.parameter_lock:
+        snapshot = self.snapshot = self._parameters()
+    return copy.deepcopy(snapshot)
+
+  def _parameters(self):
+    params = {'enabled': self.enabled}
+    params.update(self._get_module_parameters())
+    return params
 
   @abstractmethod
   def _set_module_parameters(self, params):
@@ -59,26 +113,118 @@ class BaseControlModule(ABC):
     pass
 
   def control_loop(self):
+    started = time.perf_counter()
+    now = clock.now()
+    diagnostics = self._control_cycle(now)
+    self._cycle_done(now, diagnostics, started)
+    return diagnostics
+
+  async def control_loop_async(self, executor=None):
+    """control_loop() for an event loop: the PLC I/O runs in the executor, the control action on the loop"""
+    started = time.perf_counter()
+    now = clock.now()
+    loop = asyncio.get_running_loop()
+    diagnostics = await self._control_cycle_async(now, lambda func, *args: loop.run_in_executor(executor, func, *args))
+    self._cycle_done(now, diagnostics, started)
+    return diagnostics
+
+  def _cycle_done(self, now, diagnostics, started):
+    seconds = time.perf_counter() - started
+    self.cycle_seconds['total'].observe(seconds)
+    if plc_trace.recorder is not None:
+      plc_trace.recorder.cycle(self, now, diagnostics, seconds)
+
+  def _cycle_start(self, now):
+    diagnostics = {}
+    diagnostics['timestamp'] = now.replace(microsecond=0).isoformat()
     with self.parameter_lock:
-      if not self.plc.is_open:
-        self.plc.open()
-      diagnostics = {}
-      now = datetime.datetime.now()
-      diagnostics['timestamp'] = now.replace(microsecond=0).isoformat()
       if not self.enabled:
         diagnostics['disabled'] = True
-        return diagnostics
-      try:
-        diagnostics |= self._control_action(now)
-      except pyads.ADSError as e:
-        diagnostics['exception'] = repr(e)
-        self.plc.close()
-        self.reopen_plc()
-      except Exception as e:
-        diagnostics['exception'] = repr(e)
-        print(e)
+      self._traced_inputs(now)
+    return diagnostics
+
+  def _control_cycle(self, now):
+    generation = self.plc.generation
+    diagnostics = self._cycle_start(now)
+    if 'disabled' in diagnostics:
       return diagnostics
+    try:
+      started = time.perf_counter()
+      self._read()
+      read = time.perf_counter()
+      diagnostics |= self._locked_control_action(now)
+      computed = time.perf_counter()
+      self.writes.commit(self.values)
+      self._observe_phases(started, read, computed)
+    except Exception as e:
+      self._cycle_failed(diagnostics, e, generation)
+    return diagnostics
+
+  async def _control_cycle_async(self, now, io):
+    generation = self.plc.generation
+    diagnostics = self._cycle_start(now)
+    if 'disabled' in diagnostics:
+      return diagnostics
+    try:
+      started = time.perf_counter()
+      await io(self._read)
+      read = time.perf_counter()
+      diagnostics |= await self._control_action_async(now)
+      computed = time.perf_counter()
+      await io(self.writes.commit, self.values)
+      self._observe_phases(started, read, computed)
+    except Exception as e:
+      # reconnecting is PLC I/O as well
+      await io(self._cycle_failed, diagnostics, e, generation)
+    return diagnostics
+
+  def _locked_control_action(self, now):
+    # parameters may have changed during the read, disabling the module as well
+    with self.parameter_lock:
+      self._traced_inputs(now)
+      if not self.enabled:
+        return {'disabled': True}
+      return self._control_action(now)
+
+  def _traced_inputs(self, now):
+    # parameter changes and MQTT messages the cycle has seen so far, for
+    # replaying the trace in order; called with parameter_lock held
+    if plc_trace.recorder is not None:
+      self.trace_inputs = plc_trace.recorder.inputs(self, now)
+
+  def _read(self):
+    if not self.subscribed:
+      self.plc.subscribe(self.notification_symbols())
+      self.subscribed = True
+    self.values = self.plc.read_planned(self.read_symbols())
+
+  def _observe_phases(self, started, read, computed):
+    self.cycle_seconds['read'].observe(read - started)
+    self.cycle_seconds['compute'].observe(computed - read)
+    self.cycle_seconds['write'].observe(time.perf_counter() - computed)
+
+  def _cycle_failed(self, diagnostics, e, generation):
+    diagnostics['exception'] = repr(e)
+    if isinstance(e, pyads.ADSError):
+      self.cycle_exceptions['ads'].inc()
+      self.reopen_plc(generation)
+    else:
+      self.cycle_exceptions['other'].inc()
+      self.writes.discard()
+      print(e)
+
+  def read_symbols(self):
+    return []
+
+  def notification_symbols(self):
+    return []
 
   @abstractmethod
   def _control_action(self, now):
     pass
+
+  async def _control_action_async(self, now):
+    # modules only do PLC I/O through self.values and self.writes, so their
+    # control action runs unchanged on the loop; overrides that await other
+    # I/O hold parameter_lock only around the parts that use parameters
+    return self._locked_control_action(now)
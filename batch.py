@@ -0,0 +1,97 @@
+import numpy as np
+
+# NumPy versions of the operators in ema.py, op.py, pid.py and pwm.py. Each
+# update takes one sample for all parameter sets at once: parameters,
+# values and state broadcast against each other, dt is shared. They give the
+# same results as the scalar classes up to floating point rounding (NumPy's
+# vectorized power is not bit-identical to Python's), PWM also up to the
+# microsecond resolution of the datetimes used there.
+
+class BatchEMA:
+  def __init__(self, decay_factor):
+    self.decay_factor = np.asarray(decay_factor, dtype=float)
+    self.last = None
+
+  def update(self, value, dt):
+    value = np.asarray(value, dtype=float)
+    if self.last is None:
+      self.last = np.broadcast_to(value, np.broadcast(value, self.decay_factor).shape).copy()
+      return self.last
+    last_weight = self.decay_factor ** dt
+    self.last = last_weight * self.last + (1 - last_weight) * value
+    return self.last
+
+class BatchFD1:
+  def __init__(self):
+    self.last = None
+
+  def update(self, value, dt):
+    value = np.asarray(value, dtype=float)
+    if self.last is None:
+      self.last = value
+      return np.zeros_like(value)
+
+    result = (value - self.last) / dt
+    self.last = value
+    return result
+
+class BatchPID:
+  def __init__(self, Kp, Ki, Kd, integration_decay_factor):
+    self.Kp = np.asarray(Kp, dtype=float)
+    self.Ki = np.asarray(Ki, dtype=float)
+    self.Kd = np.asarray(Kd, dtype=float)
+    self.op_I = BatchEMA(integration_decay_factor)
+    self.op_D = BatchFD1()
+    self.error = None
+    self.I_error = None
+    self.D_error = None
+    self.P = None
+    self.I = None
+    self.D = None
+
+  def update(self, error, dt):
+    self.error = np.asarray(error, dtype=float)
+    self.I_error = self.op_I.update(error, dt)
+    self.D_error = self.op_D.update(error, dt)
+
+    self.P = self.Kp * self.error
+    self.I = self.Ki * self.I_error
+    self.D = self.Kd * self.D_error
+
+    return self.P + self.I + self.D
+
+class BatchPWM:
+  """PWM on a time axis in seconds instead of datetimes"""
+
+  def __init__(self, period=300):
+    self.period = np.asarray(period, dtype=float)
+    self.control = np.zeros(())
+    self.cycle_start = None
+    self.elapsed = None
+
+  def set_control(self, control):
+    self.control = np.asarray(control, dtype=float)
+
+  def update(self, now, active=None):
+    """active selects the parameter sets that call update in this sample (default all);
+    like PWM, a cycle starts on the first call"""
+    shape = np.broadcast(self.period, self.control).shape
+    if self.cycle_start is None:
+      self.cycle_start = np.full(shape, np.nan)
+    active = np.broadcast_to(True if active is None else active, shape)
+    started = ~np.isnan(self.cycle_start)
+    with np.errstate(invalid='ignore'):
+      continued = now - (now - self.cycle_start) % self.period
+    self.cycle_start = np.where(active, np.where(started, continued, now), self.cycle_start)
+    self.elapsed = now - self.cycle_start
+    on_time = self.control * self.period
+    return self.elapsed < on_time
+
+def scan(operator, values, dts):
+  """Run operator.update over a series of samples, returning one row per sample
+
+  values has the samples along the first axis, dts holds the seconds since the
+  previous sample (the first entry is not used by a fresh operator).
+  """
+  rows = [operator.update(value, dt) for value, dt in zip(values, dts)]
+  return np.stack(np.broadcast_arrays(*rows))
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Measure the cost of control cycles and of the diagnostics history
+
+  python benchmark.py --latency 0.002 --output bench.json
+
+Runs every module's control_loop() against the fake PLC with the given
+latency per ADS round trip and reports wall time, ADS calls, allocated
+memory and diagnostics serialization per cycle. Then fills
+ControllerManager histories of 100, 1000 and 100k entries and times
+add_diagnostic_entry and get_diagnostics. Compare the JSON of two runs to
+spot regressions.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+modules = ['return_mixin', 'pk_onoff', 'bwk_onoff', 'bhkw_onoff', 'tww_11', 'feed_121517', 'restart_wp_11']
+history_sizes = [100, 1000, 100000]
+
+def summary(values):
+  values = sorted(values)
+  return {
+    'mean': statistics.fmean(values),
+    'median': values[len(values) // 2],
+    'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+    'max': values[-1],
+  }
+
+def bench_cycles(controller, simulated_clock, model, interval, cycles, warmup):
+  connection = controller.plc.shared.connection
+  for _ in range(warmup):
+    controller.control_loop()
+    model.step(interval)
+    simulated_clock.advance(interval)
+
+  wall, calls, serialize, size, peak, retained, entries = [], [], [], [], [], [], []
+  for _ in range(cycles):
+    before = connection.calls
+    started = time.perf_counter()
+    diagnostics = controller.control_loop()
+    wall.append(time.perf_counter() - started)
+    entries.append(diagnostics)
+    calls.append(connection.calls - before)
+    started = time.perf_counter()
+    data = json.dumps(diagnostics)
+    serialize.append(time.perf_counter() - started)
+    size.append(len(data))
+    model.step(interval)
+    simulated_clock.advance(interval)
+
+  # separately, tracing allocations slows the cycle down
+  tracemalloc.start()
+  for _ in range(min(cycles, 100)):
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    controller.control_loop()
+    after, top = tracemalloc.get_traced_memory()
+    peak.append(top - current)
+    retained.append(after - current)
+    model.step(interval)
+    simulated_clock.advance(interval)
+  tracemalloc.stop()
+
+  return entries, {
+    'wall_ms': {k: v * 1000 for k, v in summary(wall).items()},
+    'ads_calls': summary(calls),
+    'alloc_peak_bytes': summary(peak),
+    'retained_bytes': summary(retained),
+    'serialize_us': {k: v * 1e6 for k, v in summary(serialize).items()},
+    'diagnostics_bytes': summary(size),
+  }
+
+def timed(func, repeat):
+  started = time.perf_counter()
+  for _ in range(repeat):
+    func()
+  return (time.perf_counter() - started) / repeat
+
+def bench_history(entries, size):
+  from web_api import ControllerManager, ControllerConfig
+  manager = ControllerManager()
+  manager.register_controller(ControllerConfig(name='bench', title='bench', module=None, max_diagnostics=size))
+  started = time.perf_counter()
+  for i in range(size):
+    manager.add_diagnostic_entry('bench', entries[i % len(entries)])
+  fill = (time.perf_counter() - started) / size
+  buffer = manager.diagnostics['bench']
+  last = buffer.last_seq
+  repeat = max(1, 10000 // size)
+  return {
+    'entries': size,
+    'add_us': fill * 1e6,
+    'get_all_ms': timed(lambda: manager.get_diagnostics('bench'), repeat) * 1000,
+    'get_since_last_10_us': timed(lambda: manager.get_diagnostics_since('bench', last - 10), 1000) * 1e6,
+    'buffer_bytes': buffer.nbytes(),
+  }
+
+def git_revision():
+  try:
+    return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+  except Exception:
+    return None
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--latency', type=float, default=0.0, help='seconds per ADS round trip')
+  parser.add_argument('--cycles', type=int, default=200)
+  parser.add_argument('--warmup', type=int, default=20)
+  parser.add_argument('--modules', default=','.join(modules))
+  parser.add_argument('--history-module', default='return_mixin', help='module whose diagnostics fill the histories')
+  parser.add_argument('--output', help='write the results to this JSON file')
+  args = parser.parse_args()
+
+  import simulate
+  simulated_clock, model = simulate.setup(datetime.datetime(2026, 1, 15, 8, 0), latency=args.latency)
+  names = args.modules.split(',')
+  controllers = simulate.load_controllers(names)
+  for controller in controllers.values():
+    controller.enabled = True
+
+  results = {
+    'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+    'revision': git_revision(),
+    'python': sys.version.split()[0],
+    'platform': platform.platform(),
+    'latency': args.latency,
+    'cycles': args.cycles,
+    'control_loop': {},
+    'history_module': args.history_module,
+    'history': [],
+  }
+
+  entries = None
+  for name, controller in controllers.items():
+    cycle_entries, result = bench_cycles(controller, simulated_clock, model, simulate.intervals.get(name, 30), args.cycles, args.warmup)
+    results['control_loop'][name] = result
+    if name == args.history_module or entries is None:
+      entries = cycle_entries
+    print(f"{name:14} {result['wall_ms']['median']:8.3f} ms  {result['ads_calls']['mean']:5.2f} calls"
+          f"  {result['alloc_peak_bytes']['median']:8.0f} B peak  {result['serialize_us']['median']:6.1f} us json")
+
+  for size in history_sizes:
+    result = bench_history(entries, size)
+    results['history'].append(result)
+    print(f"history {size:>7}  add {result['add_us']:6.1f} us  get all {result['get_all_ms']:8.2f} ms"
+          f"  since last-10 {result['get_since_last_10_us']:6.1f} us  {result['buffer_bytes'] / 1024:8.0f} KiB")
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=2)
+  return 0
+
+if __name__ == '__main__':
+  exit(main())
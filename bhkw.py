@@ -0,0 +1,24 @@
+import control
+
+control_bhkw_name = 'PRG_WV.FB_BHKW.BWS.iStellung'
+
+class BHKW:
+  symbols = [control_bhkw_name]
+
+  def __init__(self):
+    self.control = None
+
+  def read(self, state):
+    self.control = state[control_bhkw_name]
+
+  def diagnostics(self):
+    return {
+      'control': control.control_str(self.control),
+    }
+
+  def set_control(self, new_control, writes):
+    if (self.control == new_control):
+      return False
+    writes.write(control_bhkw_name, new_control)
+    self.control = new_control
+    return True
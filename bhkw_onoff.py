@@ -5,20 +5,19 @@ import pyads
 import datetime
 import time
 from suntimes import SunTimes
+import clock
 import control
-from pk import PK
 from buffer_tank import BufferTank
 from base_control_module import BaseControlModule
+from plant_state import PlantState, plant_state_for
 
 latitude = 52.371582
 longitude = 12.932913
 altitude = 31
 
-control_bhkw_name = 'PRG_WV.FB_BHKW.BWS.iStellung'
-
 def solar_is_available(now = None, offset = datetime.timedelta(hours=2)):
   if now is None:
-    now = datetime.datetime.now()
+    now = clock.now()
   sun = SunTimes(longitude, latitude, altitude)
   now = now.astimezone()
   sunrise = sun.riselocal(now)
@@ -32,8 +31,8 @@ class BhkwOnOff(BaseControlModule):
       plc_ams_port=pyads.PORT_TC3PLC1,
       param_filename='bhkw_onoff_params.json'
     )
-    self.buffer_tank = BufferTank(self.plc, 64, 58)
-    self.last_update = None
+    self.plant = plant_state_for(self.plc)
+    self.buffer_tank = BufferTank(self.plant, 64, 58)
 
   def _set_module_parameters(self, params):
     self.buffer_tank.set_parameters(params)
@@ -50,36 +49,41 @@ class BhkwOnOff(BaseControlModule):
       return buffer_tank_control
     return current
 
+  def read_symbols(self):
+    return PlantState.symbols
+
+  def notification_symbols(self):
+    return self.read_symbols()
+
   def _control_action(self, now):
     diagnostics = {}
-    dt = (now - self.last_update).total_seconds() if self.last_update else None
-    self.last_update = now
-
-    self.buffer_tank.update(dt)
+    self.plant.update(now, self.values)
     diagnostics |= self.buffer_tank.diagnostics()
 
     solar_available = solar_is_available(now)
     diagnostics['solar_available'] = solar_available
 
-    pk = PK(self.plc)
-    pk.read()
+    pk = self.plant.pk
     diagnostics['pk'] = pk.diagnostics()
 
-    current_bhkw = self.plc.read_by_name(control_bhkw_name)
-    diagnostics['bhkw'] = control.control_str(current_bhkw)
-    new_bhkw = self.determine_control_value(current_bhkw, solar_available, pk.is_producing())
+    bhkw = self.plant.bhkw
+    diagnostics['bhkw'] = control.control_str(bhkw.control)
+    new_bhkw = self.determine_control_value(bhkw.control, solar_available, pk.is_producing())
 
-    if current_bhkw != new_bhkw:
-      self.plc.write_by_name(control_bhkw_name, new_bhkw)
+    if bhkw.set_control(new_bhkw, self.writes):
       diagnostics['control_bhkw'] = control.control_str(new_bhkw)
       return diagnostics
 
     diagnostics['idle'] = True
     return diagnostics
 
-bhkw_onoff = BhkwOnOff()
+def create():
+  controller = BhkwOnOff()
+  controller.load_parameters()
+  return controller
 
 def main(stop_requested):
+  bhkw_onoff = create()
   bhkw_onoff.enabled = True
   while not stop_requested():
     diagnostics = bhkw_onoff.control_loop()
@@ -92,8 +96,6 @@ def main(stop_requested):
       break
   return 0
 
-bhkw_onoff.load_parameters()
-
 if __name__ == '__main__':
   exit(main(lambda: False))
 
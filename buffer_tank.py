@@ -1,47 +1,40 @@
 import control
-from ema import EMA
 
 on1_value_name = 'PRG_HE.FB_Speicher_1_Temp_oben.fOut'
 on2_value_name = 'PRG_HE.FB_Speicher_2_Temp_oben.fOut'
 off1_value_name = 'PRG_HE.FB_Speicher_1_Temp_unten.fOut'
 off2_value_name = 'PRG_HE.FB_Speicher_2_Temp_unten.fOut'
 
+value_names = [on1_value_name, on2_value_name, off1_value_name, off2_value_name]
+
 class BufferTank:
-  def __init__(self, plc, on_threshold, off_threshold):
-    self.plc = plc
+  symbols = value_names
+
+  def __init__(self, plant, on_threshold, off_threshold):
+    self.plant = plant
     self.on_threshold = on_threshold
     self.off_threshold = off_threshold
+    self.decay_factor = 0.5 ** (1/60) # 50% per minute
 
-    self.on1_value = None
-    self.on2_value = None
-    self.off1_value = None
-    self.off2_value = None
+  @property
+  def on_value_ema(self):
+    return self.plant.buffer_tank_emas(self.decay_factor)[0]
 
-    self.on_value_ema = EMA(0.5 ** (1/60)) # 50% per minute
-    self.off_value_ema = EMA(0.5 ** (1/60)) # 50% per minute
+  @property
+  def off_value_ema(self):
+    return self.plant.buffer_tank_emas(self.decay_factor)[1]
 
   def set_parameters(self, params):
     self.on_threshold = params.get('on_threshold', self.on_threshold)
     self.off_threshold = params.get('off_threshold', self.off_threshold)
-    self.on_value_ema.set_parameters(params)
-    self.off_value_ema.set_parameters(params)
+    self.decay_factor = params.get('decay_factor', self.decay_factor)
 
   def parameters(self):
     return {
       'on_threshold': self.on_threshold,
       'off_threshold': self.off_threshold,
-    } | self.on_value_ema.parameters()
-
-  def read(self):
-    self.on1_value = self.plc.read_by_name(on1_value_name)
-    self.on2_value = self.plc.read_by_name(on2_value_name)
-    self.off1_value = self.plc.read_by_name(off1_value_name)
-    self.off2_value = self.plc.read_by_name(off2_value_name)
-
-  def update(self, dt):
-    self.read()
-    self.on_value_ema.update(min(self.on1_value, self.on2_value), dt)
-    self.off_value_ema.update(max(self.off1_value, self.off2_value), dt)
+      'decay_factor': self.decay_factor,
+    }
 
   def diagnostics(self):
     diagnostics = {}
@@ -3,22 +3,23 @@ import control
 control_bwk_name = 'PRG_WV.FB_Brenner.BWS.iStellung'
 
 class BWK:
-  def __init__(self, plc):
-    self.plc = plc
+  symbols = [control_bwk_name]
+
+  def __init__(self):
     self.control = None
 
-  def read(self):
-    self.control = self.plc.read_by_name(control_bwk_name)
+  def read(self, state):
+    self.control = state[control_bwk_name]
 
   def diagnostics(self):
     return {
       'control': control.control_str(self.control),
     }
 
-  def set_control(self, new_control):
+  def set_control(self, new_control, writes):
     if (self.control == new_control):
       return False
-    self.plc.write_by_name(control_bwk_name, new_control)
+    writes.write(control_bwk_name, new_control)
     self.control = new_control
     return True
 
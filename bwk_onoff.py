@@ -5,11 +5,9 @@ import pyads
 import datetime
 import time
 import control
-from bwk import BWK
-from pk import PK
 from base_control_module import BaseControlModule
-from distribution import any_consumer_on
 from buffer_tank import BufferTank
+from plant_state import PlantState, plant_state_for
 
 actual_value_name = 'PRG_HE.FB_Haus_28_42_12_17_15_VL_Temp.fOut'
 
@@ -33,7 +31,8 @@ class BwkOnOff(BaseControlModule):
       plc_ams_port=pyads.PORT_TC3PLC1,
       param_filename='bwk_onoff_params.json'
     )
-    self.buffer_tank = BufferTank(self.plc, 64, 58)
+    self.plant = plant_state_for(self.plc)
+    self.buffer_tank = BufferTank(self.plant, 64, 58)
     self.threshold = 60 # degrees
     self.auto_duration_minutes = 10
 
@@ -55,18 +54,21 @@ class BwkOnOff(BaseControlModule):
       'buffer_tank': self.buffer_tank.parameters()
     }
 
+  def read_symbols(self):
+    return [actual_value_name] + PlantState.symbols
+
+  def notification_symbols(self):
+    return PlantState.symbols
+
   def _control_action(self, now):
-    actual_value = self.plc.read_by_name(actual_value_name)
-    bwk = BWK(self.plc)
-    bwk.read()
-    pk = PK(self.plc)
-    pk.read()
+    actual_value = self.values[actual_value_name]
+    self.plant.update(now, self.values)
+    bwk = self.plant.bwk
+    pk = self.plant.pk
 
     dt = (now - self.last_update_dt).total_seconds() if self.last_update_dt else None
     self.last_update_dt = now
 
-    self.buffer_tank.update(dt)
-
     if not pk.is_available():
       # solo mode
       diagnostics = {
@@ -77,13 +79,13 @@ class BwkOnOff(BaseControlModule):
 
       if (control_bwk := self.buffer_tank.get_control()) is not None and control_bwk != bwk.control:
         diagnostics['control_bwk'] = control.control_str(control_bwk)
-        bwk.set_control(control_bwk)
+        bwk.set_control(control_bwk, self.writes)
         return diagnostics
       diagnostics['idle'] = True
       return diagnostics
 
     # top-up mode
-    consumption = any_consumer_on(self.plc)
+    consumption = self.plant.consumption
 
     if consumption or dt is None:
       self.value_ema.update(actual_value, dt)
@@ -103,7 +105,7 @@ class BwkOnOff(BaseControlModule):
     if self.buffer_tank.on_value_ema.last < self.threshold \
         and consumption \
         and self.value_ema.last < self.threshold:
-      bwk.set_control(control.ON)
+      bwk.set_control(control.ON, self.writes)
       diagnostics['control_bwk'] = 'on'
       self.auto_off_dt = now + datetime.timedelta(minutes=self.auto_duration_minutes)
       diagnostics['auto_off'] = self.auto_off_dt.replace(microsecond=0).isoformat()
@@ -127,16 +129,20 @@ class BwkOnOff(BaseControlModule):
         # if not pk.is_available():
         #   diagnostics['control_bwk'] = 'ignored (PK not available)'
         #   return diagnostics
-        bwk.set_control(control.OFF)
+        bwk.set_control(control.OFF, self.writes)
         diagnostics['control_bwk'] = 'off'
         return diagnostics
 
     diagnostics['idle'] = True
     return diagnostics
 
-bwk_onoff = BwkOnOff()
+def create():
+  controller = BwkOnOff()
+  controller.load_parameters()
+  return controller
 
 def main(stop_requested):
+  bwk_onoff = create()
   bwk_onoff.enabled = True
   while not stop_requested():
     diagnostics = bwk_onoff.control_loop()
@@ -149,8 +155,6 @@ def main(stop_requested):
       break
   return 0
 
-bwk_onoff.load_parameters()
-
 if __name__ == '__main__':
   exit(main(lambda: False))
 
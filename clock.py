@@ -0,0 +1,46 @@
+import datetime
+import threading
+import time
+
+class SystemClock:
+  def now(self):
+    return datetime.datetime.now()
+
+  def monotonic(self):
+    return time.monotonic()
+
+class SimulatedClock:
+  """Clock that only moves when advanced, for running the controllers faster than real time"""
+
+  def __init__(self, start=None):
+    self.lock = threading.Lock()
+    self.start = start or datetime.datetime.now().replace(microsecond=0)
+    self.elapsed = 0.0 # seconds since start
+
+  def now(self):
+    with self.lock:
+      return self.start + datetime.timedelta(seconds=self.elapsed)
+
+  def monotonic(self):
+    with self.lock:
+      return self.elapsed
+
+  def advance(self, seconds):
+    with self.lock:
+      self.elapsed += seconds
+
+  def set(self, now):
+    with self.lock:
+      self.elapsed = (now - self.start).total_seconds()
+
+clock = SystemClock()
+
+def set_clock(new_clock):
+  global clock
+  clock = new_clock
+
+def now():
+  return clock.now()
+
+def monotonic():
+  return clock.monotonic()
@@ -0,0 +1,192 @@
+import sys
+import threading
+from array import array
+
+VALUE = 1
+NONE = 0
+
+class Column:
+  """Values of one flattened field path; typed array storage with interned strings
+
+  String columns keep at most `capacity` distinct strings, see ColumnarBuffer._column_for.
+  """
+
+  def __init__(self, kind, capacity):
+    self.kind = kind
+    self.tags = array('b', [NONE]) * capacity # VALUE or NONE
+    if kind == 'float':
+      self.values = array('d', [0.0]) * capacity
+    elif kind in ('int', 'bool'):
+      self.values = array('q', [0]) * capacity
+    elif kind == 'str':
+      self.values = array('I', [0]) * capacity
+      self.categories = []
+      self.codes = {}
+    elif kind == 'none':
+      self.values = None # only None seen so far, typed on the first value
+    else:
+      self.values = [None] * capacity
+
+  @staticmethod
+  def kind_of(value):
+    if value is None:
+      return 'none'
+    if isinstance(value, bool):
+      return 'bool'
+    if isinstance(value, int) and -2**63 <= value < 2**63:
+      return 'int'
+    if isinstance(value, float):
+      return 'float'
+    if isinstance(value, str):
+      return 'str'
+    return 'object'
+
+  def nbytes(self):
+    size = self.tags.itemsize * len(self.tags)
+    if isinstance(self.values, array):
+      size += self.values.itemsize * len(self.values)
+    elif self.values is not None:
+      size += sys.getsizeof(self.values) + sum(sys.getsizeof(value) for value in self.values if value is not None)
+    if self.kind == 'str':
+      size += sys.getsizeof(self.categories) + sys.getsizeof(self.codes) + sum(sys.getsizeof(value) for value in self.categories)
+    return size
+
+  def set(self, index, value):
+    if value is None:
+      self.tags[index] = NONE
+      return
+    if self.kind == 'str':
+      code = self.codes.get(value)
+      if code is None:
+        code = self.codes[value] = len(self.categories)
+        self.categories.append(sys.intern(value))
+      self.values[index] = code
+    else:
+      self.values[index] = value
+    self.tags[index] = VALUE
+
+  def get(self, index):
+    if self.tags[index] == NONE:
+      return None
+    value = self.values[index]
+    if self.kind == 'str':
+      return self.categories[value]
+    if self.kind == 'bool':
+      return bool(value)
+    return value
+
+  def converted(self, kind):
+    column = Column(kind, len(self.tags))
+    column.tags = array('b', self.tags)
+    for index in range(len(self.tags)):
+      if self.tags[index] == VALUE:
+        column.set(index, self.get(index))
+    return column
+
+def flatten(entry, prefix, fields):
+  for key, value in entry.items():
+    path = prefix + (key,)
+    if isinstance(value, dict) and value:
+      flatten(value, path, fields)
+    else:
+      fields.append((path, value))
+  return fields
+
+class ColumnarBuffer:
+  """Fixed-capacity diagnostics history stored as typed columns, rows are rebuilt on read
+
+  Entries get increasing sequence numbers; each slot stores a shape code (the entry's
+  field paths in order) and one value per column; a slot's sequence number is
+  cleared while it is being written so lock-free readers can detect torn rows.
+  """
+
+  def __init__(self, capacity):
+    self.capacity = capacity
+    self.slot_seqs = array('q', [0]) * capacity
+    self.slot_shapes = array('I', [0]) * capacity
+    self.shapes = [] # code -> tuple of field paths
+    self.shape_codes = {}
+    self.columns = {} # field path -> Column
+    self.next_seq = 1
+    self.write_lock = threading.Lock()
+
+  def __len__(self):
+    return min(self.next_seq - 1, self.capacity)
+
+  @property
+  def last_seq(self):
+    return self.next_seq - 1
+
+  def nbytes(self):
+    return self.slot_seqs.itemsize * self.capacity + self.slot_shapes.itemsize * self.capacity \
+      + sum(column.nbytes() for column in self.columns.values())
+
+  def _column_for(self, path, value):
+    column = self.columns.get(path)
+    kind = Column.kind_of(value)
+    if column is None:
+      column = self.columns[path] = Column(kind, self.capacity)
+    elif kind == 'str' and column.kind == 'str':
+      # high-cardinality strings (timestamps, exception texts) would grow
+      # the categories forever, store them per slot instead
+      if value not in column.codes and len(column.categories) >= self.capacity:
+        column = self.columns[path] = column.converted('object')
+    elif value is not None and kind != column.kind and column.kind != 'object':
+      # widen int to float, anything else mixed falls back to plain objects
+      if column.kind == 'none':
+        widened = kind
+      elif {kind, column.kind} == {'int', 'float'}:
+        widened = 'float'
+      else:
+        widened = 'object'
+      if widened != column.kind:
+        column = self.columns[path] = column.converted(widened)
+    return column
+
+  def append(self, entry):
+    fields = flatten(entry, (), [])
+    shape = tuple(path for path, _ in fields)
+    with self.write_lock:
+      seq = self.next_seq
+      index = seq % self.capacity
+      self.slot_seqs[index] = 0
+      code = self.shape_codes.get(shape)
+      if code is None:
+        code = self.shape_codes[shape] = len(self.shapes)
+        self.shapes.append(shape)
+      self.slot_shapes[index] = code
+      for path, value in fields:
+        self._column_for(path, value).set(index, value)
+      self.slot_seqs[index] = seq
+      self.next_seq = seq + 1
+    return seq
+
+  def _row(self, index):
+    row = {}
+    for path in self.shapes[self.slot_shapes[index]]:
+      target = row
+      for key in path[:-1]:
+        target = target.setdefault(key, {})
+      target[path[-1]] = self.columns[path].get(index)
+    return row
+
+  def read(self, since=0, limit=None):
+    """Return up to limit (seq, entry) pairs newer than since, oldest first"""
+    end = self.next_seq
+    start = max(since + 1, end - self.capacity, 1)
+    if limit is not None:
+      end = min(end, start + limit)
+    entries = []
+    for seq in range(start, end):
+      index = seq % self.capacity
+      if self.slot_seqs[index] != seq:
+        continue
+      try:
+        row = self._row(index)
+      except (KeyError, IndexError):
+        continue
+      # the slot was rewritten while we read it
+      if self.slot_seqs[index] != seq:
+        continue
+      entries.append((seq, row))
+    return entries
@@ -0,0 +1,129 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+class DiagnosticsStore:
+  """Append-only on-disk diagnostics history, written behind by a background thread"""
+
+  def __init__(self, path, retention_days=90, batch_interval=5.0, max_queue=10000):
+    self.path = path
+    self.default_retention_days = retention_days
+    self.retention_days = {} # controller -> days
+    self.batch_interval = batch_interval # seconds to collect entries before a commit
+    self.queue = queue.Queue(max_queue)
+    self.dropped = 0
+    self.thread = None
+    self.last_purge = 0.0
+
+  def connect(self):
+    connection = sqlite3.connect(self.path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    # with WAL, NORMAL keeps the database consistent on a crash and only
+    # risks the last commits on power loss
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+  def start(self):
+    if self.thread is not None:
+      return
+    with self.connect() as connection:
+      connection.execute(
+        'CREATE TABLE IF NOT EXISTS diagnostics ('
+        ' controller TEXT NOT NULL,'
+        ' ts REAL NOT NULL,'
+        ' seq INTEGER,'
+        ' data TEXT NOT NULL)'
+      )
+      connection.execute('CREATE INDEX IF NOT EXISTS diagnostics_controller_ts ON diagnostics (controller, ts)')
+    # first purge an hour after the start, not on the first batch
+    self.last_purge = time.monotonic()
+    self.thread = threading.Thread(target=self._run, name='diagnostics-store', daemon=True)
+    self.thread.start()
+
+  def stop(self, timeout=30):
+    """Write the queued entries and end the writer thread"""
+    if self.thread is None:
+      return
+    try:
+      self.queue.put(None, timeout=timeout) # the writer drains the queue, a full one frees up
+    except queue.Full:
+      print("Diagnostics store writer does not drain its queue, not waiting for it")
+      return
+    self.thread.join(timeout)
+    self.thread = None
+
+  def set_retention(self, controller, days):
+    self.retention_days[controller] = days
+
+  def append(self, controller, seq, entry, ts=None):
+    # called on the control thread: never block, drop instead
+    try:
+      self.queue.put_nowait((controller, time.time() if ts is None else ts, seq, entry))
+    except queue.Full:
+      self.dropped += 1
+
+  def query(self, controller, start=None, end=None, limit=None):
+    """Return (ts, entry) pairs of a controller with start <= ts < end, oldest first"""
+    sql = 'SELECT ts, data FROM diagnostics WHERE controller = ?'
+    args = [controller]
+    if start is not None:
+      sql += ' AND ts >= ?'
+      args.append(start)
+    if end is not None:
+      sql += ' AND ts < ?'
+      args.append(end)
+    sql += ' ORDER BY ts'
+    if limit is not None:
+      sql += ' LIMIT ?'
+      args.append(limit)
+    connection = self.connect()
+    try:
+      return [(ts, json.loads(data)) for ts, data in connection.execute(sql, args)]
+    finally:
+      connection.close()
+
+  def _run(self):
+    connection = self.connect()
+    stopping = False
+    while not stopping:
+      rows = [self.queue.get()]
+      deadline = time.monotonic() + self.batch_interval
+      while rows[-1] is not None and (timeout := deadline - time.monotonic()) > 0:
+        try:
+          rows.append(self.queue.get(timeout=timeout))
+        except queue.Empty:
+          break
+      # None from stop() ends the batch and the thread
+      if rows[-1] is None:
+        stopping = True
+        rows.pop()
+      if not rows:
+        continue
+      try:
+        with connection:
+          connection.executemany(
+            'INSERT INTO diagnostics (controller, ts, seq, data) VALUES (?, ?, ?, ?)',
+            [(controller, ts, seq, json.dumps(entry)) for controller, ts, seq, entry in rows]
+          )
+        if time.monotonic() - self.last_purge > 3600:
+          self._purge(connection)
+          self.last_purge = time.monotonic()
+      except Exception as e:
+        print(f"Failed to store diagnostics: {e}")
+    connection.close()
+
+  def _purge(self, connection):
+    now = time.time()
+    with connection:
+      for controller in self.retention_days:
+        connection.execute('DELETE FROM diagnostics WHERE controller = ? AND ts < ?',
+                           (controller, now - self.retention_days[controller] * 86400))
+      if self.retention_days:
+        others = ','.join('?' * len(self.retention_days))
+        connection.execute(f'DELETE FROM diagnostics WHERE controller NOT IN ({others}) AND ts < ?',
+                           (*self.retention_days, now - self.default_retention_days * 86400))
+      else:
+        connection.execute('DELETE FROM diagnostics WHERE ts < ?',
+                           (now - self.default_retention_days * 86400,))
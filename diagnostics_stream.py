@@ -0,0 +1,64 @@
+import json
+import queue
+import threading
+
+class Subscriber:
+  def __init__(self, names, max_queue):
+    self.names = names # None subscribes to all controllers
+    self.queue = queue.Queue(max_queue)
+    self.dropped = False
+
+class DiagnosticsBroadcaster:
+  """Pushes new diagnostic entries to streaming clients; clients that fall behind are dropped"""
+
+  def __init__(self, max_queue=100, heartbeat=15):
+    self.max_queue = max_queue
+    self.heartbeat = heartbeat # seconds between keep-alive comments
+    self.lock = threading.Lock()
+    self.subscribers = set()
+
+  def subscribe(self, names=None):
+    subscriber = Subscriber(names, self.max_queue)
+    with self.lock:
+      self.subscribers.add(subscriber)
+    return subscriber
+
+  def unsubscribe(self, subscriber):
+    with self.lock:
+      self.subscribers.discard(subscriber)
+
+  def publish(self, name, seq, entry):
+    with self.lock:
+      subscribers = [s for s in self.subscribers if s.names is None or name in s.names]
+    if not subscribers:
+      return
+    # serialized once, however many clients are listening
+    data = json.dumps(entry)
+    for subscriber in subscribers:
+      try:
+        subscriber.queue.put_nowait((name, seq, data))
+      except queue.Full:
+        subscriber.dropped = True
+        self.unsubscribe(subscriber)
+
+  def stream(self, subscriber, backlog, format_event):
+    """Yield server-sent events: the backlog of (name, seq, entry), then live entries"""
+    try:
+      # sends the response headers right away and sets the client's reconnect delay
+      yield 'retry: 5000\n\n'
+      last_seq = {}
+      for name, seq, entry in backlog:
+        last_seq[name] = seq
+        yield format_event(name, seq, json.dumps(entry))
+      while not subscriber.dropped:
+        try:
+          name, seq, data = subscriber.queue.get(timeout=self.heartbeat)
+        except queue.Empty:
+          yield ': keep-alive\n\n'
+          continue
+        # entries published between subscribing and reading the backlog arrive twice
+        if seq <= last_seq.get(name, 0):
+          continue
+        yield format_event(name, seq, data)
+    finally:
+      self.unsubscribe(subscriber)
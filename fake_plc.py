@@ -0,0 +1,141 @@
+import ctypes
+import itertools
+import threading
+import time
+from types import SimpleNamespace
+import pyads
+from pyads.errorcodes import ERROR_CODES
+from plant_model import plc_type_of
+
+# ADS error codes returned by a real target
+ADSERR_DEVICE_SYMBOLNOTFOUND = 1808
+ADSERR_DEVICE_INVALIDSTATE = 1810
+ADSERR_TARGET_PORT_NOT_FOUND = 6
+
+class FakePLC:
+  """pyads.Connection stand-in that reads and writes the symbols of a PlantModel"""
+
+  def __init__(self, model, ams_net_id=None, ams_port=None, ip_address=None, latency=0.0):
+    self.model = model
+    self.latency = latency # seconds added to every ADS round trip
+    self.ams_net_id = ams_net_id
+    self.ams_port = ams_port
+    self.lock = threading.Lock()
+    self._open = False
+    self.notifications = {} # notification handle -> (name, callback, last value)
+    self.next_handle = itertools.count(1) # notification handles
+    self.calls = 0 # ADS round trips, for comparing access patterns
+    self._symbol_info_cache = {} # like pyads: name -> symbol info, looked up once for list reads and writes
+    model.listeners.append(self.notify)
+
+  @property
+  def is_open(self):
+    return self._open
+
+  def open(self):
+    # like pyads, opening only opens the local port, errors show on the first call
+    self._open = True
+
+  def close(self):
+    self._open = False
+
+  def _check_online(self):
+    if self.model.offline:
+      raise pyads.ADSError(err_code=ADSERR_TARGET_PORT_NOT_FOUND)
+
+  def _round_trip(self):
+    self._check_online()
+    if not self._open:
+      raise pyads.ADSError(err_code=ADSERR_DEVICE_INVALIDSTATE)
+    self.calls += 1
+    if self.latency:
+      time.sleep(self.latency)
+
+  def _read(self, name):
+    try:
+      return self.model.read(name)
+    except KeyError:
+      raise pyads.ADSError(err_code=ADSERR_DEVICE_SYMBOLNOTFOUND)
+
+  def _write(self, name, value):
+    try:
+      self.model.write(name, value)
+    except KeyError:
+      raise pyads.ADSError(err_code=ADSERR_DEVICE_SYMBOLNOTFOUND)
+
+  def read_state(self):
+    self._round_trip()
+    return pyads.ADSSTATE_RUN, 0
+
+  def get_symbol(self, name):
+    self._round_trip()
+    self._read(name)
+    return SimpleNamespace(name=name, plc_type=plc_type_of(name))
+
+  def read_by_name(self, data_name, plc_datatype=None, **kwargs):
+    self._round_trip()
+    return self._read(data_name)
+
+  def write_by_name(self, data_name, value, plc_datatype=None, **kwargs):
+    self._round_trip()
+    self._write(data_name, value)
+
+  def _symbol_infos(self, names, cache_symbol_info):
+    # one round trip per symbol not in the cache, as adsGetSymbolInfo
+    for name in names:
+      if not cache_symbol_info or name not in self._symbol_info_cache:
+        self._round_trip()
+        self._read(name)
+        self._symbol_info_cache[name] = SimpleNamespace(size=ctypes.sizeof(plc_type_of(name)))
+
+  def read_list_by_name(self, data_names, cache_symbol_info=True, **kwargs):
+    self._symbol_infos(data_names, cache_symbol_info)
+    self._round_trip()
+    return {name: self._read(name) for name in data_names}
+
+  def write_list_by_name(self, data_names_and_values, cache_symbol_info=True, **kwargs):
+    self._symbol_infos(data_names_and_values, cache_symbol_info)
+    self._round_trip()
+    results = {}
+    for name, value in data_names_and_values.items():
+      try:
+        self._write(name, value)
+        results[name] = 'no error'
+      except pyads.ADSError as e:
+        results[name] = ERROR_CODES.get(e.err_code, str(e))
+    return results
+
+  def add_device_notification(self, data_name, attr, callback, user_handle=None):
+    self._round_trip()
+    value = self._read(data_name)
+    with self.lock:
+      handle = next(self.next_handle)
+      self.notifications[handle] = (data_name, callback, value)
+    # like the PLC, the current value is sent right away
+    callback(self._notification(handle, value), data_name)
+    return handle, user_handle
+
+  def del_device_notification(self, notification_handle, user_handle):
+    self._round_trip()
+    with self.lock:
+      self.notifications.pop(notification_handle, None)
+
+  def parse_notification(self, notification, plc_datatype, timestamp_as_filetime=False):
+    return notification.hNotification, notification.timestamp, notification.value
+
+  def _notification(self, handle, value):
+    return SimpleNamespace(hNotification=handle, timestamp=self.model.clock.now(), value=value)
+
+  def notify(self):
+    # called by the model after every change, sends notifications for changed values
+    if not self._open or self.model.offline:
+      return
+    with self.lock:
+      changed = []
+      for handle, (name, callback, last) in self.notifications.items():
+        value = self.model.read(name)
+        if value != last:
+          self.notifications[handle] = (name, callback, value)
+          changed.append((handle, name, callback, value))
+    for handle, name, callback, value in changed:
+      callback(self._notification(handle, value), name)
@@ -2,7 +2,6 @@
 # -*- coding: utf-8 -*-
 
 import pyads
-import datetime
 import json
 import os
 import asyncio
@@ -11,6 +10,8 @@ from pid import PID
 from base_control_module import BaseControlModule
 from pump_pwm import PumpPWM
 import uuid
+import clock
+import plc_trace
 from dotenv import load_dotenv
 
 actual_return_value_name = 'PRG_HE.FB_Hk_Haus_12_17_15.FB_RL_Temp.fOut'
@@ -34,11 +35,7 @@ def on_connect(client, flags, rc, properties):
   client.subscribe(MQTT_TOPIC_15_17)
   client.subscribe(MQTT_TOPIC_12)
 
-def on_message(client, topic, payload, qos, properties):
-  feed_121517.actual_circulation_mqtt(topic, payload, properties)
-
 class Feed121517(BaseControlModule):
-  # Instance variable for MQTT callback
   def __init__(self):
     super().__init__(
       plc_ams_net_id='192.168.35.21.1.1',
@@ -49,7 +46,7 @@ class Feed121517(BaseControlModule):
     self.circulation_set_point = 56 # degrees
     self.min = -20
     self.min_if_no_circulation = 0.75 * self.min
-    self.pump_pwm = PumpPWM(self.plc, control_bws_name, control_value_name, self.min)
+    self.pump_pwm = PumpPWM(self.writes, control_bws_name, control_value_name, self.min)
     self.last_update = None
     self.return_pid = PID(
       Kp = 1 / 60,
@@ -66,18 +63,24 @@ class Feed121517(BaseControlModule):
     self.actual_circulation_15_17 = None
     self.actual_circulation_12 = None
     self.mqtt_client_id = f"feed_121517_{uuid.uuid4()}"
+    self.mqtt_client = None # set up on the event loop, see setup_mqtt
 
   async def setup_mqtt(self):
     self.mqtt_client = MQTTClient(self.mqtt_client_id)
     self.mqtt_client.on_connect = on_connect
-    self.mqtt_client.on_message = on_message
-    self.mqtt_client.set_auth_credentials(MQTT_USER, MQTT_PASSWORD)
+    self.mqtt_client.on_message = self.on_message
     try:
+      self.mqtt_client.set_auth_credentials(MQTT_USER, MQTT_PASSWORD)
       await self.mqtt_client.connect(MQTT_BROKER, MQTT_BROKER_PORT, MQTT_BROKER_SSL, keepalive=60)
     except Exception as e:
       print(f"Failed to connect to MQTT broker: {e}")
 
+  def on_message(self, client, topic, payload, qos, properties):
+    self.actual_circulation_mqtt(topic, payload, properties)
+
   def actual_circulation_mqtt(self, topic, payload, properties):
+    if plc_trace.recorder is not None:
+      plc_trace.recorder.mqtt(self, clock.now(), topic, payload, properties)
     if properties['retain']:
       return
 
@@ -86,13 +89,13 @@ class Feed121517(BaseControlModule):
       if topic == MQTT_TOPIC_15_17:
         self.actual_circulation_15_17 = {
           "value": value,
-          "timestamp": datetime.datetime.now()
+          "timestamp": clock.now()
         }
       elif topic == MQTT_TOPIC_12:
         if value := value.get('tC'):
           self.actual_circulation_12 = {
             "value": value,
-            "timestamp": datetime.datetime.now()
+            "timestamp": clock.now()
           }
     except Exception as e:
       print(f"Failed to decode MQTT message: {e}")
@@ -121,19 +124,21 @@ class Feed121517(BaseControlModule):
       'min_if_no_circulation': self.min_if_no_circulation
     }
 
+  def read_symbols(self):
+    return [actual_return_value_name] + self.pump_pwm.symbols()
+
   def _control_action(self, now):
     diagnostics = {}
     dt = (now - self.last_update).total_seconds() if self.last_update else None
     self.last_update = now
-    plc = self.plc
 
-    actual_return_value = plc.read_by_name(actual_return_value_name)
+    actual_return_value = self.values[actual_return_value_name]
     control_output_return = self.return_pid.update(self.return_set_point - actual_return_value, dt)
 
     # Circulations from MQTT
 
     # request H12 update every 30 seconds
-    if self.mqtt_client.is_connected:
+    if self.mqtt_client is not None and self.mqtt_client.is_connected:
       self.mqtt_client.publish(MQTT_COMMAND_TOPIC_12, MQTT_STATUS_UPDATE_COMMAND, qos=1)
 
     # Time out for old updates
@@ -157,7 +162,7 @@ class Feed121517(BaseControlModule):
 
     self.pump_pwm.control_range[0] = self.min if len(actual_circulations) == 2 else self.min_if_no_circulation
     diagnostics |= {
-      'pump': self.pump_pwm.update(now, control_output * dt if dt else 0)
+      'pump': self.pump_pwm.update(now, control_output * dt if dt else 0, self.values)
     }
 
     diagnostics |= {
@@ -188,13 +193,17 @@ class Feed121517(BaseControlModule):
     }
     return diagnostics
 
-feed_121517 = Feed121517()
+def create():
+  controller = Feed121517()
+  controller.load_parameters()
+  return controller
 
 async def main(stop_requested):
+  feed_121517 = create()
   feed_121517.enabled = True
   await feed_121517.setup_mqtt()
   while not stop_requested():
-    diagnostics = feed_121517.control_loop()
+    diagnostics = await feed_121517.control_loop_async()
     print(diagnostics, flush=True)
     print(flush=True)
     try:
@@ -203,7 +212,5 @@ async def main(stop_requested):
       break
   return 0
 
-feed_121517.load_parameters()
-
 if __name__ == '__main__':
   asyncio.run(main(lambda: False))
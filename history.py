@@ -0,0 +1,151 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# bucket widths in seconds; buckets are aligned to multiples of their width so
+# that they are the same across queries and can be cached
+NICE_WIDTHS = [1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400]
+
+# queries run in the control service, more points than a chart can show only cost time there
+MAX_POINTS = 5000
+# raw rows per history request; later rows are read by starting after the last one
+MAX_ROWS = 10000
+
+def nice_width(width):
+  for nice in NICE_WIDTHS:
+    if nice >= width:
+      return nice
+  return math.ceil(width / 86400) * 86400
+
+def field_value(entry, path):
+  """Numeric value at a dotted path like 'pump.speed', NaN if missing or not a number"""
+  value = entry
+  for key in path.split('.'):
+    if not isinstance(value, dict) or key not in value:
+      return math.nan
+    value = value[key]
+  if isinstance(value, (int, float)):
+    return float(value)
+  return math.nan
+
+def extract_series(rows, fields):
+  ts = np.fromiter((ts for ts, _ in rows), dtype=float, count=len(rows))
+  values = {
+    field: np.fromiter((field_value(entry, field) for _, entry in rows), dtype=float, count=len(rows))
+    for field in fields
+  }
+  return ts, values
+
+def bucket_stats(ts, values, width, first_bucket, buckets):
+  """Per-bucket count, min, max and mean of values (NaN for empty buckets)"""
+  index = np.floor(ts / width).astype(np.int64) - first_bucket
+  valid = ~np.isnan(values) & (index >= 0) & (index < buckets)
+  index = index[valid]
+  values = values[valid]
+  count = np.bincount(index, minlength=buckets)
+  total = np.bincount(index, weights=values, minlength=buckets)
+  minimum = np.full(buckets, np.inf)
+  np.minimum.at(minimum, index, values)
+  maximum = np.full(buckets, -np.inf)
+  np.maximum.at(maximum, index, values)
+  empty = count == 0
+  minimum[empty] = np.nan
+  maximum[empty] = np.nan
+  with np.errstate(invalid='ignore', divide='ignore'):
+    mean = total / count
+  return count, minimum, maximum, mean
+
+def lttb(ts, values, points):
+  """Largest-Triangle-Three-Buckets downsampling of one series to at most points points"""
+  valid = ~np.isnan(values)
+  ts = ts[valid]
+  values = values[valid]
+  n = len(ts)
+  if points >= n or points < 3:
+    return ts, values
+  # bucket edges for the n - 2 inner points, first and last point are kept
+  edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+  selected = np.empty(points, dtype=np.int64)
+  selected[0] = 0
+  selected[-1] = n - 1
+  a = 0
+  for i in range(points - 2):
+    start, stop = edges[i], edges[i + 1]
+    next_start, next_stop = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+    avg_t = ts[next_start:next_stop].mean() if next_stop > next_start else ts[-1]
+    avg_v = values[next_start:next_stop].mean() if next_stop > next_start else values[-1]
+    t = ts[start:stop]
+    v = values[start:stop]
+    area = np.abs((ts[a] - avg_t) * (v - values[a]) - (ts[a] - t) * (avg_v - values[a]))
+    a = start + int(np.argmax(area))
+    selected[i + 1] = a
+  return ts[selected], values[selected]
+
+def to_json_list(array):
+  return [None if math.isnan(x) else x for x in array.tolist()]
+
+class HistoryQuery:
+  """Downsampled views of the diagnostics store; aggregates of settled buckets are cached"""
+
+  def __init__(self, store, settle_seconds=60, max_cached_buckets=200000):
+    self.store = store
+    self.settle_seconds = settle_seconds # younger buckets may still receive entries
+    self.max_cached_buckets = max_cached_buckets
+    self.lock = threading.Lock()
+    self.cache = OrderedDict() # (controller, field, width, bucket) -> (count, min, max, mean)
+
+  def buckets(self, controller, fields, start, end, points):
+    points = min(points, MAX_POINTS)
+    width = nice_width((end - start) / max(points, 1))
+    first_bucket = math.floor(start / width)
+    buckets = max(math.ceil(end / width) - first_bucket, 1)
+    settled = math.floor((time.time() - self.settle_seconds) / width) - first_bucket # buckets before this index are final
+
+    stats = {field: np.full((4, buckets), np.nan) for field in fields}
+    missing = []
+    with self.lock:
+      for b in range(buckets):
+        cached = [self.cache.get((controller, field, width, first_bucket + b)) for field in fields]
+        if b < settled and all(c is not None for c in cached):
+          for field, c in zip(fields, cached):
+            stats[field][:, b] = c
+        else:
+          missing.append(b)
+
+    if missing:
+      lo, hi = missing[0], missing[-1] + 1
+      rows = self.store.query(controller, (first_bucket + lo) * width, (first_bucket + hi) * width)
+      ts, values = extract_series(rows, fields)
+      with self.lock:
+        for field in fields:
+          count, minimum, maximum, mean = bucket_stats(ts, values[field], width, first_bucket + lo, hi - lo)
+          computed = np.vstack((count, minimum, maximum, mean))
+          stats[field][:, lo:hi] = computed
+          for b in range(lo, min(hi, settled)):
+            self.cache[(controller, field, width, first_bucket + b)] = tuple(computed[:, b - lo])
+        while len(self.cache) > self.max_cached_buckets:
+          self.cache.popitem(last=False)
+
+    return {
+      'width': width,
+      't': [(first_bucket + b) * width for b in range(buckets)],
+      'fields': {
+        field: {
+          'count': [int(x) if not math.isnan(x) else 0 for x in stats[field][0]],
+          'min': to_json_list(stats[field][1]),
+          'max': to_json_list(stats[field][2]),
+          'mean': to_json_list(stats[field][3]),
+        } for field in fields
+      }
+    }
+
+  def lttb(self, controller, fields, start, end, points):
+    points = min(points, MAX_POINTS)
+    ts, values = extract_series(self.store.query(controller, start, end), fields)
+    result = {}
+    for field in fields:
+      t, v = lttb(ts, values[field], points)
+      result[field] = {'t': t.tolist(), 'value': to_json_list(v)}
+    return {'fields': result}
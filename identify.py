@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Identify first-order-plus-dead-time models from recorded diagnostics
+
+  python identify.py return-mixin --input new_control_value --output actual_value
+  python identify.py tww-11 --input new_control_value --output circulation.actual --by day
+  python identify.py return_mixin --jsonl steps.jsonl --input new_control_value --output actual_value
+
+Fits y[k+1] = a y[k] + b u[k-d] + c by least squares over sliding windows,
+for every dead time d up to --max-delay, keeping the best d per window. The
+windows are converted to gain K = b / (1 - a), time constant
+tau = -dt / ln(a) and dead time d dt, and summarized per operating region
+(quantiles of the mean input) and optionally per day.
+
+The input has to move on its own for the fits to see the plant: open-loop
+steps (simulate.py --step-test), set point changes or disturbances the
+controller reacts to. Closed-loop data of a well settled controller gives few
+accepted windows; 'rejected' counts the others by the first criterion they fail.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import numpy as np
+from history import extract_series
+
+def resample(ts, u, y, dt=None):
+  """Values on a uniform time grid; grid points without a sample within 2 dt are NaN"""
+  valid = ~np.isnan(u) & ~np.isnan(y)
+  ts, u, y = ts[valid], u[valid], y[valid]
+  if len(ts) < 2:
+    raise ValueError('Not enough samples')
+  if dt is None:
+    dt = float(np.median(np.diff(ts)))
+  grid = np.arange(ts[0], ts[-1], dt)
+  previous = np.clip(np.searchsorted(ts, grid, side='right') - 1, 0, len(ts) - 1)
+  gap = grid - ts[previous] > 2 * dt
+  u_grid = np.interp(grid, ts, u)
+  y_grid = np.interp(grid, ts, y)
+  u_grid[gap] = np.nan
+  y_grid[gap] = np.nan
+  return grid, u_grid, y_grid, dt
+
+def window_sums(x, window, step):
+  """Sums of x over windows of the given length, starting every step samples"""
+  c = np.concatenate(([0.0], np.cumsum(x)))
+  starts = np.arange(0, len(x) - window + 1, step)
+  return c[starts + window] - c[starts]
+
+def fit_arx_windows(u, y, window, step=None, max_delay=0, ridge=1e-9):
+  """Least-squares ARX(1, 1) fits with dead time over sliding windows of a uniform series
+
+  Returns per window: start index (of its first predicted sample in y), a, b,
+  c, delay (samples), r2 of the predicted change of y, mean and std of u.
+  """
+  step = step or max(1, window // 4)
+  D = max_delay
+  n = len(y)
+  if n - D - 1 < window:
+    raise ValueError('Series shorter than one window')
+  target = y[D + 1:]
+  state = y[D:-1]
+  best = None
+  for d in range(D + 1):
+    inp = u[D - d:n - 1 - d]
+    invalid = np.isnan(target) | np.isnan(state) | np.isnan(inp)
+    t, s, i = (np.where(invalid, 0.0, x) for x in (target, state, inp))
+    count = window_sums(~invalid, window, step)
+    # normal equations of [state, input, 1] -> target, one 3x3 system per window
+    XtX = np.empty((len(count), 3, 3))
+    XtX[:, 0, 0] = window_sums(s * s, window, step)
+    XtX[:, 0, 1] = XtX[:, 1, 0] = window_sums(s * i, window, step)
+    XtX[:, 0, 2] = XtX[:, 2, 0] = window_sums(s, window, step)
+    XtX[:, 1, 1] = window_sums(i * i, window, step)
+    XtX[:, 1, 2] = XtX[:, 2, 1] = window_sums(i, window, step)
+    XtX[:, 2, 2] = window_sums(np.ones_like(t), window, step)
+    Xty = np.stack([window_sums(s * t, window, step), window_sums(i * t, window, step), window_sums(t, window, step)], axis=1)
+    scale = np.maximum(np.trace(XtX, axis1=1, axis2=2), 1.0)
+    theta = np.linalg.solve(XtX + ridge * scale[:, None, None] * np.eye(3), Xty[..., None])[..., 0]
+    tt = window_sums(t * t, window, step)
+    sse = tt - np.einsum('ij,ij->i', theta, Xty)
+    # r2 of the predicted change, one-step predictions of a slow signal are always good
+    change = t - s
+    sst = window_sums(change * change, window, step) - window_sums(change, window, step) ** 2 / window
+    with np.errstate(invalid='ignore', divide='ignore'):
+      r2 = np.where(count == window, 1 - sse / sst, np.nan)
+    u_mean = XtX[:, 1, 2] / window
+    u_std = np.sqrt(np.maximum(XtX[:, 1, 1] / window - u_mean ** 2, 0))
+    fit = {'a': theta[:, 0], 'b': theta[:, 1], 'c': theta[:, 2], 'delay': np.full(len(r2), d), 'r2': r2,
+           'u_mean': u_mean, 'u_std': u_std}
+    if best is None:
+      best = fit
+    else:
+      better = np.nan_to_num(r2, nan=-np.inf) > np.nan_to_num(best['r2'], nan=-np.inf)
+      for key in best:
+        best[key] = np.where(better, fit[key], best[key])
+  # the targets start D + 1 samples into the series
+  best['start'] = D + 1 + np.arange(0, len(best['r2']) * step, step)[:len(best['r2'])]
+  return best
+
+def fopdt(fit, dt, min_r2=0.3, min_u_std=0.0):
+  """Gain, time constant and dead time of the stable, well fitted and excited windows"""
+  a = fit['a']
+  complete = ~np.isnan(fit['r2'])
+  excited = complete & (fit['u_std'] > min_u_std)
+  stable = excited & (a > 0) & (a < 1)
+  accepted = stable & (fit['r2'] >= min_r2)
+  with np.errstate(invalid='ignore', divide='ignore'):
+    gain = fit['b'] / (1 - a)
+    tau = -dt / np.log(a)
+  return {
+    'accepted': accepted,
+    'rejected': {
+      'gaps': int((~complete).sum()),
+      'excitation': int((complete & ~excited).sum()),
+      'unstable': int((excited & ~stable).sum()),
+      'r2': int((stable & ~accepted).sum()),
+    },
+    'gain': gain,
+    'tau': tau,
+    'dead_time': fit['delay'] * dt,
+    'r2': fit['r2'],
+    'u_mean': fit['u_mean'],
+  }
+
+def summarize(model, selection):
+  def stats(values):
+    values = values[selection]
+    if not len(values):
+      return None
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    return {'median': float(median), 'q1': float(q1), 'q3': float(q3)}
+  return {
+    'windows': int(selection.sum()),
+    'gain': stats(model['gain']),
+    'tau': stats(model['tau']),
+    'dead_time': stats(model['dead_time']),
+    'r2': stats(model['r2']),
+  }
+
+def by_region(model, regions):
+  accepted = model['accepted']
+  if not accepted.any():
+    return []
+  edges = np.unique(np.percentile(model['u_mean'][accepted], np.linspace(0, 100, regions + 1)))
+  result = []
+  for low, high in zip(edges, edges[1:]):
+    selection = accepted & (model['u_mean'] >= low) & ((model['u_mean'] < high) | (high == edges[-1]) & (model['u_mean'] <= high))
+    result.append({'input': [float(low), float(high)]} | summarize(model, selection))
+  return result
+
+def by_day(model, window_times):
+  """Per day of the windows' middle times, so a window across midnight counts on the day most of it lies in"""
+  days = np.array([datetime.date.fromtimestamp(t).isoformat() for t in window_times])
+  return [{'day': day} | summarize(model, model['accepted'] & (days == day)) for day in sorted(set(days))]
+
+def load_store(controller, fields, start, end):
+  from diagnostics_store import DiagnosticsStore
+  path = os.getenv('DIAGNOSTICS_DB', os.path.join(os.path.dirname(__file__), 'diagnostics.sqlite3'))
+  rows = DiagnosticsStore(path).query(controller, start, end)
+  return extract_series(rows, fields)
+
+def load_jsonl(path, module, fields):
+  rows = []
+  with open(path) as f:
+    for line in f:
+      record = json.loads(line)
+      if record['module'] == module:
+        rows.append((datetime.datetime.fromisoformat(record['diagnostics']['timestamp']).timestamp(), record['diagnostics']))
+  return extract_series(rows, fields)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('controller', help='controller name in the diagnostics store, or module name with --jsonl')
+  parser.add_argument('--input', required=True, help='dotted diagnostics field of the actuator, e.g. new_control_value')
+  parser.add_argument('--output', required=True, help='dotted diagnostics field of the measurement, e.g. actual_value')
+  parser.add_argument('--jsonl', help='read diagnostics written by simulate.py --output instead of the store')
+  parser.add_argument('--start', type=datetime.datetime.fromisoformat)
+  parser.add_argument('--end', type=datetime.datetime.fromisoformat)
+  parser.add_argument('--clip', help='clip the input to LOW,HIGH, e.g. 0,100 when negative values mean off')
+  parser.add_argument('--window', type=float, default=3600, help='window length in seconds')
+  parser.add_argument('--max-delay', type=float, default=300, help='longest dead time tried, in seconds')
+  parser.add_argument('--min-r2', type=float, default=0.3, help='minimum r2 of the predicted change per sample')
+  parser.add_argument('--regions', type=int, default=4, help='operating regions, as quantiles of the mean input')
+  parser.add_argument('--by', choices=['region', 'day'], default='region')
+  args = parser.parse_args()
+
+  fields = [args.input, args.output]
+  if args.jsonl:
+    ts, values = load_jsonl(args.jsonl, args.controller, fields)
+  else:
+    ts, values = load_store(args.controller, fields,
+                            args.start.timestamp() if args.start else None,
+                            args.end.timestamp() if args.end else None)
+  u, y = values[args.input], values[args.output]
+  if args.clip:
+    low, high = (float(x) for x in args.clip.split(','))
+    u = np.clip(u, low, high)
+
+  grid, u, y, dt = resample(ts, u, y)
+  window = max(3, round(args.window / dt))
+  fit = fit_arx_windows(u, y, window, max_delay=round(args.max_delay / dt))
+  model = fopdt(fit, dt, args.min_r2, min_u_std=1e-3 * (np.nanmax(u) - np.nanmin(u)))
+  result = {
+    'dt': dt,
+    'windows': len(fit['r2']),
+    'overall': summarize(model, model['accepted']),
+    'rejected': model['rejected'],
+  }
+  if not model['accepted'].any():
+    print('No window accepted; the input needs to move on its own, see --help', file=sys.stderr)
+  if args.by == 'region':
+    result['regions'] = by_region(model, args.regions)
+  else:
+    result['days'] = by_day(model, grid[fit['start'] + window // 2])
+  print(json.dumps(result, indent=2))
+  return 0
+
+if __name__ == '__main__':
+  exit(main())
@@ -0,0 +1,122 @@
+import bisect
+import math
+import threading
+
+# seconds, from sub-millisecond ADS round trips to cycles stuck in timeouts
+default_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Counter:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.value = 0.0
+
+  def inc(self, amount=1):
+    with self.lock:
+      self.value += amount
+
+  def samples(self, name, labels):
+    yield name, labels, self.value
+
+class Histogram:
+  def __init__(self, buckets):
+    self.lock = threading.Lock()
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1) # the last one counts values above all buckets
+    self.sum = 0.0
+
+  def observe(self, value):
+    i = bisect.bisect_left(self.buckets, value)
+    with self.lock:
+      self.counts[i] += 1
+      self.sum += value
+
+  def samples(self, name, labels):
+    with self.lock:
+      counts, total = list(self.counts), self.sum
+    cumulative = 0
+    for bound, count in zip(self.buckets + (math.inf,), counts):
+      cumulative += count
+      yield name + '_bucket', labels + (('le', format_value(bound)),), cumulative
+    yield name + '_sum', labels, total
+    yield name + '_count', labels, cumulative
+
+class Family:
+  """A metric with one child per combination of label values"""
+
+  def __init__(self, name, help, kind, labelnames, factory):
+    self.name = name
+    self.help = help
+    self.kind = kind
+    self.labelnames = tuple(labelnames)
+    self.factory = factory
+    self.lock = threading.Lock()
+    self.children = {}
+
+  def labels(self, *values):
+    # callers on the hot path keep the child instead of looking it up every time
+    values = tuple(str(value) for value in values)
+    child = self.children.get(values)
+    if child is None:
+      with self.lock:
+        child = self.children.setdefault(values, self.factory())
+    return child
+
+  def samples(self):
+    for values, child in list(self.children.items()):
+      yield from child.samples(self.name, tuple(zip(self.labelnames, values)))
+
+class Registry:
+  """Metrics of the process in the Prometheus text exposition format"""
+
+  def __init__(self):
+    self.families = {}
+    self.collectors = []
+
+  def _family(self, name, help, kind, labelnames, factory):
+    family = self.families.get(name)
+    if family is None:
+      family = self.families[name] = Family(name, help, kind, labelnames, factory)
+    return family
+
+  def counter(self, name, help, labelnames=()):
+    return self._family(name + '_total', help, 'counter', labelnames, Counter)
+
+  def histogram(self, name, help, labelnames=(), buckets=default_buckets):
+    return self._family(name, help, 'histogram', labelnames, lambda: Histogram(tuple(buckets)))
+
+  def collector(self, collect):
+    """Register a function that yields (name, help, kind, [(labels dict, value)]) when scraped,
+    for values that already exist elsewhere such as buffer sizes"""
+    self.collectors.append(collect)
+    return collect
+
+  def render(self):
+    lines = []
+    for family in list(self.families.values()):
+      lines += header(family.name, family.help, family.kind)
+      lines += [sample_line(name, labels, value) for name, labels, value in family.samples()]
+    for collect in self.collectors:
+      for name, help, kind, samples in collect():
+        lines += header(name, help, kind)
+        lines += [sample_line(name, tuple(labels.items()), value) for labels, value in samples]
+    return '\n'.join(lines) + '\n'
+
+def header(name, help, kind):
+  return [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+
+def escape(value):
+  return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value):
+  if value is None:
+    return 'NaN'
+  if math.isinf(value):
+    return '+Inf' if value > 0 else '-Inf'
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+def sample_line(name, labels, value):
+  if labels:
+    name += '{' + ','.join(f'{key}="{escape(str(label))}"' for key, label in labels) + '}'
+  return f'{name} {format_value(value)}'
+
+registry = Registry()
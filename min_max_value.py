@@ -1,4 +1,4 @@
-import datetime
+import clock
 
 class MinMaxValue:
   STATE_OK = 0
@@ -15,8 +15,8 @@ class MinMaxValue:
     else:
       return f'UNKNOWN({state})'
 
-  def __init__(self, plc, name):
-    self.plc = plc
+  def __init__(self, writes, name):
+    self.writes = writes
     self.name = name
     self.value_name = f'{name}.fOut'
     self.threshold_min_name = f'{name}.fThresholdMin'
@@ -30,16 +30,8 @@ class MinMaxValue:
     self.alert_state_left_timestamp = None
     self.auto_reset_seconds = None
 
-  def set_parameters(self, params):
-    self.auto_reset_seconds = params.get('auto_reset_seconds', self.auto_reset_seconds)
-
-  def parameters(self):
-    return {
-      'auto_reset_seconds': self.auto_reset_seconds,
-    }
-
-  def update(self):
-    state = self.plc.read_list_by_name([
+  def symbols(self):
+    return [
       self.value_name,
       self.threshold_min_name,
       self.threshold_max_name,
@@ -48,8 +40,17 @@ class MinMaxValue:
       self.state_name,
       self.alert_min_name,
       self.alert_max_name,
-    ])
+    ]
+
+  def set_parameters(self, params):
+    self.auto_reset_seconds = params.get('auto_reset_seconds', self.auto_reset_seconds)
+
+  def parameters(self):
+    return {
+      'auto_reset_seconds': self.auto_reset_seconds,
+    }
 
+  def update(self, state):
     diagnostics = {
       'value': state[self.value_name],
       'threshold_min': state[self.threshold_min_name],
@@ -69,18 +70,18 @@ class MinMaxValue:
     if self.alert_state_left_timestamp is None:
       if state[self.state_name] == self.STATE_MAX_ALARM and not state[self.alert_max_name] \
         or state[self.state_name] == self.STATE_MIN_ALARM and not state[self.alert_min_name]:
-          self.alert_state_left_timestamp = datetime.datetime.now()
+          self.alert_state_left_timestamp = clock.now()
 
     if self.alert_state_left_timestamp is not None:
-      diagnostics['alert_state_left'] = (datetime.datetime.now() - self.alert_state_left_timestamp).total_seconds()
+      diagnostics['alert_state_left'] = (clock.now() - self.alert_state_left_timestamp).total_seconds()
       diagnostics['auto_reset_seconds'] = self.auto_reset_seconds
 
     if self.auto_reset_seconds is not None and self.alert_state_left_timestamp is not None:
-      now = datetime.datetime.now()
+      now = clock.now()
       if (now - self.alert_state_left_timestamp).total_seconds() >= self.auto_reset_seconds:
         # reset alert state
         # self.plc.write_by_name(self.reset_name, True)
-        self.plc.write_by_name(self.state_name, self.STATE_OK)
+        self.writes.write(self.state_name, self.STATE_OK)
         self.alert_state_left_timestamp = None
         return diagnostics | { 'action': 'reset' }
 
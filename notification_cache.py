@@ -0,0 +1,74 @@
+import os
+import ctypes
+import threading
+import pyads
+
+class NotificationCache:
+  """Latest values of slowly changing symbols, pushed by the PLC via ADS device notifications"""
+
+  def __init__(self, connection):
+    self.connection = connection
+    self.lock = threading.Lock()
+    self.subscriptions = {} # name -> (on_change, cycle_time, max_delay)
+    self.handles = {} # name -> (notification_handle, user_handle)
+    self.values = {} # name -> (value, timestamp)
+
+  def enabled(self):
+    return os.getenv('PLC_NOTIFICATIONS', '0') == '1'
+
+  def subscribe(self, names, on_change=True, cycle_time=1.0, max_delay=1.0):
+    if not self.enabled():
+      return
+    for name in names:
+      with self.lock:
+        if name in self.subscriptions:
+          continue
+        self.subscriptions[name] = (on_change, cycle_time, max_delay)
+      self._add_notification(name)
+
+  def _add_notification(self, name):
+    on_change, cycle_time, max_delay = self.subscriptions[name]
+    plc_datatype = self.connection.symbols.datatype(name)
+    attr = pyads.NotificationAttrib(
+      ctypes.sizeof(plc_datatype),
+      pyads.ADSTRANS_SERVERONCHA if on_change else pyads.ADSTRANS_SERVERCYCLE,
+      max_delay * 1000, # milliseconds
+      cycle_time * 1000
+    )
+
+    def callback(notification, data_name):
+      _, timestamp, value = self.connection.connection.parse_notification(notification, plc_datatype)
+      with self.lock:
+        self.values[name] = (value, timestamp)
+
+    handles = self.connection.call('add_device_notification', name, attr, callback)
+    with self.lock:
+      self.handles[name] = handles
+
+  def get(self, name):
+    with self.lock:
+      return self.values.get(name)
+
+  def latest(self, names):
+    with self.lock:
+      return {name: self.values[name][0] for name in names if name in self.values}
+
+  def invalidate(self):
+    with self.lock:
+      handles, self.handles = self.handles, {}
+      self.values = {}
+    for notification_handle, user_handle in handles.values():
+      try:
+        self.connection.call('del_device_notification', notification_handle, user_handle)
+      except Exception:
+        pass
+
+  def resubscribe(self):
+    with self.lock:
+      names = list(self.subscriptions)
+    for name in names:
+      try:
+        self._add_notification(name)
+      except pyads.ADSError as e:
+        # the symbol is polled by the read planner until the next reconnect
+        print(f"Failed to subscribe to {name}: {e}")
@@ -0,0 +1,178 @@
+import atexit
+import datetime
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+class ParameterStore:
+  """Parameters of all controllers in one JSON file, written behind by a background thread
+
+  set() takes effect in memory right away. The file is written once changes
+  have settled for `delay` seconds (at most `max_delay` after the first one),
+  to a temporary file that then atomically replaces it, so a crash leaves
+  either the old or the new file. Every written parameter set is appended
+  to a rolling journal in the same file for rollback. A copy is kept in
+  `<file>.bak` for when the file is damaged outside the store.
+  """
+
+  def __init__(self, path, delay=2.0, max_delay=10.0, journal_length=200):
+    self.path = path
+    self.backup_path = path + '.bak'
+    self.delay = delay
+    self.max_delay = max_delay
+    self.journal_length = journal_length
+    self.condition = threading.Condition()
+    self.write_lock = threading.Lock() # one writer at a time, the thread or flush()
+    self.controllers = {} # name -> parameters, including those not written yet
+    self.journal = [] # {'version', 'time', 'controller', 'parameters'}, oldest first
+    self.version = 0
+    self.changed = set() # controllers not written yet
+    self.first_change = None
+    self.last_change = None
+    self.thread = None
+    self._remove_temp_files()
+    self._load()
+
+  def _load(self):
+    for path in (self.path, self.backup_path):
+      try:
+        with open(path, 'r') as f:
+          data = json.load(f)
+        controllers, journal, version = data['controllers'], data['journal'], data['version']
+      except FileNotFoundError:
+        continue
+      except (ValueError, KeyError, TypeError) as e:
+        print(f"Cannot read parameters from {path}: {e!r}")
+        if path == self.path:
+          # kept for inspection, the next write replaces the file
+          try:
+            os.replace(path, path + '.corrupt')
+          except OSError:
+            pass
+        continue
+      if path != self.path:
+        print(f"Parameters read from {path}")
+      self.controllers, self.journal, self.version = controllers, journal, version
+      return
+
+  def _remove_temp_files(self, min_age=60):
+    # left behind by a crash while writing; younger ones may belong to another process writing now
+    pattern = os.path.join(os.path.dirname(self.path), '.parameters-*.tmp')
+    for temp_path in glob.glob(pattern):
+      try:
+        if time.time() - os.path.getmtime(temp_path) > min_age:
+          os.unlink(temp_path)
+      except OSError:
+        pass
+
+  def get(self, controller):
+    with self.condition:
+      return self.controllers.get(controller)
+
+  def set(self, controller, params):
+    """Store params, which must not be modified afterwards"""
+    with self.condition:
+      if self.controllers.get(controller) == params:
+        return
+      self.controllers[controller] = params
+      self.changed.add(controller)
+      self.last_change = time.monotonic()
+      if self.first_change is None:
+        self.first_change = self.last_change
+      if self.thread is None:
+        self.thread = threading.Thread(target=self._run, name='parameter-store', daemon=True)
+        self.thread.start()
+      self.condition.notify()
+
+  def entries(self, controller=None):
+    """Journal entries of a controller, or of all, oldest first"""
+    with self.condition:
+      return [entry for entry in self.journal if controller is None or entry['controller'] == controller]
+
+  def entry(self, controller, version):
+    return next((entry for entry in self.entries(controller) if entry['version'] == version), None)
+
+  def flush(self):
+    """Write pending changes now"""
+    with self.write_lock:
+      with self.condition:
+        if not self.changed:
+          return
+        changed, self.changed = self.changed, set()
+        self.first_change = self.last_change = None
+        saved = datetime.datetime.now().isoformat(timespec='seconds')
+        version, journal = self.version, list(self.journal)
+        for controller in sorted(changed):
+          version += 1
+          journal.append({'version': version, 'time': saved, 'controller': controller,
+                          'parameters': self.controllers[controller]})
+        del journal[:-self.journal_length]
+        data = {'version': version, 'controllers': dict(self.controllers), 'journal': journal}
+      try:
+        self._write(data)
+      except Exception as e:
+        print(f"Failed to save parameters: {e}")
+        with self.condition:
+          # try again after the next delay
+          self.changed |= changed
+          self.first_change = self.last_change = time.monotonic()
+          self.condition.notify()
+        return
+      with self.condition:
+        self.version, self.journal = version, journal
+
+  def _write(self, data):
+    directory = os.path.dirname(os.path.abspath(self.path))
+    for path in (self.path, self.backup_path):
+      fd, temp_path = tempfile.mkstemp(prefix='.parameters-', suffix='.tmp', dir=directory)
+      try:
+        with os.fdopen(fd, 'w') as f:
+          json.dump(data, f, indent=1)
+          f.flush()
+          os.fsync(f.fileno())
+        os.replace(temp_path, path)
+      except BaseException:
+        os.unlink(temp_path)
+        raise
+    # make the rename itself durable; directories cannot be opened on Windows
+    if hasattr(os, 'O_DIRECTORY'):
+      dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+      try:
+        os.fsync(dir_fd)
+      finally:
+        os.close(dir_fd)
+
+  def _run(self):
+    while True:
+      with self.condition:
+        while True:
+          if not self.changed:
+            self.condition.wait()
+            continue
+          due = min(self.last_change + self.delay, self.first_change + self.max_delay)
+          if time.monotonic() >= due:
+            break
+          self.condition.wait(due - time.monotonic())
+      self.flush()
+
+stores = {} # path -> ParameterStore
+stores_lock = threading.Lock()
+
+def open_store(directory, filename='parameters.json'):
+  """The store of a directory, shared by all controllers using it"""
+  path = os.path.abspath(os.path.join(directory, filename))
+  with stores_lock:
+    if path not in stores:
+      stores[path] = ParameterStore(path)
+    return stores[path]
+
+def flush_all():
+  with stores_lock:
+    all_stores = list(stores.values())
+  for store in all_stores:
+    store.flush()
+
+atexit.register(flush_all)
@@ -6,23 +6,19 @@ at_gw_ok_name = 'PRG_WV.FB_Pelletkessel_AT_Gw.bQ'
 stoerung_name = 'PRG_WV.FB_Pelletkessel.bStoerung'
 power_name = 'PRG_WV.FB_Pelletkessel.FB_WMZ.FB_Power.VDB.Data_As_LReal'
 
+state_names = [control_name, ready_name, at_gw_ok_name, stoerung_name, power_name]
+
 class PK:
-  def __init__(self, plc):
-    self.plc = plc
+  symbols = state_names
+
+  def __init__(self):
     self.control = None
     self.ready = None
     self.at_gw_ok = None
     self.stoerung = None
     self.power = None
 
-  def read(self):
-    state = self.plc.read_list_by_name([
-      control_name,
-      ready_name,
-      at_gw_ok_name,
-      stoerung_name,
-      power_name
-    ])
+  def read(self, state):
     self.control = state[control_name]
     self.ready = state[ready_name]
     self.at_gw_ok = state[at_gw_ok_name]
@@ -37,10 +33,10 @@ class PK:
       'power': round(self.power, 2)
     } | ({ 'stoerung': True } if self.stoerung else {})
 
-  def set_control(self, new_control):
+  def set_control(self, new_control, writes):
     if (self.control == new_control):
       return False
-    self.plc.write_by_name(control_name, new_control)
+    writes.write(control_name, new_control)
     self.control = new_control
     return True
 
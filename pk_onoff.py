@@ -5,10 +5,9 @@ import pyads
 import time
 import control
 import datetime
-from pk import PK
-from bwk import BWK
 from buffer_tank import BufferTank
 from base_control_module import BaseControlModule
+from plant_state import PlantState, plant_state_for
 
 class PkOnOff(BaseControlModule):
   def __init__(self):
@@ -17,8 +16,8 @@ class PkOnOff(BaseControlModule):
       plc_ams_port=pyads.PORT_TC3PLC1,
       param_filename="pk_onoff_params.json",
     )
-    self.buffer_tank = BufferTank(self.plc, 64, 58)
-    self.last_update_dt = None
+    self.plant = plant_state_for(self.plc)
+    self.buffer_tank = BufferTank(self.plant, 64, 58)
     self.heat_after_bwk_seconds = 300
     self.heat_after_bwk_dt = None
 
@@ -31,21 +30,17 @@ class PkOnOff(BaseControlModule):
     params["heat_after_bwk_seconds"] = self.heat_after_bwk_seconds
     return params
 
-  def _control_action(self, now):
-    diagnostics = {}
-    dt = (
-      (now - self.last_update_dt).total_seconds()
-      if self.last_update_dt
-      else None
-    )
-    self.last_update_dt = now
+  def read_symbols(self):
+    return PlantState.symbols
 
-    pk = PK(self.plc)
-    pk.read()
-    bwk = BWK(self.plc)
-    bwk.read()
+  def notification_symbols(self):
+    return self.read_symbols()
 
-    self.buffer_tank.update(dt)
+  def _control_action(self, now):
+    diagnostics = {}
+    self.plant.update(now, self.values)
+    pk = self.plant.pk
+    bwk = self.plant.bwk
 
     diagnostics |= self.buffer_tank.diagnostics()
     diagnostics["pk"] = pk.diagnostics()
@@ -69,16 +64,20 @@ class PkOnOff(BaseControlModule):
     elif (buffer_tank_control := self.buffer_tank.get_control()) is not None:
       new_control_pk = buffer_tank_control
 
-    if pk.set_control(new_control_pk):
+    if pk.set_control(new_control_pk, self.writes):
       diagnostics["control"] = control.control_str(new_control_pk)
       return diagnostics
 
     diagnostics["idle"] = True
     return diagnostics
 
-pk_onoff = PkOnOff()
+def create():
+  controller = PkOnOff()
+  controller.load_parameters()
+  return controller
 
 def main(stop_requested):
+  pk_onoff = create()
   pk_onoff.enabled = True
   while not stop_requested():
     diagnostics = pk_onoff.control_loop()
@@ -91,7 +90,5 @@ def main(stop_requested):
   return 0
 
 
-pk_onoff.load_parameters()
-
 if __name__ == "__main__":
   exit(main(lambda: False))
@@ -0,0 +1,208 @@
+import math
+import threading
+import pyads
+import control
+import buffer_tank
+import pk
+import bwk
+import bhkw
+import distribution
+
+# symbols of return_mixin.py, feed_121517.py, tww_11.py and restart_wp_11.py, copied
+# so that the plant model does not import the modules and their dependencies (MQTT)
+supply_name = 'PRG_HE.FB_Haus_28_42_12_17_15_VL_Temp.fOut'
+mixer_value_name = 'PRG_HE.FB_Zusatzspeicher.FB_Speicherladeset_Pumpe.FB_BWS_Sollwert.FB_PmSw.fWert'
+mixer_onoff_name = 'PRG_HE.FB_Zusatzspeicher.FB_Speicherladeset_Pumpe.BWS.iStellung'
+return_12_17_15_name = 'PRG_HE.FB_Hk_Haus_12_17_15.FB_RL_Temp.fOut'
+feed_value_name = 'PRG_HE.FB_Hk_Haus_12_17_15.FB_Pumpe.FB_BWS_Sollwert.FB_PmSw.fWert'
+feed_bws_name = 'PRG_HE.FB_Hk_Haus_12_17_15.FB_Pumpe.BWS.iStellung'
+circulation_name = 'PRG_HE.FB_TWW.FB_Zirkulationstemp.fOut'
+tww_value_name = 'PRG_HE.FB_TWW.FB_Ladepumpe.FB_BWS_Sollwert.FB_PmSw.fWert'
+tww_bws_name = 'PRG_HE.FB_TWW.FB_Ladepumpe.BWS.iStellung'
+hotgas_name = 'PRG_HE.FB_Waermepumpe.FB_Heissgas_Temp'
+
+heating_12_17_15_name, heating_28_42_name, tww_charge_name = distribution.consumer_names
+
+WATER_HEAT_CAPACITY = 4.19 # kJ per kg and degree
+
+def plc_type_of(name):
+  """PLC datatype following the naming convention of the TwinCAT project"""
+  last = name.rsplit('.', 1)[-1]
+  if last == 'Data_As_LReal':
+    return pyads.PLCTYPE_LREAL
+  if last.startswith('b'):
+    return pyads.PLCTYPE_BOOL
+  if last.startswith('i'):
+    return pyads.PLCTYPE_INT
+  return pyads.PLCTYPE_REAL
+
+def lag(value, target, tau, dt):
+  """First-order lag of value towards target with time constant tau"""
+  return target + (value - target) * math.exp(-dt / tau)
+
+class PlantModel:
+  """Simple thermal model of the heating plant behind the PLC symbols used by the controllers
+
+  Two buffer tank layers are heated by the pellet boiler (PK), the gas burner
+  (BWK) and the CHP (BHKW) and cooled by the heating circuits and the hot water
+  charging pump. The return mixer lowers the supply temperature; the feed pump
+  speed sets the return temperature of the 12/17/15 circuit.
+  """
+
+  def __init__(self, clock, tank_temperature=62.0, tank_layer_capacity=2 * 1000 * WATER_HEAT_CAPACITY):
+    self.clock = clock
+    self.lock = threading.RLock()
+    self.offline = False # all calls fail with an ADS error while set
+    self.listeners = []
+    self.tank_layer_capacity = tank_layer_capacity # kJ per degree
+    self.rated_power = {'pk': 60.0, 'bwk': 40.0, 'bhkw': 18.0}
+    self.ramp_time = {'pk': 600.0, 'bwk': 120.0, 'bhkw': 300.0}
+    self.reset(tank_temperature)
+
+  def reset(self, tank_temperature=62.0):
+    """Return to the initial state, for running several simulations on one model"""
+    self.top = tank_temperature
+    self.bottom = tank_temperature - 6
+    self.supply = tank_temperature
+    self.return_12_17_15 = tank_temperature - 15
+    self.circulation = 55.0
+    self.power = {'pk': 0.0, 'bwk': 0.0, 'bhkw': 0.0} # kW
+    self.energy = {'pk': 0.0, 'bwk': 0.0, 'bhkw': 0.0} # kWh
+    self.auto_on = {'pk': False, 'bwk': False, 'bhkw': False}
+    self.values = {
+      pk.control_name: control.AUTO,
+      pk.ready_name: True,
+      pk.at_gw_ok_name: True,
+      pk.stoerung_name: False,
+      bwk.control_bwk_name: control.OFF,
+      bhkw.control_bhkw_name: control.OFF,
+      mixer_value_name: 0.0,
+      mixer_onoff_name: control.OFF,
+      feed_value_name: 50.0,
+      feed_bws_name: control.ON,
+      tww_value_name: 50.0,
+      tww_bws_name: control.ON,
+      f'{hotgas_name}.fThresholdMin': 20.0,
+      f'{hotgas_name}.fThresholdMax': 110.0,
+      f'{hotgas_name}.fThresholdDelta': 5.0,
+      f'{hotgas_name}.bQStoerung': False,
+      f'{hotgas_name}.iQState': 0,
+      f'{hotgas_name}.bQMin': False,
+      f'{hotgas_name}.bQMax': False,
+      f'{hotgas_name}.bQuit': False,
+    }
+    self.update_outputs()
+
+  def symbols(self):
+    with self.lock:
+      return list(self.values)
+
+  def read(self, name):
+    with self.lock:
+      return self.values[name]
+
+  def write(self, name, value):
+    with self.lock:
+      if name not in self.values:
+        raise KeyError(name)
+      self.values[name] = value
+    self.notify()
+
+  def notify(self):
+    for listener in list(self.listeners):
+      listener()
+
+  def hours(self):
+    now = self.clock.now()
+    return now.hour + now.minute / 60 + now.second / 3600
+
+  def outdoor_temperature(self):
+    return 5 + 5 * math.sin(2 * math.pi * (self.hours() - 9) / 24)
+
+  def update_consumers(self):
+    hours = self.hours()
+    heating = 5 <= hours < 22
+    self.values[heating_28_42_name] = heating
+    self.values[heating_12_17_15_name] = heating
+    self.values[tww_charge_name] = any(start <= hours < start + 1/3 for start in (6, 12, 18))
+
+  def generator_on(self, name, setting):
+    if setting == control.ON:
+      return True
+    if setting == control.AUTO:
+      # the PLC's own thermostat
+      if self.top < 64:
+        self.auto_on[name] = True
+      elif self.top > 74:
+        self.auto_on[name] = False
+      return self.auto_on[name]
+    return False
+
+  def step(self, dt, max_step=5.0):
+    with self.lock:
+      while dt > 0:
+        h = min(dt, max_step)
+        self._step(h)
+        dt -= h
+      self.update_outputs()
+    self.notify()
+
+  def _step(self, dt):
+    self.update_consumers()
+    v = self.values
+    pk_available = v[pk.ready_name] and v[pk.at_gw_ok_name] and not v[pk.stoerung_name]
+    settings = {
+      'pk': v[pk.control_name] if pk_available else control.OFF,
+      'bwk': v[bwk.control_bwk_name],
+      'bhkw': v[bhkw.control_bhkw_name],
+    }
+    for name, setting in settings.items():
+      target = self.rated_power[name] if self.generator_on(name, setting) else 0.0
+      self.power[name] = lag(self.power[name], target, self.ramp_time[name], dt)
+      self.energy[name] += self.power[name] * dt / 3600
+    generation = sum(self.power.values())
+
+    # heating load grows as it gets colder outside
+    outdoor = self.outdoor_temperature()
+    load_28_42 = max(0.0, 0.9 * (20 - outdoor)) if v[heating_28_42_name] else 0.0
+    load_12_17_15 = max(0.0, 0.6 * (20 - outdoor)) if v[heating_12_17_15_name] else 0.0
+    load_tww = 25.0 if v[tww_charge_name] else 0.0
+    load = load_28_42 + load_12_17_15 + load_tww
+
+    # heat enters at the top, cold return water at the bottom
+    mixing = 0.3 * (self.top - self.bottom) # kW
+    losses = 0.02 * (self.top + self.bottom - 40)
+    capacity = self.tank_layer_capacity
+    self.top += dt * (0.8 * generation - 0.6 * load - mixing - losses / 2) / capacity
+    self.bottom += dt * (0.2 * generation - 0.4 * load + mixing - losses / 2) / capacity
+
+    # the return mixer adds return water to the supply
+    mix = 0.0
+    if v[mixer_onoff_name] == control.ON:
+      mix = min(max(v[mixer_value_name], 0), 100) / 100 * 0.5
+    self.supply = lag(self.supply, self.top - mix * (self.top - self.bottom), 60, dt)
+
+    # more pump flow, less cooling of the circuit's return
+    flow = 0.05
+    if v[feed_bws_name] == control.ON:
+      flow += 0.4 * min(max(v[feed_value_name], 0), 100) / 100
+    target = self.supply - load_12_17_15 / (flow * WATER_HEAT_CAPACITY) if load_12_17_15 else self.supply - 5
+    self.return_12_17_15 = lag(self.return_12_17_15, max(target, 20.0), 120, dt)
+
+    speed = 0.0
+    if v[tww_bws_name] == control.ON:
+      speed = min(max(v[tww_value_name], 0), 100) / 100
+    self.circulation = lag(self.circulation, min(self.top, 45 + 15 * speed), 300, dt)
+
+  def update_outputs(self):
+    v = self.values
+    self.update_consumers()
+    v[buffer_tank.on1_value_name] = round(self.top, 2)
+    v[buffer_tank.on2_value_name] = round(self.top - 0.5, 2)
+    v[buffer_tank.off1_value_name] = round(self.bottom, 2)
+    v[buffer_tank.off2_value_name] = round(self.bottom - 0.5, 2)
+    v[pk.power_name] = round(self.power['pk'], 3)
+    v[supply_name] = round(self.supply, 2)
+    v[return_12_17_15_name] = round(self.return_12_17_15, 2)
+    v[circulation_name] = round(self.circulation, 2)
+    v[f'{hotgas_name}.fOut'] = round(85 + 10 * math.sin(2 * math.pi * self.hours() / 3), 2)
@@ -0,0 +1,65 @@
+import threading
+import buffer_tank
+from ema import EMA
+from pk import PK
+from bwk import BWK
+from bhkw import BHKW
+from distribution import any_consumer_on, consumer_names
+
+class PlantState:
+  """Heat generation state shared by the on/off controllers, sampled once per tick"""
+
+  symbols = buffer_tank.value_names + PK.symbols + BWK.symbols + BHKW.symbols + consumer_names
+
+  def __init__(self, max_age=1.0):
+    self.max_age = max_age # seconds within which further updates reuse the sample
+    self.lock = threading.RLock()
+    self.last_update = None
+    self.pk = PK()
+    self.bwk = BWK()
+    self.bhkw = BHKW()
+    self.consumption = None
+    self.on_value = None
+    self.off_value = None
+    self.buffer_tank_ema_pairs = {} # decay_factor -> (on_value_ema, off_value_ema)
+
+  def update(self, now, state):
+    with self.lock:
+      if self.last_update is not None and (now - self.last_update).total_seconds() < self.max_age:
+        return
+      dt = (now - self.last_update).total_seconds() if self.last_update else None
+      self.last_update = now
+
+      self.pk.read(state)
+      self.bwk.read(state)
+      self.bhkw.read(state)
+      self.consumption = any_consumer_on(state)
+      self.on_value = min(state[buffer_tank.on1_value_name], state[buffer_tank.on2_value_name])
+      self.off_value = max(state[buffer_tank.off1_value_name], state[buffer_tank.off2_value_name])
+      for on_value_ema, off_value_ema in self.buffer_tank_ema_pairs.values():
+        on_value_ema.update(self.on_value, dt)
+        off_value_ema.update(self.off_value, dt)
+
+  def buffer_tank_emas(self, decay_factor):
+    with self.lock:
+      pair = self.buffer_tank_ema_pairs.get(decay_factor)
+      if pair is None:
+        pair = (EMA(decay_factor), EMA(decay_factor))
+        # continue from the pair with the closest half-life, as if its decay factor had been changed
+        if self.buffer_tank_ema_pairs:
+          closest = min(self.buffer_tank_ema_pairs, key=lambda other: abs(other - decay_factor))
+          pair[0].last, pair[1].last = (ema.last for ema in self.buffer_tank_ema_pairs[closest])
+        else:
+          pair[0].last, pair[1].last = self.on_value, self.off_value
+        self.buffer_tank_ema_pairs[decay_factor] = pair
+      return pair
+
+plant_states = {}
+plant_states_lock = threading.Lock()
+
+def plant_state_for(plc):
+  with plant_states_lock:
+    key = (plc.ams_net_id, plc.ams_port)
+    if key not in plant_states:
+      plant_states[key] = PlantState()
+    return plant_states[key]
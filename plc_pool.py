@@ -0,0 +1,199 @@
+import pyads
+import threading
+import time
+import metrics
+from ads_stats import ads_stats, estimated_size
+from read_planner import ReadPlanner
+from symbol_registry import SymbolRegistry
+from notification_cache import NotificationCache
+
+ads_call_seconds = metrics.registry.histogram('ads_call_seconds', 'Duration of ADS calls', ['connection', 'method'])
+ads_call_errors = metrics.registry.counter('ads_call_errors', 'ADS calls that raised an ADS error', ['connection', 'method'])
+plc_reconnects = metrics.registry.counter('plc_reconnects', 'Reconnects of a shared PLC connection', ['connection'])
+
+class SharedConnection:
+  """One pyads connection per (AMS net id, port), shared by all users in the process"""
+
+  def __init__(self, pool, ams_net_id, ams_port):
+    self.pool = pool
+    self.ams_net_id = ams_net_id
+    self.ams_port = ams_port
+    self.lock = threading.RLock()
+    self.refcount = 0
+    self.generation = 0
+    self.connection = pool.connection_factory(ams_net_id, ams_port)
+    self.planner = ReadPlanner(self)
+    self.symbols = SymbolRegistry(self)
+    self.notifications = NotificationCache(self)
+    self.label = f'{ams_net_id}:{ams_port}'
+    self.call_seconds = {} # method -> histogram, looked up once per method
+    self.reconnects = plc_reconnects.labels(self.label)
+
+  @property
+  def is_open(self):
+    return self.connection.is_open
+
+  def open(self):
+    with self.lock:
+      if not self.connection.is_open:
+        self.connection.open()
+
+  def close(self):
+    with self.lock:
+      try:
+        self.connection.close()
+      except Exception:
+        pass
+
+  def reconnect(self, generation=None):
+    # Callers pass the generation they saw when their call failed, so that
+    # only the first of several failing users actually reconnects.
+    with self.lock:
+      if generation is not None and generation != self.generation:
+        return False
+      self.notifications.invalidate()
+      self.symbols.invalidate()
+      self.close()
+      self.connection.open()
+      self.generation += 1
+      self.reconnects.inc()
+      self.notifications.resubscribe()
+      return True
+
+  def wait_until_running(self, retry_interval=5, stopped=None):
+    """Block until the PLC answers and is in RUN, for starting its users only once it does"""
+    stopped = stopped or threading.Event()
+    while not stopped.is_set():
+      try:
+        ads_state, _ = self.call('read_state')
+        if ads_state == pyads.ADSSTATE_RUN:
+          return True
+        print(f'PLC {self.label} is in state {ads_state}, waiting {retry_interval} seconds')
+      except pyads.ADSError as e:
+        print(f'PLC {self.label} does not answer ({e}), waiting {retry_interval} seconds')
+      stopped.wait(retry_interval)
+    return False
+
+  def call(self, method, *args, owner=None, **kwargs):
+    with self.lock:
+      if not self.connection.is_open:
+        self.connection.open()
+      histogram = self.call_seconds.get(method)
+      if histogram is None:
+        histogram = self.call_seconds[method] = ads_call_seconds.labels(self.label, method)
+      started = time.perf_counter()
+      try:
+        result = getattr(self.connection, method)(*args, **kwargs)
+      except pyads.ADSError as e:
+        seconds = time.perf_counter() - started
+        histogram.observe(seconds)
+        ads_call_errors.labels(self.label, method).inc()
+        names = tuple(args[0]) if method in ('read_list_by_name', 'write_list_by_name') else args[:1]
+        ads_stats.record(self.label, owner, method, seconds, names, dict, error=e.err_code)
+        raise
+      seconds = time.perf_counter() - started
+      histogram.observe(seconds)
+      symbol_errors = None
+      if method == 'write_list_by_name':
+        symbol_errors = {name: code for name, code in result.items() if code != 'no error'}
+      ads_stats.record(self.label, owner, method, seconds, *self._symbols(method, args, result), symbol_errors=symbol_errors)
+      return result
+
+  def _symbols(self, method, args, result):
+    """Symbols carried by a call, and a function returning their bytes, for the ADS statistics"""
+    if method == 'read_list_by_name':
+      return tuple(result), lambda: {name: self.symbols.size(name, value) for name, value in result.items()}
+    if method == 'write_list_by_name':
+      return tuple(args[0]), lambda: {name: self.symbols.size(name, value) for name, value in args[0].items()}
+    if method == 'read_by_name':
+      return args[:1], lambda: {args[0]: estimated_size(result, args[1] if len(args) > 1 else None)}
+    if method == 'write_by_name':
+      return args[:1], lambda: {args[0]: estimated_size(args[1], args[2] if len(args) > 2 else None)}
+    if method in ('get_symbol', 'add_device_notification'):
+      return args[:1], lambda: {args[0]: 0}
+    return (), dict
+
+class PooledConnection:
+  """Per-user handle on a SharedConnection with the pyads.Connection call interface"""
+
+  def __init__(self, shared, owner=None):
+    self.shared = shared
+    self.owner = owner
+
+  @property
+  def ams_net_id(self):
+    return self.shared.ams_net_id
+
+  @property
+  def ams_port(self):
+    return self.shared.ams_port
+
+  @property
+  def is_open(self):
+    return self.shared.is_open
+
+  @property
+  def generation(self):
+    return self.shared.generation
+
+  def open(self):
+    self.shared.open()
+
+  def reconnect(self, generation=None):
+    return self.shared.reconnect(generation)
+
+  def release(self):
+    self.shared.planner.forget(self.owner)
+    self.shared.pool.release(self)
+
+  def read_by_name(self, data_name, *args, **kwargs):
+    return self.shared.call('read_by_name', data_name, *args, owner=self.owner, **kwargs)
+
+  def write_by_name(self, data_name, value, *args, **kwargs):
+    return self.shared.call('write_by_name', data_name, value, *args, owner=self.owner, **kwargs)
+
+  def read_list_by_name(self, data_names, *args, **kwargs):
+    return self.shared.call('read_list_by_name', data_names, *args, owner=self.owner, **kwargs)
+
+  def write_list_by_name(self, data_names_and_values, *args, **kwargs):
+    return self.shared.call('write_list_by_name', data_names_and_values, *args, owner=self.owner, **kwargs)
+
+  def read_planned(self, data_names):
+    return self.shared.planner.read(data_names, self.owner)
+
+  def subscribe(self, data_names, **kwargs):
+    self.shared.notifications.subscribe(data_names, **kwargs)
+
+  def call(self, method, *args, **kwargs):
+    return self.shared.call(method, *args, owner=self.owner, **kwargs)
+
+class ConnectionPool:
+  """Process-wide registry of shared PLC connections"""
+
+  def __init__(self, connection_factory=pyads.Connection):
+    self.connection_factory = connection_factory
+    self.lock = threading.Lock()
+    self.connections = {}
+
+  def acquire(self, ams_net_id, ams_port, owner=None):
+    with self.lock:
+      key = (ams_net_id, ams_port)
+      shared = self.connections.get(key)
+      if shared is None:
+        shared = self.connections[key] = SharedConnection(self, ams_net_id, ams_port)
+      shared.refcount += 1
+    shared.open()
+    return PooledConnection(shared, owner)
+
+  def release(self, connection):
+    shared = connection.shared
+    with self.lock:
+      shared.refcount -= 1
+      if shared.refcount > 0:
+        return
+      self.connections.pop((shared.ams_net_id, shared.ams_port), None)
+    shared.notifications.invalidate()
+    shared.symbols.invalidate()
+    shared.close()
+
+plc_pool = ConnectionPool()
@@ -0,0 +1,125 @@
+import atexit
+import datetime
+import gzip
+import os
+import pickle
+import threading
+import time
+import pyads
+
+class TracingConnection:
+  """Wraps a module's PLC connection and collects the reads and writes of the current cycle"""
+
+  def __init__(self, plc):
+    self.plc = plc
+    self.io = []
+
+  def __getattr__(self, name):
+    return getattr(self.plc, name)
+
+  def read_planned(self, data_names):
+    started = time.perf_counter()
+    try:
+      values = self.plc.read_planned(data_names)
+    except pyads.ADSError as e:
+      self.io.append(('read_error', e.err_code, time.perf_counter() - started))
+      raise
+    self.io.append(('read', values, time.perf_counter() - started))
+    return values
+
+  def write_list_by_name(self, data_names_and_values, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+      results = self.plc.write_list_by_name(data_names_and_values, *args, **kwargs)
+    except pyads.ADSError as e:
+      self.io.append(('write_error', dict(data_names_and_values), e.err_code, time.perf_counter() - started))
+      raise
+    self.io.append(('write', dict(data_names_and_values), results, time.perf_counter() - started))
+    return results
+
+  def take_io(self):
+    io, self.io = self.io, []
+    return io
+
+class TraceRecorder:
+  """Appends pickled records to a gzip file; one record per cycle, parameter change or MQTT message
+
+  Records are tuples starting with the kind and the module name:
+    ('parameters', module, now, params)
+    ('mqtt', module, now, topic, payload, properties)
+    ('cycle', module, now, io, requested, diagnostics, seconds, inputs)
+
+  io lists the reads and writes that went to the PLC; requested holds all
+  writes of the cycle, including those the write buffer left out as unchanged.
+  inputs counts the module's parameters and mqtt records the cycle had seen;
+  records after those were written while the cycle was running.
+  """
+
+  def __init__(self, path, flush_interval=10):
+    self.path = path
+    self.flush_interval = flush_interval # seconds of records lost at most on a crash
+    self.lock = threading.Lock()
+    self.file = gzip.open(path, 'wb', compresslevel=1)
+    self.last_flush = time.monotonic()
+    self.modules = set() # modules whose parameters were recorded
+    self.input_counts = {} # parameters and mqtt records per module
+
+  def record(self, *record):
+    with self.lock:
+      if self.file is None:
+        return
+      pickle.dump(record, self.file, pickle.HIGHEST_PROTOCOL)
+      if record[0] in ('parameters', 'mqtt'):
+        self.input_counts[record[1]] = self.input_counts.get(record[1], 0) + 1
+      if time.monotonic() - self.last_flush > self.flush_interval:
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+  def parameters(self, module, now, params):
+    self.modules.add(module_name(module))
+    self.record('parameters', module_name(module), now, params)
+
+  def inputs(self, module, now):
+    # called with the module's parameter_lock held
+    if module_name(module) not in self.modules:
+      self.parameters(module, now, module._parameters())
+    return self.input_counts.get(module_name(module), 0)
+
+  def cycle(self, module, now, diagnostics, seconds):
+    io = module.plc.take_io() if isinstance(module.plc, TracingConnection) else []
+    requested, module.writes.requested = module.writes.requested, {}
+    self.record('cycle', module_name(module), now, io, requested, diagnostics, seconds, module.trace_inputs)
+
+  def mqtt(self, module, now, topic, payload, properties):
+    self.record('mqtt', module_name(module), now, topic, payload, properties)
+
+  def close(self):
+    with self.lock:
+      if self.file is not None:
+        self.file.close()
+        self.file = None
+
+def module_name(module):
+  # the python module, which holds the controller under the same name
+  return module.module_name
+
+def read_trace(path):
+  with gzip.open(path, 'rb') as f:
+    while True:
+      try:
+        yield pickle.load(f)
+      except (EOFError, gzip.BadGzipFile):
+        return
+
+def start_recording():
+  """Record to a new file in the PLC_TRACE directory, if set"""
+  directory = os.getenv('PLC_TRACE')
+  if not directory:
+    return None
+  os.makedirs(directory, exist_ok=True)
+  path = os.path.join(directory, datetime.datetime.now().strftime('trace-%Y%m%d-%H%M%S.pkl.gz'))
+  trace_recorder = TraceRecorder(path)
+  atexit.register(trace_recorder.close)
+  return trace_recorder
+
+recorder = start_recording()
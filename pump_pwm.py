@@ -3,8 +3,8 @@ from op import bounded
 import control
 
 class PumpPWM:
-  def __init__(self, plc, bws_name, value_name, pwm_range = -20):
-    self.plc = plc
+  def __init__(self, writes, bws_name, value_name, pwm_range = -20):
+    self.writes = writes
     self.bws_name = bws_name
     self.value_name = value_name
     self.pwm_range = pwm_range
@@ -27,12 +27,11 @@ class PumpPWM:
   def set_control(self, control):
     self.control = control
 
-  def update(self, now, control_delta):
+  def symbols(self):
+    return [self.bws_name, self.value_name]
+
+  def update(self, now, control_delta, state):
     if self.control is None:
-      state = self.plc.read_list_by_name([
-        self.bws_name,
-        self.value_name
-      ])
       self.control = self.control_range[0] if state[self.bws_name] else state[self.value_name]
 
     self.control = self.control + control_delta
@@ -42,15 +41,11 @@ class PumpPWM:
       # PWM range
       self.pwm.set_control((self.control - self.pwm_range) / (-self.pwm_range))
       pwm_control = self.pwm.update(now)
-      self.plc.write_list_by_name({
-        self.bws_name: control.ON if pwm_control['on'] else control.OFF,
-        self.value_name: 0
-      })
+      self.writes.write(self.bws_name, control.ON if pwm_control['on'] else control.OFF)
+      self.writes.write(self.value_name, 0)
       return { 'pwm': pwm_control }
 
-    self.plc.write_list_by_name({
-      self.bws_name: control.ON,
-      self.value_name: self.control
-    })
+    self.writes.write(self.bws_name, control.ON)
+    self.writes.write(self.value_name, self.control)
 
     return { 'speed': round(self.control) }
@@ -0,0 +1,104 @@
+import threading
+import pyads
+import clock
+
+# error of read_list_by_name when one of the symbols does not exist on the target
+ADSERR_DEVICE_SYMBOLNOTFOUND = 1808
+
+class ReadPlanner:
+  """Merges the symbols declared by all users of a connection into one sum-read per tick
+
+  Each user declares the symbols of its last read, so symbols a user stops
+  reading drop out. A symbol the target does not know fails the whole sum-read;
+  the planner then finds it by reading each user's symbols on their own and
+  leaves it out of the shared read until the next reconnect, so only the users
+  reading it fail.
+  """
+
+  def __init__(self, connection, max_age=1.0):
+    self.connection = connection
+    self.max_age = max_age # seconds a snapshot is shared between users
+    self.lock = threading.Lock()
+    self.declared = {} # owner -> symbols of its last read
+    self.excluded = set() # symbols not found on the target, read only by their users
+    self.excluded_generation = None
+    self.snapshot = {}
+    self.snapshot_time = None
+    self.snapshot_generation = None
+
+  @property
+  def symbols(self):
+    """Insertion-ordered union of the declared symbols"""
+    return {symbol: None for symbols in self.declared.values() for symbol in symbols}
+
+  def declare(self, symbols, owner=None):
+    with self.lock:
+      self.declared[owner] = list(symbols)
+
+  def forget(self, owner):
+    with self.lock:
+      self.declared.pop(owner, None)
+
+  def is_fresh(self, symbols):
+    if self.snapshot_time is None or self.snapshot_generation != self.connection.generation:
+      return False
+    if clock.monotonic() - self.snapshot_time > self.max_age:
+      return False
+    return all(symbol in self.snapshot for symbol in symbols)
+
+  def read(self, symbols, owner=None):
+    symbols = list(symbols)
+    if not symbols:
+      return {}
+    with self.lock:
+      self.declared[owner] = symbols
+      if self.excluded_generation != self.connection.generation:
+        # the PLC program may have changed, try the excluded symbols again
+        self.excluded = set()
+        self.excluded_generation = self.connection.generation
+      # symbols with a value pushed by a device notification are not polled
+      pushed = self.connection.notifications.latest(self.symbols)
+      polled = [symbol for symbol in symbols if symbol not in pushed]
+      if not polled:
+        return pushed
+      if self.excluded.intersection(polled):
+        # fails with the target's error for this user only
+        return self.connection.call('read_list_by_name', polled, owner=owner) | pushed
+      # users ticking together block here and then share the same snapshot
+      if not self.is_fresh(polled):
+        shared = [symbol for symbol in self.symbols if symbol not in pushed and symbol not in self.excluded]
+        try:
+          snapshot = self.connection.call('read_list_by_name', shared, owner=owner)
+        except pyads.ADSError as e:
+          if e.err_code != ADSERR_DEVICE_SYMBOLNOTFOUND:
+            raise
+          snapshot = self._isolate(pushed, owner)
+        self.snapshot = snapshot
+        self.snapshot_time = clock.monotonic()
+        self.snapshot_generation = self.connection.generation
+      if self.excluded.intersection(polled):
+        return self.connection.call('read_list_by_name', polled, owner=owner) | pushed
+      return self.snapshot | pushed
+
+  def _isolate(self, pushed, owner):
+    """Read each user's symbols on its own, excluding the symbols that fail alone; returns what was read"""
+    snapshot = {}
+    for symbols in list(self.declared.values()):
+      symbols = [symbol for symbol in symbols if symbol not in pushed and symbol not in self.excluded and symbol not in snapshot]
+      if not symbols:
+        continue
+      try:
+        snapshot |= self.connection.call('read_list_by_name', symbols, owner=owner)
+        continue
+      except pyads.ADSError as e:
+        if e.err_code != ADSERR_DEVICE_SYMBOLNOTFOUND:
+          raise
+      for symbol in symbols:
+        try:
+          snapshot |= self.connection.call('read_list_by_name', [symbol], owner=owner)
+        except pyads.ADSError as e:
+          if e.err_code != ADSERR_DEVICE_SYMBOLNOTFOUND:
+            raise
+          print(f"PLC symbol {symbol} not found, reading it only for the modules that declare it")
+          self.excluded.add(symbol)
+    return snapshot
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Feed a recorded PLC trace back through the control modules and diff their outputs
+
+  PLC_TRACE=traces python web_api.py        # record
+  python replay.py traces/trace-20260101-120000.pkl.gz
+"""
+
+import argparse
+import os
+import time
+
+# replaying must not record a new trace
+os.environ.pop('PLC_TRACE', None)
+
+import pyads
+import plc_trace
+import simulate
+
+class ReplayConnection:
+  """Stands in for a module's PLC connection and answers with the reads and write results of the trace"""
+
+  def __init__(self, plc):
+    self.plc = plc
+    self.io = []
+
+  def __getattr__(self, name):
+    return getattr(self.plc, name)
+
+  def play(self, io):
+    self.io = list(io)
+
+  def _next(self, *kinds):
+    while self.io:
+      entry = self.io.pop(0)
+      if entry[0] in kinds:
+        return entry
+    return None
+
+  def subscribe(self, data_names, **kwargs):
+    pass
+
+  def reconnect(self, generation=None):
+    return False
+
+  def read_planned(self, data_names):
+    entry = self._next('read', 'read_error')
+    if entry is None:
+      raise RuntimeError('No recorded read left in this cycle')
+    if entry[0] == 'read_error':
+      raise pyads.ADSError(err_code=entry[1])
+    return dict(entry[1])
+
+  def write_list_by_name(self, data_names_and_values, *args, **kwargs):
+    entry = self._next('write', 'write_error')
+    if entry is not None and entry[0] == 'write_error':
+      raise pyads.ADSError(err_code=entry[2])
+    results = entry[2] if entry is not None else {}
+    return {name: results.get(name, 'no error') for name in data_names_and_values}
+
+def differences(recorded, replayed, path=''):
+  """Yield (dotted path, recorded, replayed) for every value that differs"""
+  if isinstance(recorded, dict) and isinstance(replayed, dict):
+    for key in list(recorded) + [key for key in replayed if key not in recorded]:
+      yield from differences(recorded.get(key), replayed.get(key), f'{path}.{key}' if path else str(key))
+  elif recorded != replayed or type(recorded) is not type(replayed):
+    yield path, recorded, replayed
+
+def apply_input(controller, simulated_clock, record):
+  kind, _, now = record[:3]
+  simulated_clock.set(now)
+  if kind == 'parameters':
+    controller.set_parameters(record[3])
+  else:
+    controller.actual_circulation_mqtt(*record[3:6])
+
+def replay(path, names=None, on_mismatch=None):
+  """Replay the cycles of a trace in order; returns {module: (cycles, mismatching cycles)}"""
+  simulated_clock = None
+  controllers = {}
+  stats = {}
+  pending = {} # parameters and mqtt records not yet seen by a cycle
+  applied = {}
+  for record in plc_trace.read_trace(path):
+    kind, name, now = record[:3]
+    if names and name not in names:
+      continue
+    if simulated_clock is None:
+      # the controllers connect to the fake PLC
+      simulated_clock, _ = simulate.setup(now)
+    controller = controllers.get(name)
+    if controller is None:
+      controller = controllers[name] = simulate.load_controllers([name])[name]
+      controller.plc = controller.writes.plc = ReplayConnection(controller.plc)
+      stats[name] = [0, 0]
+      pending[name], applied[name] = [], 0
+
+    if kind in ('parameters', 'mqtt'):
+      pending[name].append(record)
+    elif kind == 'cycle':
+      io, requested, diagnostics = record[3:6]
+      # traces without input counts wrote every input before the cycles that saw it
+      seen = record[7] if len(record) > 7 else applied[name] + len(pending[name])
+      while applied[name] < seen and pending[name]:
+        apply_input(controller, simulated_clock, pending[name].pop(0))
+        applied[name] += 1
+      simulated_clock.set(now)
+      controller.plc.play(io)
+      replayed = controller.control_loop()
+      replayed_requested, controller.writes.requested = controller.writes.requested, {}
+      diffs = list(differences({'diagnostics': diagnostics, 'writes': requested},
+                               {'diagnostics': replayed, 'writes': replayed_requested}))
+      stats[name][0] += 1
+      if diffs:
+        stats[name][1] += 1
+        if on_mismatch:
+          on_mismatch(name, now, diffs)
+  return {name: tuple(counts) for name, counts in stats.items()}
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('trace')
+  parser.add_argument('--modules', help='comma separated modules to replay, default all in the trace')
+  parser.add_argument('--show', type=int, default=10, help='mismatching cycles to print')
+  args = parser.parse_args()
+
+  shown = 0
+
+  def on_mismatch(name, now, diffs):
+    nonlocal shown
+    if shown < args.show:
+      shown += 1
+      print(f"{now.isoformat()} {name}:")
+      for path, recorded, replayed in diffs:
+        print(f"  {path}: {recorded!r} -> {replayed!r}")
+
+  started = time.perf_counter()
+  stats = replay(args.trace, args.modules.split(',') if args.modules else None, on_mismatch)
+  print(f"Replayed in {time.perf_counter() - started:.1f} s")
+  for name, (cycles, mismatches) in stats.items():
+    print(f"  {name}: {cycles} cycles, {mismatches} differ")
+  return 1 if any(mismatches for _, mismatches in stats.values()) else 0
+
+if __name__ == '__main__':
+  exit(main())
@@ -6,7 +6,7 @@ import time
 import control
 from base_control_module import BaseControlModule
 from ema import EMA
-from distribution import any_consumer_on
+from distribution import any_consumer_on, consumer_names
 
 actual_value_name = 'PRG_HE.FB_Haus_28_42_12_17_15_VL_Temp.fOut'
 control_value_name = 'PRG_HE.FB_Zusatzspeicher.FB_Speicherladeset_Pumpe.FB_BWS_Sollwert.FB_PmSw.fWert'
@@ -55,14 +55,20 @@ class ReturnMixin(BaseControlModule):
       'decay_factor': self.I_ema.decay_factor
     }
 
+  def read_symbols(self):
+    return [actual_value_name, control_value_name, control_onoff_name] + consumer_names
+
+  def notification_symbols(self):
+    return [control_onoff_name] + consumer_names
+
   def any_consumer_on(self):
-    return any_consumer_on(self.plc)
+    return any_consumer_on(self.values)
 
   def _control_action(self, now):
     diagnostics = {}
     if self.last_control is None:
-      self.last_control = self.plc.read_by_name(control_value_name) \
-        if self.plc.read_by_name(control_onoff_name) == control.ON \
+      self.last_control = self.values[control_value_name] \
+        if self.values[control_onoff_name] == control.ON \
         else self.control_range[0]
 
     dt = (now - self.last_update).total_seconds() if self.last_update else None
@@ -70,13 +76,13 @@ class ReturnMixin(BaseControlModule):
     diagnostics['dt'] = dt
 
     if not self.any_consumer_on():
-      self.plc.write_by_name(control_onoff_name, control.OFF)
-      self.plc.write_by_name(control_value_name, 0)
+      self.writes.write(control_onoff_name, control.OFF)
+      self.writes.write(control_value_name, 0)
       diagnostics['no_consumers'] = True
       diagnostics['new_control_value'] = self.control_range[0]
       return diagnostics
 
-    actual_value = self.plc.read_by_name(actual_value_name)
+    actual_value = self.values[actual_value_name]
     error = actual_value - self.set_point
     I_error = self.I_ema.update(error, dt if dt else 0)
     D_error = self.D_ema.update(fd1(self.last_value, error, dt), dt if dt else 0)
@@ -104,19 +110,22 @@ class ReturnMixin(BaseControlModule):
     })
 
     if new_control_value <= self.control_range[0] / 2:
-      self.plc.write_by_name(control_onoff_name, control.OFF)
-      self.plc.write_by_name(control_value_name, 0)
+      self.writes.write(control_onoff_name, control.OFF)
+      self.writes.write(control_value_name, 0)
     else:
-      self.plc.write_by_name(control_onoff_name, control.ON)
-      self.plc.write_by_name(control_value_name, max(new_control_value, 0))
+      self.writes.write(control_onoff_name, control.ON)
+      self.writes.write(control_value_name, max(new_control_value, 0))
     self.last_control = new_control_value
 
     return diagnostics
 
-return_mixin = ReturnMixin()
-return_mixin.load_parameters()
+def create():
+  controller = ReturnMixin()
+  controller.load_parameters()
+  return controller
 
 def main(stop_requested):
+  return_mixin = create()
   return_mixin.enabled = True
   while not stop_requested():
     diagnostics = return_mixin.control_loop()
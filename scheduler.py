@@ -0,0 +1,161 @@
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import clock
+import metrics
+
+task_lateness = metrics.registry.histogram('scheduler_lateness_seconds', 'Delay of task runs past their deadline', ['task'])
+task_duration = metrics.registry.histogram('scheduler_run_seconds', 'Duration of task runs', ['task'])
+
+class TaskStats:
+  def __init__(self):
+    self.runs = 0
+    self.overruns = 0 # deadlines skipped because the previous run was still busy
+    self.missed = 0 # periods skipped because the scheduler fell behind
+    self.last_lateness = None
+    self.max_lateness = 0.0
+    self.total_lateness = 0.0
+    self.last_duration = None
+    self.max_duration = 0.0
+
+  def as_dict(self):
+    return {
+      'runs': self.runs,
+      'overruns': self.overruns,
+      'missed': self.missed,
+      'last_lateness': self.last_lateness,
+      'mean_lateness': self.total_lateness / self.runs if self.runs else None,
+      'max_lateness': self.max_lateness,
+      'last_duration': self.last_duration,
+      'max_duration': self.max_duration,
+    }
+
+class PeriodicTask:
+  def __init__(self, name, interval, func, is_async=False, setup=None):
+    self.name = name
+    self.interval = interval
+    self.func = func # callable, or coroutine function if is_async
+    self.is_async = is_async
+    self.setup = setup # coroutine function awaited once before the first async run
+    self.deadline = None
+    self.running = False
+    self.stats = TaskStats()
+    self.lateness = task_lateness.labels(name)
+    self.duration = task_duration.labels(name)
+
+class Scheduler:
+  """Runs periodic tasks on fixed monotonic deadlines with a bounded worker pool"""
+
+  def __init__(self, max_workers=4):
+    self.max_workers = max_workers
+    self.tasks = {}
+    self.queue = []
+    self.counter = itertools.count()
+    self.condition = threading.Condition()
+    self.executor = None
+    self.loop = None
+    self.loop_lock = threading.Lock()
+    self.stopped = False
+
+  def add_task(self, name, interval, func, is_async=False, setup=None):
+    """Add a task; once started, it runs right away and then every interval"""
+    task = PeriodicTask(name, interval, func, is_async, setup)
+    if is_async and self.executor is not None:
+      self._prepare_async(task)
+    with self.condition:
+      self.tasks[name] = task
+      if self.executor is not None:
+        self._schedule(task, clock.monotonic())
+        self.condition.notify()
+    return task
+
+  def start(self):
+    self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='control')
+    for task in list(self.tasks.values()):
+      if task.is_async:
+        self._prepare_async(task)
+    now = clock.monotonic()
+    with self.condition:
+      for task in self.tasks.values():
+        if task.deadline is None: # not yet scheduled by add_task
+          self._schedule(task, now)
+    threading.Thread(target=self._run, name='scheduler', daemon=True).start()
+
+  def _prepare_async(self, task):
+    with self.loop_lock:
+      if self.loop is None:
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name='control-async', daemon=True).start()
+    if task.setup:
+      asyncio.run_coroutine_threadsafe(task.setup(), self.loop).result()
+
+  def stop(self):
+    with self.condition:
+      self.stopped = True
+      self.condition.notify()
+    if self.executor is not None:
+      self.executor.shutdown(wait=False)
+    if self.loop is not None:
+      self.loop.call_soon_threadsafe(self.loop.stop)
+
+  def stats(self):
+    return {name: task.stats.as_dict() for name, task in self.tasks.items()}
+
+  def _schedule(self, task, deadline):
+    task.deadline = deadline
+    heapq.heappush(self.queue, (deadline, next(self.counter), task))
+
+  def _run(self):
+    with self.condition:
+      while not self.stopped:
+        next_deadline = self.run_due(clock.monotonic())
+        if next_deadline is None:
+          self.condition.wait()
+        else:
+          self.condition.wait(max(0.0, next_deadline - clock.monotonic()))
+
+  def run_due(self, now):
+    """Dispatch the tasks due at now, earliest deadline first; returns the next deadline, None without tasks"""
+    with self.condition:
+      while self.queue and self.queue[0][0] <= now:
+        deadline, _, task = heapq.heappop(self.queue)
+        self._dispatch(task, now)
+        # next deadline is derived from the previous one, not from the end of
+        # the run, so the period does not drift with execution time
+        next_deadline = deadline + task.interval
+        if next_deadline <= now:
+          # skip every period up to now, one that ends right now included
+          missed = math.floor((now - next_deadline) / task.interval) + 1
+          task.stats.missed += missed
+          next_deadline += missed * task.interval
+        self._schedule(task, next_deadline)
+      return self.queue[0][0] if self.queue else None
+
+  def _dispatch(self, task, now):
+    if task.running:
+      task.stats.overruns += 1
+      return
+    task.running = True
+    lateness = now - task.deadline
+    task.stats.last_lateness = lateness
+    task.stats.max_lateness = max(task.stats.max_lateness, lateness)
+    task.stats.total_lateness += lateness
+    task.lateness.observe(lateness)
+    if task.is_async:
+      future = asyncio.run_coroutine_threadsafe(task.func(), self.loop)
+    else:
+      future = self.executor.submit(task.func)
+    future.add_done_callback(lambda future: self._finished(task, now, future))
+
+  def _finished(self, task, started, future):
+    duration = clock.monotonic() - started
+    task.stats.runs += 1
+    task.stats.last_duration = duration
+    task.stats.max_duration = max(task.stats.max_duration, duration)
+    task.duration.observe(duration)
+    task.running = False
+    if not future.cancelled() and future.exception() is not None:
+      print(f"Error in task {task.name}: {future.exception()!r}")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run control modules against the plant model on a simulated clock
+
+  python simulate.py --hours 24 --modules return_mixin,pk_onoff,bwk_onoff,bhkw_onoff
+  python simulate.py --hours 24 --modules pk_onoff,bwk_onoff,bhkw_onoff --step-test return_mixin --output steps.jsonl
+"""
+
+import argparse
+import datetime
+import glob
+import importlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import clock
+import control
+import plant_model
+from plc_pool import plc_pool
+from plant_model import PlantModel
+from fake_plc import FakePLC
+
+# cycle times as configured in web_api.py
+intervals = {
+  'return_mixin': 5,
+  'bwk_onoff': 30,
+  'pk_onoff': 30,
+  'bhkw_onoff': 30,
+  'restart_wp_11': 5,
+  'tww_11': 30,
+  'feed_121517': 30,
+}
+
+# actuator, on/off switch and measurement of the loops --step-test drives open loop
+step_tests = {
+  'return_mixin': (plant_model.mixer_value_name, plant_model.mixer_onoff_name, plant_model.supply_name),
+}
+
+class StepTest:
+  """Drives a loop's actuator through random steps in place of its control module
+
+  identify.py needs the input to move on its own; in closed loop the
+  controller holds the measurement near its set point and the fits mostly
+  see noise. Diagnostics carry new_control_value and actual_value.
+  """
+
+  def __init__(self, model, name, levels=(0, 100), hold=(600, 2400), seed=0):
+    self.model = model
+    self.value_name, self.onoff_name, self.actual_name = step_tests[name]
+    self.levels = levels
+    self.hold = hold
+    self.rng = random.Random(seed)
+    self.enabled = True
+    self.control = None
+    self.next_step = None
+
+  def control_loop(self):
+    now = clock.now()
+    if self.next_step is None or now >= self.next_step:
+      self.control = self.rng.uniform(*self.levels)
+      self.next_step = now + datetime.timedelta(seconds=self.rng.uniform(*self.hold))
+    self.model.write(self.onoff_name, control.ON)
+    self.model.write(self.value_name, self.control)
+    return {
+      'timestamp': now.replace(microsecond=0).isoformat(),
+      'new_control_value': self.control,
+      'actual_value': self.model.read(self.actual_name),
+    }
+
+def setup(start=None, latency=0.0):
+  """Install the simulated clock and the fake PLC; call before creating any controller"""
+  # modules save their parameters on load, keep the real files untouched
+  if 'PARAM_DIR' not in os.environ:
+    os.environ['PARAM_DIR'] = tempfile.mkdtemp(prefix='simulate-')
+    for pattern in ('parameters.json', '*_params.json', 'restart_wp_11.json'):
+      for filename in glob.glob(os.path.join(os.path.dirname(__file__), pattern)):
+        shutil.copy(filename, os.environ['PARAM_DIR'])
+  simulated_clock = clock.SimulatedClock(start)
+  clock.set_clock(simulated_clock)
+  model = PlantModel(simulated_clock)
+  plc_pool.connection_factory = lambda ams_net_id, ams_port: FakePLC(model, ams_net_id, ams_port, latency=latency)
+  return simulated_clock, model
+
+def load_controllers(names):
+  return {name: importlib.import_module(name).create() for name in names}
+
+def run(controllers, simulated_clock, model, seconds, step=1.0, on_cycle=None):
+  next_run = {name: 0.0 for name in controllers}
+  for controller in controllers.values():
+    controller.enabled = True
+  elapsed = 0.0
+  while elapsed < seconds:
+    for name, controller in controllers.items():
+      if elapsed >= next_run[name]:
+        diagnostics = controller.control_loop()
+        next_run[name] += intervals.get(name, 30)
+        if on_cycle:
+          on_cycle(name, elapsed, diagnostics)
+    model.step(step)
+    simulated_clock.advance(step)
+    elapsed += step
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--hours', type=float, default=24)
+  parser.add_argument('--step', type=float, default=1.0, help='model and clock step in seconds')
+  parser.add_argument('--start', type=datetime.datetime.fromisoformat, default=None, help='simulated start time, ISO format')
+  parser.add_argument('--modules', default='return_mixin,pk_onoff,bwk_onoff,bhkw_onoff')
+  parser.add_argument('--output', help='write all diagnostics to this file as JSON lines')
+  parser.add_argument('--step-test', choices=sorted(step_tests),
+                      help='drive this loop open loop through random steps instead of running its module, for identify.py')
+  args = parser.parse_args()
+
+  simulated_clock, model = setup(args.start)
+  controllers = load_controllers([name for name in args.modules.split(',') if name != args.step_test])
+  if args.step_test:
+    controllers[args.step_test] = StepTest(model, args.step_test)
+
+  output = open(args.output, 'w') if args.output else None
+  cycles = {name: 0 for name in controllers}
+  exceptions = {name: 0 for name in controllers}
+  tank = [None, None]
+
+  def on_cycle(name, elapsed, diagnostics):
+    cycles[name] += 1
+    if 'exception' in diagnostics:
+      exceptions[name] += 1
+    top = model.top
+    tank[0] = top if tank[0] is None else min(tank[0], top)
+    tank[1] = top if tank[1] is None else max(tank[1], top)
+    if output:
+      output.write(json.dumps({'module': name, 'elapsed': elapsed, 'diagnostics': diagnostics}) + '\n')
+
+  started = time.perf_counter()
+  try:
+    run(controllers, simulated_clock, model, args.hours * 3600, args.step, on_cycle)
+  finally:
+    if output:
+      output.close()
+  wall = time.perf_counter() - started
+
+  print(f"Simulated {args.hours:g} h in {wall:.1f} s ({args.hours * 3600 / wall:.0f}x real time)")
+  for name in controllers:
+    print(f"  {name}: {cycles[name]} cycles, {exceptions[name]} exceptions")
+  print(f"  buffer tank top: {tank[0]:.1f} .. {tank[1]:.1f} degrees")
+  print("  heat generated: " + ', '.join(f"{name} {energy:.0f} kWh" for name, energy in model.energy.items()))
+  return 0
+
+if __name__ == '__main__':
+  exit(main())
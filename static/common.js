@@ -26,6 +26,66 @@ async function apiPost(endpoint, data) {
   });
 }
 
+// Shows the startup state until the controller runs, then calls onRunning
+async function watchControllerState(endpoint, onRunning) {
+  const element = document.getElementById("controller-state");
+  const status = await apiGet(endpoint);
+  if (status.state === "running") {
+    element.hidden = true;
+    onRunning();
+    return;
+  }
+  element.hidden = false;
+  element.innerText = status.error ? `${status.state}: ${status.error}` : `${status.state}...`;
+  if (status.state !== "failed") {
+    setTimeout(() => watchControllerState(endpoint, onRunning), 2000);
+  }
+}
+
+// Incremental diagnostics: keeps the rows received so far and only fetches newer ones
+function createDiagnosticsFeed(endpoint, maxRows = 1000) {
+  const feed = { rows: [], cursor: 0 };
+  feed.append = function (entries) {
+    feed.rows.push(...entries);
+    if (feed.rows.length > maxRows) {
+      feed.rows.splice(0, feed.rows.length - maxRows);
+    }
+  };
+  feed.fetch = async function () {
+    const data = await apiGet(`${endpoint}?since=${feed.cursor}`);
+    if (data.reset) {
+      feed.rows = [];
+    }
+    feed.append(data.entries);
+    feed.cursor = data.cursor;
+    return feed.rows.slice();
+  };
+  // Live updates via server-sent events; onUpdate is called at most once per frame
+  feed.stream = function (onUpdate) {
+    const source = new EventSource(`${endpoint}/stream?since=${feed.cursor}`);
+    let scheduled = false;
+    const update = () => {
+      if (scheduled) return;
+      scheduled = true;
+      requestAnimationFrame(() => {
+        scheduled = false;
+        onUpdate(feed.rows.slice());
+      });
+    };
+    source.addEventListener("reset", () => {
+      feed.rows = [];
+      update();
+    });
+    source.onmessage = (event) => {
+      feed.append([JSON.parse(event.data)]);
+      feed.cursor = Number(event.lastEventId);
+      update();
+    };
+    return source;
+  };
+  return feed;
+}
+
 // Common table utilities
 function createTableCell(content, className) {
   const td = document.createElement("td");
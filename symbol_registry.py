@@ -0,0 +1,48 @@
+import threading
+from ads_stats import estimated_size
+
+class SymbolRegistry:
+  """Symbol info (index group and offset, size, type) of the symbols read and written by name
+
+  pyads looks every symbol of read_list_by_name and write_list_by_name up once
+  and keeps the result in the connection. The registry owns that cache, so it
+  is cleared on reconnects, when a new PLC program may have moved the symbols,
+  and the symbol sizes are known for the ADS statistics. Datatypes, which
+  device notifications need, are looked up once as well.
+  """
+
+  def __init__(self, shared):
+    self.shared = shared
+    self.lock = threading.Lock()
+    self.infos = {} # name -> pyads SAdsSymbolEntry, filled by pyads
+    self.datatypes = {} # name -> plc datatype
+    self.generation = 0 # of the cache, counts invalidations
+    # a pyads.Connection keeps the cache in _symbol_info_cache (pyads 3.3 and later)
+    if hasattr(shared.connection, '_symbol_info_cache'):
+      shared.connection._symbol_info_cache = self.infos
+
+  def datatype(self, name):
+    plc_datatype = self.datatypes.get(name)
+    if plc_datatype is not None:
+      return plc_datatype
+    # looked up without holding the lock: SharedConnection.reconnect holds the
+    # connection lock while it invalidates the registry
+    with self.lock:
+      generation = self.generation
+    plc_datatype = self.shared.call('get_symbol', name).plc_type
+    with self.lock:
+      # a lookup from before a reconnect may be stale
+      if generation == self.generation:
+        self.datatypes[name] = plc_datatype
+    return plc_datatype
+
+  def size(self, name, value=None):
+    """Bytes of a symbol on the wire, estimated from the value until pyads looked it up"""
+    info = self.infos.get(name)
+    return info.size if info is not None else estimated_size(value)
+
+  def invalidate(self):
+    with self.lock:
+      self.infos.clear()
+      self.datatypes = {}
+      self.generation += 1
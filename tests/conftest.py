@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datetime
+import pyads
+import pytest
+import clock
+import parameter_store
+import simulate
+from plc_pool import plc_pool
+
+@pytest.fixture
+def simulated_clock():
+  """Simulated clock installed for the test, for code that reads clock.monotonic() and clock.now()"""
+  simulated_clock = clock.SimulatedClock(datetime.datetime(2026, 1, 1))
+  clock.set_clock(simulated_clock)
+  yield simulated_clock
+  clock.set_clock(clock.SystemClock())
+
+@pytest.fixture
+def plant(tmp_path, monkeypatch):
+  """Simulated clock, plant model and fake PLC, with the parameters kept in tmp_path"""
+  monkeypatch.setenv('PARAM_DIR', str(tmp_path))
+  simulated_clock, model = simulate.setup(datetime.datetime(2026, 1, 1))
+  yield simulated_clock, model
+  parameter_store.flush_all()
+  parameter_store.stores.clear()
+  plc_pool.connections.clear()
+  plc_pool.connection_factory = pyads.Connection
+  clock.set_clock(clock.SystemClock())
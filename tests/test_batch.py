@@ -0,0 +1,48 @@
+import datetime
+import numpy as np
+from batch import BatchEMA, BatchFD1, BatchPID, BatchPWM, scan
+from ema import EMA
+from op import FD1
+from pid import PID
+from pwm import PWM
+
+rng = np.random.default_rng(0)
+# variable sample intervals, the first one is not used
+dts = np.concatenate(([0.0], rng.uniform(1, 60, 199)))
+errors = np.cumsum(rng.normal(0, 0.5, 200))
+
+def scalar_series(operator, values, dts):
+  return [operator.update(value, dt if i else None) for i, (value, dt) in enumerate(zip(values, dts))]
+
+def test_ema():
+  decay_factors = np.array([0.5 ** (1 / 10), 0.5 ** (1 / 300), 0.999])
+  batch = scan(BatchEMA(decay_factors), errors, dts)
+  for column, decay_factor in enumerate(decay_factors):
+    assert np.allclose(batch[:, column], scalar_series(EMA(decay_factor), errors, dts), rtol=1e-12, atol=1e-12)
+
+def test_fd1():
+  batch = scan(BatchFD1(), errors, dts)
+  assert np.allclose(batch, scalar_series(FD1(), errors, dts), rtol=1e-12, atol=1e-12)
+
+def test_pid():
+  Kp, Ki, Kd = rng.uniform(0.01, 1, 5), rng.uniform(0.01, 1, 5), rng.uniform(0, 30, 5)
+  decay = 0.5 ** (1 / rng.uniform(10, 3600, 5))
+  batch = scan(BatchPID(Kp, Ki, Kd, decay), errors, dts)
+  for column in range(5):
+    scalar = scalar_series(PID(Kp[column], Ki[column], Kd[column], decay[column]), errors, dts)
+    assert np.allclose(batch[:, column], scalar, rtol=1e-9, atol=1e-12)
+
+def test_pwm():
+  periods = np.array([60.0, 300.0, 900.0])
+  start = datetime.datetime(2026, 1, 1)
+  batch = BatchPWM(periods)
+  scalars = [PWM(period) for period in periods]
+  t = 0.0
+  for k in range(400):
+    t += float(rng.integers(1, 60))
+    control = rng.uniform(0, 1, 3)
+    batch.set_control(control)
+    on = batch.update(t)
+    for column, scalar in enumerate(scalars):
+      scalar.set_control(control[column])
+      assert scalar.update(start + datetime.timedelta(seconds=t))['on'] == on[column]
@@ -0,0 +1,36 @@
+from columnar_buffer import ColumnarBuffer
+
+def test_round_trip():
+  buffer = ColumnarBuffer(4)
+  entries = [{'timestamp': f't{i}', 'value': i, 'nested': {'on': i % 2 == 0, 'x': i / 2}} for i in range(6)]
+  for entry in entries:
+    buffer.append(entry)
+  assert [entry for _, entry in buffer.read()] == entries[-4:]
+
+def test_repeated_strings_stay_categorical():
+  buffer = ColumnarBuffer(10)
+  for i in range(1000):
+    buffer.append({'state': ('on', 'off', 'standby')[i % 3]})
+  assert buffer.columns[('state',)].kind == 'str'
+  assert len(buffer.columns[('state',)].categories) == 3
+
+def test_unique_strings_stay_bounded():
+  capacity = 100
+  buffer = ColumnarBuffer(capacity)
+  for i in range(2 * capacity):
+    buffer.append({'timestamp': f'2026-01-01T00:00:{i:05d}'})
+  size = buffer.nbytes()
+  for i in range(2 * capacity, 50000):
+    buffer.append({'timestamp': f'2026-01-01T00:00:{i:05d}'})
+  column = buffer.columns[('timestamp',)]
+  assert column.kind == 'object'
+  assert buffer.nbytes() <= size * 1.1
+  assert [entry['timestamp'] for _, entry in buffer.read()] == [f'2026-01-01T00:00:{i:05d}' for i in range(50000 - capacity, 50000)]
+
+def test_nbytes_counts_categories():
+  buffer = ColumnarBuffer(100)
+  buffer.append({'text': 'a'})
+  size = buffer.nbytes()
+  for i in range(50):
+    buffer.append({'text': 'x' * 1000 + str(i)})
+  assert buffer.nbytes() >= size + 50 * 1000
@@ -0,0 +1,21 @@
+import time
+from diagnostics_store import DiagnosticsStore
+
+def test_stop_writes_the_pending_batch(tmp_path):
+  store = DiagnosticsStore(str(tmp_path / 'diagnostics.sqlite3'), batch_interval=60)
+  store.start()
+  thread = store.thread
+  now = time.time()
+  for seq in range(1, 11):
+    store.append('return-mixin', seq, {'error': seq * 0.1}, ts=now + seq)
+  started = time.monotonic()
+  store.stop()
+  # without waiting out the batch interval
+  assert time.monotonic() - started < 10
+  assert not thread.is_alive()
+  assert [entry['error'] for _, entry in store.query('return-mixin')] == [seq * 0.1 for seq in range(1, 11)]
+
+def test_stop_without_start(tmp_path):
+  store = DiagnosticsStore(str(tmp_path / 'diagnostics.sqlite3'))
+  store.stop()
+  assert store.thread is None
@@ -0,0 +1,47 @@
+import pytest
+import web_api
+from diagnostics_store import DiagnosticsStore
+from history import HistoryQuery, MAX_POINTS
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+  store = DiagnosticsStore(str(tmp_path / 'diagnostics.sqlite3'))
+  store.start()
+  with store.connect() as connection:
+    connection.executemany('INSERT INTO diagnostics (controller, ts, seq, data) VALUES (?, ?, ?, ?)',
+                           [('return-mixin', 1000.0 + i, i, f'{{"value": {i}}}') for i in range(3600)])
+  monkeypatch.setattr(web_api, 'history_query', HistoryQuery(store))
+  monkeypatch.setattr(web_api.controller_manager, 'store', store)
+  return web_api.app.test_client()
+
+def test_downsampled(client):
+  response = client.get('/api/return-mixin/history/downsampled?fields=value&start=1000&end=4600&points=60')
+  assert response.status_code == 200
+  assert sum(response.json['fields']['value']['count']) == 3600
+
+def test_points_are_clamped(client):
+  response = client.get('/api/return-mixin/history/downsampled?fields=value&start=0&end=100000000&points=100000000')
+  assert response.status_code == 200
+  assert len(response.json['t']) <= MAX_POINTS + 1
+  response = client.get('/api/return-mixin/history/downsampled?fields=value&start=1000&end=4600&points=100000000&method=lttb')
+  assert len(response.json['fields']['value']['t']) <= MAX_POINTS
+
+@pytest.mark.parametrize('query', ['start=2000&end=1000', 'points=0', 'start=yesterday'])
+def test_bad_queries(client, query):
+  response = client.get(f'/api/return-mixin/history/downsampled?fields=value&{query}')
+  assert response.status_code == 400
+
+def test_history(client):
+  response = client.get('/api/return-mixin/history?start=1000&end=1010')
+  assert response.status_code == 200
+  assert [row['data']['value'] for row in response.json] == list(range(10))
+
+def test_history_rows_are_clamped(client, monkeypatch):
+  monkeypatch.setattr(web_api, 'MAX_ROWS', 100)
+  assert len(client.get('/api/return-mixin/history').json) == 100
+  assert len(client.get('/api/return-mixin/history?limit=100000000').json) == 100
+  assert len(client.get('/api/return-mixin/history?limit=7').json) == 7
+
+@pytest.mark.parametrize('query', ['start=2000&end=1000', 'limit=0', 'start=yesterday', 'end=soon'])
+def test_bad_history_queries(client, query):
+  assert client.get(f'/api/return-mixin/history?{query}').status_code == 400
@@ -0,0 +1,49 @@
+import datetime
+import numpy as np
+import identify
+
+def fopdt_series(n, dt=5.0, gain=-0.1, tau=300.0, delay=6, seed=0):
+  """Random steps of u through a first-order plant with dead time, plus a little noise"""
+  rng = np.random.default_rng(seed)
+  u = np.repeat(rng.uniform(0, 100, n // 120 + 1), 120)[:n]
+  a = np.exp(-dt / tau)
+  y = np.empty(n)
+  y[:delay + 1] = 60 + gain * u[0]
+  for k in range(delay, n - 1):
+    y[k + 1] = a * y[k] + (1 - a) * (60 + gain * u[k - delay])
+  return u, y + rng.normal(0, 0.002, n)
+
+def test_fit_recovers_fopdt():
+  u, y = fopdt_series(5000)
+  fit = identify.fit_arx_windows(u, y, 720, max_delay=12)
+  model = identify.fopdt(fit, 5.0)
+  accepted = model['accepted']
+  assert accepted.sum() > len(accepted) / 2
+  assert np.allclose(np.median(model['gain'][accepted]), -0.1, rtol=0.05)
+  assert np.allclose(np.median(model['tau'][accepted]), 300, rtol=0.1)
+  assert np.median(model['dead_time'][accepted]) == 30
+
+def test_constant_input_is_rejected_for_excitation():
+  u, y = fopdt_series(2000)
+  u[:] = 50
+  fit = identify.fit_arx_windows(u, y, 360, max_delay=12)
+  model = identify.fopdt(fit, 5.0, min_u_std=0.1)
+  assert not model['accepted'].any()
+  assert model['rejected']['excitation'] == len(fit['r2'])
+
+def test_window_start_indexes_the_series():
+  n, window, max_delay = 1000, 100, 12
+  fit = identify.fit_arx_windows(np.arange(n, dtype=float), np.arange(n, dtype=float), window, max_delay=max_delay)
+  # the first window predicts y[max_delay + 1], the last one ends at the end of the series
+  assert fit['start'][0] == max_delay + 1
+  assert fit['start'][-1] + window <= n
+
+def test_by_day_counts_windows_across_midnight_by_their_middle():
+  midnight = datetime.datetime(2026, 1, 2).timestamp()
+  model = {name: np.zeros(2) for name in ('gain', 'tau', 'dead_time', 'r2')}
+  model['accepted'] = np.array([True, True])
+  # windows of an hour from 23:20 and from 23:40
+  days = identify.by_day(model, np.array([midnight - 1200 + 1800, midnight - 600 + 1800]))
+  assert [(day['day'], day['windows']) for day in days] == [('2026-01-02', 2)]
+  days = identify.by_day(model, np.array([midnight - 2400 + 1800, midnight - 600 + 1800]))
+  assert [(day['day'], day['windows']) for day in days] == [('2026-01-01', 1), ('2026-01-02', 1)]
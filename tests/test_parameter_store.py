@@ -0,0 +1,125 @@
+import json
+import os
+import time
+import parameter_store
+import return_mixin
+import restart_wp_11
+from parameter_store import ParameterStore
+
+def test_round_trip(tmp_path):
+  path = str(tmp_path / 'parameters.json')
+  store = ParameterStore(path)
+  store.set('a', {'x': 1})
+  store.set('b', {'y': 2})
+  assert store.get('a') == {'x': 1}
+  assert not os.path.exists(path) # written behind
+  store.flush()
+  reloaded = ParameterStore(path)
+  assert reloaded.get('a') == {'x': 1}
+  assert reloaded.get('b') == {'y': 2}
+  assert [(entry['controller'], entry['version']) for entry in reloaded.entries()] == [('a', 1), ('b', 2)]
+  assert sorted(os.listdir(tmp_path)) == ['parameters.json', 'parameters.json.bak']
+
+def test_unchanged_parameters_are_not_journaled(tmp_path):
+  store = ParameterStore(str(tmp_path / 'parameters.json'))
+  store.set('a', {'x': 1})
+  store.flush()
+  store.set('a', {'x': 1})
+  store.flush()
+  assert len(store.entries('a')) == 1
+
+def test_changes_are_written_behind(tmp_path):
+  path = str(tmp_path / 'parameters.json')
+  store = ParameterStore(path, delay=0.05)
+  for x in range(10):
+    store.set('a', {'x': x})
+  store.thread.join(0.5)
+  with open(path) as f:
+    data = json.load(f)
+  assert data['controllers'] == {'a': {'x': 9}}
+  assert len(data['journal']) == 1
+
+def test_failed_write_keeps_old_file(tmp_path, monkeypatch):
+  path = str(tmp_path / 'parameters.json')
+  store = ParameterStore(path)
+  store.set('a', {'x': 1})
+  store.flush()
+  def fail(data):
+    raise OSError('disk full')
+  monkeypatch.setattr(store, '_write', fail)
+  store.set('a', {'x': 2})
+  store.flush()
+  assert ParameterStore(path).get('a') == {'x': 1}
+  monkeypatch.undo()
+  store.flush()
+  assert ParameterStore(path).get('a') == {'x': 2}
+  assert [entry['version'] for entry in store.entries('a')] == [1, 2]
+
+def test_key_is_module_name(plant):
+  controller = return_mixin.create()
+  assert controller.module_name == 'return_mixin'
+  assert restart_wp_11.create().module_name == 'restart_wp_11'
+
+def test_migrates_old_parameter_file(plant, tmp_path):
+  with open(tmp_path / 'return_mixin_params.json', 'w') as f:
+    json.dump({'enabled': False, 'set_point': 58.5}, f)
+  controller = return_mixin.create()
+  assert controller.enabled is False
+  assert controller.set_point == 58.5
+  parameter_store.flush_all()
+  with open(tmp_path / 'parameters.json') as f:
+    assert json.load(f)['controllers']['return_mixin']['set_point'] == 58.5
+  # from now on parameters.json wins
+  with open(tmp_path / 'return_mixin_params.json', 'w') as f:
+    json.dump({'set_point': 40}, f)
+  assert return_mixin.create().set_point == 58.5
+
+def test_rollback(plant):
+  controller = return_mixin.create()
+  store = controller.parameter_store
+  store.flush()
+  version = store.entries('return_mixin')[-1]['version']
+  original = controller.get_parameters()
+  controller.set_parameters(original | {'set_point': 70})
+  store.flush()
+  assert controller.set_point == 70
+  assert controller.rollback_parameters(version)
+  assert controller.get_parameters() == original
+  assert not controller.rollback_parameters(12345)
+  store.flush()
+  assert [entry['parameters']['set_point'] for entry in store.entries('return_mixin')] == [original['set_point'], 70, original['set_point']]
+
+def test_damaged_file_falls_back_to_the_backup(tmp_path):
+  path = str(tmp_path / 'parameters.json')
+  store = ParameterStore(path)
+  store.set('a', {'x': 1})
+  store.flush()
+  with open(path) as f:
+    text = f.read()
+  with open(path, 'w') as f:
+    f.write(text[:len(text) // 2])
+  reloaded = ParameterStore(path)
+  assert reloaded.get('a') == {'x': 1}
+  assert [entry['version'] for entry in reloaded.entries('a')] == [1]
+  # the damaged file is kept aside
+  assert os.path.exists(path + '.corrupt')
+
+def test_damaged_file_without_backup(tmp_path, plant):
+  path = tmp_path / 'parameters.json'
+  path.write_text('{"controllers": ')
+  assert ParameterStore(str(path)).get('return_mixin') is None
+  # the controllers start with their defaults
+  path.write_text('[]')
+  controller = return_mixin.create()
+  assert controller.get_parameters()['set_point'] == 63.5
+  controller.plc.release()
+
+def test_old_temp_files_are_removed(tmp_path):
+  old = tmp_path / '.parameters-old.tmp'
+  new = tmp_path / '.parameters-new.tmp'
+  old.write_text('{')
+  new.write_text('{')
+  os.utime(old, (time.time() - 3600, time.time() - 3600))
+  ParameterStore(str(tmp_path / 'parameters.json'))
+  assert not old.exists()
+  assert new.exists()
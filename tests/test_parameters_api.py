@@ -0,0 +1,40 @@
+import pytest
+import parameter_store
+import simulate
+import web_api
+
+@pytest.fixture
+def client(plant, monkeypatch):
+  module = simulate.load_controllers(['return_mixin'])['return_mixin']
+  monkeypatch.setattr(web_api.controller_manager.controllers['return-mixin'], 'module', module)
+  yield web_api.app.test_client()
+  module.plc.release()
+
+@pytest.mark.parametrize('kwargs', [{}, {'data': 'Kp=1'}, {'json': [1, 2]}, {'json': 'Kp'}])
+def test_parameters_need_a_json_object(client, kwargs):
+  response = client.post('/api/return-mixin/parameters', **kwargs)
+  assert response.status_code == 400
+
+def test_parameters_post(client):
+  response = client.post('/api/return-mixin/parameters', json={'Kp': 0.2})
+  assert response.status_code == 200
+  assert response.json['Kp'] == 0.2
+
+@pytest.mark.parametrize('kwargs', [{}, {'data': 'version=1'}, {'json': {}}, {'json': {'version': '1'}},
+                                    {'json': {'version': 1.5}}, {'json': {'version': True}}, {'json': [1]}])
+def test_rollback_needs_an_integer_version(client, kwargs):
+  response = client.post('/api/return-mixin/parameters/rollback', **kwargs)
+  assert response.status_code == 400
+  assert response.json == {'error': 'version must be an integer'}
+
+def test_rollback(client):
+  # each write of the file journals one parameter set
+  for Kp in (0.2, 0.3):
+    client.post('/api/return-mixin/parameters', json={'Kp': Kp})
+    parameter_store.flush_all()
+  journal = client.get('/api/return-mixin/parameters/journal').json
+  version = next(entry['version'] for entry in journal if entry['parameters']['Kp'] == 0.2)
+  response = client.post('/api/return-mixin/parameters/rollback', json={'version': version})
+  assert response.status_code == 200
+  assert response.json['Kp'] == 0.2
+  assert client.post('/api/return-mixin/parameters/rollback', json={'version': 10 ** 6}).status_code == 404
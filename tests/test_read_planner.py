@@ -0,0 +1,69 @@
+import pyads
+import pytest
+import simulate
+from plc_pool import plc_pool
+
+bad_symbol = 'PRG_HE.FB_Nicht_Vorhanden.fOut'
+
+def acquire(owner):
+  return plc_pool.acquire('192.168.35.21.1.1', pyads.PORT_TC3PLC1, owner)
+
+def real_symbols(model, count, skip=0):
+  return sorted(name for name in model.symbols() if not name.rsplit('.', 1)[-1].startswith(('b', 'i')))[skip:skip + count]
+
+def test_users_share_one_sum_read(plant):
+  simulated_clock, model = plant
+  a, b = acquire('a'), acquire('b')
+  a.read_planned(real_symbols(model, 2))
+  b.read_planned(real_symbols(model, 2, skip=2))
+  simulated_clock.advance(5)
+  calls = a.shared.connection.calls
+  a.read_planned(real_symbols(model, 2))
+  assert set(b.read_planned(real_symbols(model, 2, skip=2))) >= set(real_symbols(model, 2, skip=2))
+  assert a.shared.connection.calls == calls + 1
+
+def test_unknown_symbol_fails_only_its_user(plant):
+  simulated_clock, model = plant
+  good, bad = acquire('good'), acquire('bad')
+  fake = good.shared.connection
+  good.read_planned(real_symbols(model, 2))
+  with pytest.raises(pyads.ADSError):
+    bad.read_planned(real_symbols(model, 1, skip=2) + [bad_symbol])
+  for _ in range(3):
+    simulated_clock.advance(5)
+    calls = fake.calls
+    assert set(good.read_planned(real_symbols(model, 2))) >= set(real_symbols(model, 2))
+    # the shared read leaves the unknown symbol out
+    assert fake.calls == calls + 1
+    with pytest.raises(pyads.ADSError):
+      bad.read_planned(real_symbols(model, 1, skip=2) + [bad_symbol])
+
+def test_symbols_no_longer_read_drop_out(plant):
+  simulated_clock, model = plant
+  good, bad = acquire('good'), acquire('bad')
+  with pytest.raises(pyads.ADSError):
+    bad.read_planned([bad_symbol])
+  bad.read_planned(real_symbols(model, 1, skip=2))
+  good.reconnect()
+  simulated_clock.advance(5)
+  calls = good.shared.connection.calls
+  good.read_planned(real_symbols(model, 2))
+  assert bad_symbol not in good.shared.planner.symbols
+  # one sum-read of both users' symbols, after the reconnect looks their infos up again
+  assert good.shared.connection.calls == calls + 1 + 3
+  bad.release()
+  assert set(good.shared.planner.symbols) == set(real_symbols(model, 2))
+
+def test_unknown_symbol_of_one_module_does_not_fail_the_others(plant, monkeypatch):
+  simulated_clock, _ = plant
+  controllers = simulate.load_controllers(['return_mixin', 'tww_11'])
+  tww_11 = controllers['tww_11']
+  monkeypatch.setattr(tww_11, 'read_symbols', lambda symbols=tww_11.read_symbols(): symbols + [bad_symbol])
+  for controller in controllers.values():
+    controller.enabled = True
+  for _ in range(5):
+    assert 'exception' in tww_11.control_loop()
+    assert 'exception' not in controllers['return_mixin'].control_loop()
+    simulated_clock.advance(5)
+  for controller in controllers.values():
+    controller.plc.release()
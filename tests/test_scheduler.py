@@ -0,0 +1,84 @@
+from concurrent.futures import Future
+import pytest
+import clock
+from scheduler import Scheduler
+
+class ManualExecutor:
+  """Runs submitted tasks when the test finishes them"""
+
+  def __init__(self):
+    self.pending = []
+
+  def submit(self, func):
+    future = Future()
+    self.pending.append((future, func))
+    return future
+
+  def finish(self):
+    pending, self.pending = self.pending, []
+    for future, func in pending:
+      future.set_result(func())
+
+@pytest.fixture
+def scheduler(simulated_clock):
+  scheduler = Scheduler()
+  # tasks are scheduled on add_task and run when the test finishes them
+  scheduler.executor = ManualExecutor()
+  return scheduler
+
+def test_tasks_run_in_deadline_order(scheduler, simulated_clock):
+  runs = []
+  scheduler.add_task('slow', 10, lambda: runs.append(('slow', clock.monotonic())))
+  scheduler.add_task('fast', 4, lambda: runs.append(('fast', clock.monotonic())))
+  for _ in range(21):
+    scheduler.run_due(clock.monotonic())
+    scheduler.executor.finish()
+    simulated_clock.advance(1)
+  assert runs == [('slow', 0), ('fast', 0), ('fast', 4), ('fast', 8), ('slow', 10),
+                  ('fast', 12), ('fast', 16), ('slow', 20), ('fast', 20)]
+  assert scheduler.stats()['fast']['runs'] == 6
+  assert scheduler.stats()['fast']['max_lateness'] == 0
+
+def test_next_deadline(scheduler, simulated_clock):
+  assert scheduler.run_due(0) is None
+  scheduler.add_task('a', 5, lambda: None)
+  scheduler.add_task('b', 3, lambda: None)
+  assert scheduler.run_due(0) == 3
+  assert scheduler.run_due(2.5) == 3
+  assert scheduler.run_due(3) == 5
+
+def test_overruns_are_skipped(scheduler, simulated_clock):
+  scheduler.add_task('a', 5, lambda: None)
+  scheduler.run_due(0)
+  for now in (5, 10):
+    simulated_clock.advance(5)
+    scheduler.run_due(now)
+  # still busy with the first run: both deadlines are skipped, not queued
+  assert len(scheduler.executor.pending) == 1
+  simulated_clock.advance(2)
+  scheduler.executor.finish()
+  simulated_clock.advance(3)
+  scheduler.run_due(15)
+  assert len(scheduler.executor.pending) == 1
+  stats = scheduler.stats()['a']
+  assert (stats['runs'], stats['overruns'], stats['missed'], stats['last_duration']) == (1, 2, 0, 12)
+
+def test_missed_periods_are_counted(scheduler, simulated_clock):
+  scheduler.add_task('a', 5, lambda: None)
+  scheduler.run_due(0)
+  scheduler.executor.finish()
+  # the scheduler falls behind from 5 to 17: runs once, late, and skips 10 and 15
+  assert scheduler.run_due(17) == 20
+  assert len(scheduler.executor.pending) == 1
+  scheduler.executor.finish()
+  stats = scheduler.stats()['a']
+  assert (stats['missed'], stats['last_lateness']) == (2, 12)
+
+def test_period_ending_now_is_missed_not_run_twice(scheduler, simulated_clock):
+  scheduler.add_task('a', 5, lambda: None)
+  scheduler.run_due(0)
+  scheduler.executor.finish()
+  assert scheduler.run_due(15) == 20
+  assert len(scheduler.executor.pending) == 1
+  assert scheduler.stats()['a']['overruns'] == 0
+  assert scheduler.stats()['a']['missed'] == 2
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+import pytest
+from web_api import ControllerConfig, ControllerManager
+
+running_plc = SimpleNamespace(wait_until_running=lambda stopped: True)
+
+@pytest.fixture
+def manager():
+  manager = ControllerManager()
+  for name in ('return-mixin', 'pk-onoff', 'bwk-onoff', 'bhkw-onoff'):
+    manager.register_controller(ControllerConfig(name, name, module=SimpleNamespace()))
+    manager.set_state(name, 'connecting')
+  manager.register_group('plant-onoff', ['pk-onoff', 'bwk-onoff', 'bhkw-onoff'])
+  return manager
+
+def states(manager):
+  return {name: state['state'] for name, state in manager.states.items()}
+
+def test_group_members_run_once_the_group_task_is_added(manager):
+  manager._start_when_running(running_plc, ['return-mixin', 'pk-onoff', 'bwk-onoff'])
+  assert set(manager.scheduler.tasks) == {'return-mixin'}
+  assert states(manager) == {'return-mixin': 'running', 'pk-onoff': 'connecting', 'bwk-onoff': 'connecting',
+                             'bhkw-onoff': 'connecting'}
+  manager._start_when_running(running_plc, ['bhkw-onoff'])
+  assert set(manager.scheduler.tasks) == {'return-mixin', 'plant-onoff'}
+  assert set(states(manager).values()) == {'running'}
+
+def test_group_members_fail_with_their_task(manager, monkeypatch):
+  def add_task(name, *args, **kwargs):
+    raise RuntimeError(f'no {name}')
+  monkeypatch.setattr(manager.scheduler, 'add_task', add_task)
+  manager._start_when_running(running_plc, ['pk-onoff', 'bwk-onoff', 'bhkw-onoff'])
+  assert {name: state['error'] for name, state in manager.states.items() if state['state'] == 'failed'} == {
+    name: "RuntimeError('no plant-onoff')" for name in ('pk-onoff', 'bwk-onoff', 'bhkw-onoff')}
+
+def test_group_runs_without_members_that_failed_to_start(manager):
+  manager.set_state('bwk-onoff', 'failed', 'factory raised')
+  manager._start_when_running(running_plc, ['pk-onoff', 'bhkw-onoff'])
+  assert 'plant-onoff' in manager.scheduler.tasks
+  assert states(manager)['pk-onoff'] == states(manager)['bhkw-onoff'] == 'running'
+  assert states(manager)['bwk-onoff'] == 'failed'
@@ -0,0 +1,63 @@
+import threading
+import pyads
+from plc_pool import plc_pool
+
+def acquire():
+  return plc_pool.acquire('192.168.35.21.1.1', pyads.PORT_TC3PLC1, 'test')
+
+def real_symbols(model, count):
+  return sorted(name for name in model.symbols() if not name.rsplit('.', 1)[-1].startswith(('b', 'i')))[:count]
+
+def test_symbol_info_is_looked_up_once(plant):
+  _, model = plant
+  plc = acquire()
+  fake = plc.shared.connection
+  names = real_symbols(model, 5)
+  plc.read_list_by_name(names)
+  assert fake.calls == len(names) + 1
+  plc.read_list_by_name(names)
+  plc.write_list_by_name({names[0]: 1.0})
+  assert fake.calls == len(names) + 3
+  assert plc.shared.symbols.size(names[0]) == 4 # REAL
+
+def test_reconnect_clears_symbol_info(plant):
+  _, model = plant
+  plc = acquire()
+  fake = plc.shared.connection
+  names = real_symbols(model, 3)
+  plc.read_list_by_name(names)
+  plc.reconnect()
+  calls = fake.calls
+  plc.read_list_by_name(names)
+  assert fake.calls == calls + len(names) + 1
+
+def test_datatype_is_cached(plant):
+  _, model = plant
+  plc = acquire()
+  fake = plc.shared.connection
+  name = real_symbols(model, 1)[0]
+  assert plc.shared.symbols.datatype(name) is pyads.PLCTYPE_REAL
+  calls = fake.calls
+  assert plc.shared.symbols.datatype(name) is pyads.PLCTYPE_REAL
+  assert fake.calls == calls
+
+def test_datatype_lookup_does_not_block_a_reconnect(plant):
+  _, model = plant
+  plc = acquire()
+  shared = plc.shared
+  name = real_symbols(model, 1)[0]
+  with shared.lock:
+    # a reconnect holds the connection lock while a first lookup waits for it
+    lookup = threading.Thread(target=shared.symbols.datatype, args=(name,), daemon=True)
+    lookup.start()
+    lookup.join(0.2)
+    invalidate = threading.Thread(target=shared.symbols.invalidate, daemon=True)
+    invalidate.start()
+    invalidate.join(2)
+    assert not invalidate.is_alive()
+  lookup.join(2)
+  assert not lookup.is_alive()
+  # looked up before the invalidation, so not cached
+  assert name not in shared.symbols.datatypes
+  assert shared.symbols.datatype(name) == pyads.PLCTYPE_REAL
+  assert name in shared.symbols.datatypes
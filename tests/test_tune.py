@@ -0,0 +1,108 @@
+import dataclasses
+import datetime
+import math
+import random
+import numpy as np
+import control
+import feed_121517
+import return_mixin
+import simulate
+import tune
+
+def candidates(target, count):
+  rng = random.Random(0)
+  return tune.random_candidates(target, count, rng)
+
+def test_return_mixin_batch_matches_module(plant):
+  target = tune.targets['return_mixin']
+  values = candidates(target, 4)
+  instance = simulate.load_controllers(['return_mixin'])['return_mixin']
+  params = tune.merged(instance.get_parameters(), tune.to_params(target, [np.array(column) for column in zip(*values)]))
+  batch = target.batch(params, instance, np.full(len(values), 50.0))
+  controllers = []
+  for candidate in values:
+    controller = return_mixin.ReturnMixin()
+    controller._set_module_parameters(tune.to_params(target, candidate))
+    controllers.append(controller)
+
+  start = datetime.datetime(2026, 1, 1)
+  for k in range(100):
+    actual = params['set_point'] + 3 * math.sin(k / 10) + 0.2 * math.cos(k)
+    error, new_control, _ = batch.update(actual, 5.0 if k else None, k * 5.0)
+    for i, controller in enumerate(controllers):
+      controller.values = {return_mixin.actual_value_name: actual, return_mixin.control_value_name: 50.0,
+                           return_mixin.control_onoff_name: control.ON, **{name: True for name in return_mixin.consumer_names}}
+      diagnostics = controller._control_action(start + datetime.timedelta(seconds=k * 5))
+      assert math.isclose(error, diagnostics['error'], abs_tol=1e-12)
+      assert math.isclose(new_control[i], diagnostics['new_control_value'], rel_tol=1e-9, abs_tol=1e-9)
+  for controller in controllers + [instance]:
+    controller.plc.release()
+
+def test_feed_return_batch_matches_module(plant):
+  target = tune.targets['feed_121517']
+  values = candidates(target, 4)
+  instance = simulate.load_controllers(['feed_121517'])['feed_121517']
+  params = tune.merged(instance.get_parameters(), tune.to_params(target, [np.array(column) for column in zip(*values)]))
+  batch = target.batch(params, instance, np.full(len(values), 50.0))
+  controllers = []
+  for candidate in values:
+    controller = feed_121517.Feed121517()
+    controller._set_module_parameters(tune.to_params(target, candidate))
+    controllers.append(controller)
+
+  start = datetime.datetime(2026, 1, 1)
+  pwm_cycles = 0
+  for k in range(200):
+    # above the set point long enough to drive the pump into its PWM range
+    actual = params['return_set_point'] + 4 + math.sin(k / 7)
+    error, new_control, pump = batch.update(actual, 30.0 if k else None, k * 30.0)
+    for i, controller in enumerate(controllers):
+      controller.values = {feed_121517.actual_return_value_name: actual,
+                           feed_121517.control_bws_name: False, feed_121517.control_value_name: 50.0}
+      diagnostics = controller._control_action(start + datetime.timedelta(seconds=k * 30))
+      assert math.isclose(error, diagnostics['return']['error'], abs_tol=1e-12)
+      assert math.isclose(new_control[i], diagnostics['new_control_value'], rel_tol=1e-9, abs_tol=1e-9)
+      if 'pwm' in diagnostics['pump']:
+        pwm_cycles += 1
+        # the plant input is the lowest speed while the PWM is on, see FeedReturnBatch
+        assert (pump[i] == 0) == diagnostics['pump']['pwm']['on']
+  assert pwm_cycles
+  for controller in controllers + [instance]:
+    controller.plc.release()
+
+def test_batch_score_matches_score():
+  rng = np.random.default_rng(1)
+  errors = rng.normal(0.5, 1, (50, 3))
+  actuators = rng.uniform(0, 100, (50, 3))
+  weights = {'iae': 1, 'overshoot': 0.5, 'travel': 0.01}
+  costs, metrics = tune.batch_score(errors, actuators, 30, weights)
+  for column in range(3):
+    cost, expected = tune.score(list(zip(errors[:, column], actuators[:, column])), 30, weights)
+    assert math.isclose(costs[column], cost)
+    for name, value in expected.items():
+      assert math.isclose(metrics[name][column], value)
+
+def test_evaluate_batch_scores_every_candidate(plant):
+  target = tune.targets['return_mixin']
+  instance = simulate.load_controllers(['return_mixin'])['return_mixin']
+  current = tune.from_params(target, instance.get_parameters())
+  weights = {'iae': 1, 'overshoot': 0.5, 'travel': 0.01}
+  results = tune.evaluate_batch(target, [current] + candidates(target, 20), instance, (-0.08, 600, 60), 4, 5, weights)
+  assert len(results) == 21
+  assert all(cost >= 0 and set(metrics) == {'iae', 'overshoot', 'travel'} for cost, metrics in results)
+  instance.plc.release()
+
+def test_evaluate_uses_the_saved_parameters(plant, monkeypatch):
+  instance = simulate.load_controllers(['return_mixin'])['return_mixin']
+  instance.set_parameters({'set_point': 58.0})
+  instance.plc.release()
+  tune.init_worker('return_mixin', 0.5, 5, datetime.datetime(2026, 1, 15, 6, 0))
+  set_points = []
+  def sample(diagnostics):
+    if 'error' in diagnostics:
+      set_points.append(diagnostics['actual_value'] - diagnostics['error'])
+    return tune.return_mixin_sample(diagnostics)
+  monkeypatch.setitem(tune.worker, 'target', dataclasses.replace(tune.targets['return_mixin'], sample=sample))
+  tune.evaluate(tune.from_params(tune.targets['return_mixin'], instance.get_parameters()), {'iae': 1, 'overshoot': 0, 'travel': 0})
+  assert set_points and all(math.isclose(set_point, 58.0) for set_point in set_points)
+  tune.worker.clear()
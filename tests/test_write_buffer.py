@@ -0,0 +1,105 @@
+import control
+import return_mixin
+import simulate
+from write_buffer import WriteBuffer
+
+class RecordingPLC:
+  def __init__(self):
+    self.writes = []
+    self.errors = {}
+
+  def write_list_by_name(self, values):
+    self.writes.append(dict(values))
+    return {name: self.errors.get(name, 'no error') for name in values}
+
+def cycle(buffer, values):
+  for name, value in values.items():
+    buffer.write(name, value)
+  return buffer.commit()
+
+def test_unchanged_values_are_not_written_again(simulated_clock):
+  plc = RecordingPLC()
+  buffer = WriteBuffer(plc, refresh_interval=60)
+  cycle(buffer, {'a': 1, 'b': 2.5})
+  simulated_clock.advance(5)
+  assert cycle(buffer, {'a': 1, 'b': 2.5}) == {}
+  simulated_clock.advance(5)
+  assert cycle(buffer, {'a': 1, 'b': 3.0}) == {'b': 3.0}
+  assert plc.writes == [{'a': 1, 'b': 2.5}, {'b': 3.0}]
+  # what the module asked for, changed or not
+  assert buffer.requested == {'a': 1, 'b': 3.0}
+
+def test_values_are_written_again_after_the_refresh_interval(simulated_clock):
+  plc = RecordingPLC()
+  buffer = WriteBuffer(plc, refresh_interval=60)
+  cycle(buffer, {'a': 1, 'b': 2.5})
+  simulated_clock.advance(30)
+  cycle(buffer, {'a': 1, 'b': 3.0})
+  simulated_clock.advance(35)
+  # a was written 65 seconds ago, b 35
+  assert cycle(buffer, {'a': 1, 'b': 3.0}) == {'a': 1}
+  simulated_clock.advance(30)
+  assert cycle(buffer, {'a': 1, 'b': 3.0}) == {'b': 3.0}
+
+def test_failed_writes_are_retried(simulated_clock):
+  plc = RecordingPLC()
+  buffer = WriteBuffer(plc)
+  plc.errors['a'] = 'symbol not found'
+  cycle(buffer, {'a': 1, 'b': 2})
+  plc.errors.clear()
+  simulated_clock.advance(5)
+  assert cycle(buffer, {'a': 1, 'b': 2}) == {'a': 1}
+
+def test_invalidate_writes_everything_again(simulated_clock):
+  plc = RecordingPLC()
+  buffer = WriteBuffer(plc)
+  cycle(buffer, {'a': 1, 'b': 2})
+  buffer.write('c', 3)
+  buffer.invalidate()
+  simulated_clock.advance(5)
+  # the pending write of the failed cycle is dropped, the confirmed values are written again
+  assert cycle(buffer, {'a': 1, 'b': 2}) == {'a': 1, 'b': 2}
+
+def test_reconnect_writes_everything_again(plant):
+  simulated_clock, _ = plant
+  module = simulate.load_controllers(['return_mixin'])['return_mixin']
+  module.enabled = True
+  module.control_loop()
+  simulated_clock.advance(5)
+  module.control_loop()
+  # unchanged, so still confirmed by the first cycle's write
+  assert {name: time for name, (_, time) in module.writes.confirmed.items()} == {
+    return_mixin.control_onoff_name: 0, return_mixin.control_value_name: 0}
+  module.reopen_plc(module.plc.generation)
+  simulated_clock.advance(5)
+  module.control_loop()
+  assert {name: time for name, (_, time) in module.writes.confirmed.items()} == {
+    return_mixin.control_onoff_name: 10, return_mixin.control_value_name: 10}
+  module.plc.release()
+
+def test_values_changed_in_the_plc_are_written_again(simulated_clock):
+  plc = RecordingPLC()
+  buffer = WriteBuffer(plc)
+  cycle(buffer, {'state': 0, 'speed': 42.3})
+  simulated_clock.advance(5)
+  buffer.write('state', 0)
+  buffer.write('speed', 42.3)
+  # read back as written, REALs in single precision
+  assert buffer.commit({'state': 0, 'speed': 42.29999923706055}) == {}
+  simulated_clock.advance(5)
+  buffer.write('state', 0)
+  buffer.write('speed', 42.3)
+  # an HMI changed the state between the cycles, the controller resets it
+  assert buffer.commit({'state': 2, 'speed': 42.29999923706055}) == {'state': 0}
+
+def test_external_change_is_corrected_on_the_next_cycle(plant):
+  simulated_clock, model = plant
+  module = simulate.load_controllers(['return_mixin'])['return_mixin']
+  module.enabled = True
+  module.control_loop()
+  simulated_clock.advance(5)
+  # someone switches the mixer on while no consumer needs it
+  model.write(return_mixin.control_onoff_name, control.ON)
+  module.control_loop()
+  assert model.read(return_mixin.control_onoff_name) == control.OFF
+  module.plc.release()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Search PID parameters of a control module against the simulated plant, in parallel
+
+  python tune.py return_mixin --method refine --samples 200 --output ranked.json
+  python tune.py return_mixin --fopdt=-0.08,600,60 --samples 5000 --confirm 10
+
+Each candidate runs the real module code in closed loop with the plant model
+and is scored by the integrated absolute error (degree hours per hour), the
+overshoot past the set point and the actuator travel (percent per hour).
+The ranked parameter sets are printed in the format set_parameters accepts.
+
+With --fopdt, all candidates run at once, vectorized with batch.py, against
+a first-order-plus-dead-time plant (gain, time constant and dead time as
+reported by identify.py) under load steps. --confirm then runs the best of
+them against the plant model as above.
+"""
+
+import argparse
+import collections
+import datetime
+import itertools
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+from batch import BatchEMA, BatchFD1, BatchPID, BatchPWM
+
+@dataclass
+class Parameter:
+  """One searched parameter; path is its location in the set_parameters JSON"""
+  path: Tuple[str, ...]
+  low: float
+  high: float
+  log: bool = True
+  to_value: Optional[Callable] = None # from the searched to the stored value
+  from_value: Optional[Callable] = None
+
+  def sample(self, rng):
+    if self.log:
+      return math.exp(rng.uniform(math.log(self.low), math.log(self.high)))
+    return rng.uniform(self.low, self.high)
+
+  def grid(self, points):
+    if points == 1:
+      return [math.sqrt(self.low * self.high) if self.log else (self.low + self.high) / 2]
+    steps = [i / (points - 1) for i in range(points)]
+    if self.log:
+      return [math.exp(math.log(self.low) + s * (math.log(self.high) - math.log(self.low))) for s in steps]
+    return [self.low + s * (self.high - self.low) for s in steps]
+
+  def perturb(self, value, scale, rng):
+    if self.log:
+      value *= math.exp(rng.gauss(0, scale))
+    else:
+      value += rng.gauss(0, scale) * (self.high - self.low)
+    return min(max(value, self.low), self.high)
+
+def half_life_to_decay(seconds):
+  return 0.5 ** (1 / seconds)
+
+def decay_to_half_life(decay_factor):
+  return math.log(0.5) / math.log(decay_factor)
+
+def pid_parameters(name):
+  return [
+    Parameter((name, 'Kp'), 0.1 / 60, 30 / 60),
+    Parameter((name, 'Ki'), 0.1 / 60, 30 / 60),
+    Parameter((name, 'Kd'), 0, 1800 / 60, log=False),
+    Parameter((name, 'integration_decay_factor'), 10, 3600, to_value=half_life_to_decay, from_value=decay_to_half_life),
+  ]
+
+class ReturnMixinBatch:
+  """ReturnMixin._control_action for many parameter sets, while a consumer is on"""
+
+  def __init__(self, params, instance, control):
+    self.set_point = params['set_point']
+    self.Kp = np.asarray(params['Kp'], dtype=float)
+    self.Ki = np.asarray(params['Ki'], dtype=float)
+    self.Kd = np.asarray(params['Kd'], dtype=float)
+    self.control_range = (-np.asarray(params['off_range'], dtype=float), instance.control_range[1])
+    self.I_ema = BatchEMA(params['decay_factor'])
+    self.D_ema = BatchEMA(instance.D_ema.decay_factor)
+    self.fd1 = BatchFD1()
+    self.control = control
+
+  def update(self, actual, dt, now):
+    """(error, new control value, plant input) of a cycle; dt is None in the first one"""
+    error = actual - self.set_point
+    I_error = self.I_ema.update(error, dt or 0)
+    D_error = self.D_ema.update(self.fd1.update(error, dt), dt or 0)
+    control_output = self.Kp * error + self.Ki * I_error + self.Kd * D_error
+    if dt:
+      self.control = np.clip(self.control + control_output * dt, *self.control_range)
+    # off below half the off range, at the bottom of the speed range above
+    return error, self.control, np.clip(self.control, 0, self.control_range[1])
+
+class FeedReturnBatch:
+  """The return control of Feed121517._control_action for many parameter sets, without circulation values"""
+
+  def __init__(self, params, instance, control):
+    pid = params['return_pid']
+    self.pid = BatchPID(pid['Kp'], pid['Ki'], pid['Kd'], pid['integration_decay_factor'])
+    self.set_point = params['return_set_point']
+    self.control_range = (params['min_if_no_circulation'], params['pump']['max'])
+    self.pwm_range = instance.pump_pwm.pwm_range
+    self.pwm = BatchPWM(params['pump']['pwm']['period'])
+    self.control = control
+
+  def update(self, actual, dt, now):
+    error = self.set_point - actual
+    control_output = self.pid.update(error, dt)
+    self.control = np.clip(self.control + (control_output * dt if dt else 0), *self.control_range)
+    # below 0 the pump runs at its lowest speed or is off, see PumpPWM
+    pwm_controlled = self.control < 0
+    self.pwm.set_control((self.control - self.pwm_range) / -self.pwm_range)
+    on = self.pwm.update(now, pwm_controlled)
+    return error, self.control, np.where(pwm_controlled, np.where(on, 0, self.pwm_range), self.control)
+
+@dataclass
+class Target:
+  module: str
+  parameters: List[Parameter]
+  sample: Callable # diagnostics -> (error, actuator) or None while not controlling
+  batch: Callable # (parameters with arrays, controller, initial control) -> batch controller
+
+def return_mixin_sample(diagnostics):
+  if 'error' not in diagnostics:
+    return None
+  return diagnostics['error'], diagnostics['new_control_value']
+
+def feed_return_sample(diagnostics):
+  if diagnostics.get('return', {}).get('error') is None:
+    return None
+  return diagnostics['return']['error'], diagnostics['new_control_value']
+
+targets = {
+  'return_mixin': Target('return_mixin', [
+    Parameter(('Kp',), 0.5 / 60, 60 / 60),
+    Parameter(('Ki',), 0.1 / 60, 30 / 60),
+    Parameter(('Kd',), 0, 3600 / 60, log=False),
+    Parameter(('decay_factor',), 10, 3600, to_value=half_life_to_decay, from_value=decay_to_half_life),
+  ], return_mixin_sample, ReturnMixinBatch),
+  'feed_121517': Target('feed_121517', pid_parameters('return_pid'), feed_return_sample, FeedReturnBatch),
+}
+
+def to_params(target, values):
+  params = {}
+  for parameter, value in zip(target.parameters, values):
+    node = params
+    for key in parameter.path[:-1]:
+      node = node.setdefault(key, {})
+    node[parameter.path[-1]] = parameter.to_value(value) if parameter.to_value else value
+  return params
+
+def merged(params, changes):
+  result = dict(params)
+  for key, value in changes.items():
+    result[key] = merged(params[key], value) if isinstance(value, dict) else value
+  return result
+
+def from_params(target, params):
+  values = []
+  for parameter in target.parameters:
+    value = params
+    for key in parameter.path:
+      value = value[key]
+    values.append(parameter.from_value(value) if parameter.from_value else value)
+  return values
+
+def score(samples, interval, weights):
+  """Cost and metrics of a run from its (error, actuator) samples"""
+  if not samples:
+    return math.inf, {}
+  hours = len(samples) * interval / 3600
+  iae = sum(abs(error) for error, _ in samples) * interval / 3600 / hours
+  first_sign = math.copysign(1, samples[0][0])
+  overshoot = max(0.0, max(-first_sign * error for error, _ in samples))
+  travel = sum(abs(b - a) for (_, a), (_, b) in zip(samples, samples[1:])) / hours
+  metrics = {'iae': iae, 'overshoot': overshoot, 'travel': travel}
+  return sum(weights[name] * value for name, value in metrics.items()), metrics
+
+def batch_score(errors, actuators, interval, weights):
+  """score() for samples with one column per candidate; returns costs and metrics arrays"""
+  hours = len(errors) * interval / 3600
+  iae = np.abs(errors).sum(axis=0) * interval / 3600 / hours
+  first_sign = np.where(np.signbit(errors[0]), -1.0, 1.0)
+  overshoot = np.maximum(0.0, (-first_sign * errors).max(axis=0))
+  travel = np.abs(np.diff(actuators, axis=0)).sum(axis=0) / hours
+  metrics = {'iae': iae, 'overshoot': overshoot, 'travel': travel}
+  return sum(weights[name] * value for name, value in metrics.items()), metrics
+
+class FOPDTPlant:
+  """First-order-plus-dead-time plant for all candidates at once, the model identify.py fits
+
+  The output approaches bias + gain * input with time constant tau; the input
+  acts dead_time late.
+  """
+
+  def __init__(self, gain, tau, dead_time, interval, output, input, count):
+    self.gain = gain
+    self.a = math.exp(-interval / tau)
+    self.inputs = collections.deque([np.full(count, float(input))] * round(dead_time / interval))
+    self.output = np.full(count, float(output))
+
+  def step(self, input, bias):
+    self.inputs.append(input)
+    delayed = self.inputs.popleft()
+    self.output = self.a * self.output + (1 - self.a) * (bias + self.gain * delayed)
+    return self.output
+
+def evaluate_batch(target, candidates, instance, fopdt, hours, interval, weights, load_step=2.0, load_period=7200, operating_point=50.0):
+  """Costs and metrics of all candidates against a FOPDT plant
+
+  The plant starts in balance at the set point with the actuator at the
+  operating point; the load then alternates by load_step degrees every
+  load_period seconds.
+  """
+  count = len(candidates)
+  params = merged(instance.get_parameters(), to_params(target, [np.array(column) for column in zip(*candidates)]))
+  controller = target.batch(params, instance, np.full(count, operating_point))
+  gain, tau, dead_time = fopdt
+  plant = FOPDTPlant(gain, tau, dead_time, interval, controller.set_point, operating_point, count)
+  bias = controller.set_point - gain * operating_point
+  steps = int(hours * 3600 / interval)
+  errors = np.empty((steps, count))
+  actuators = np.empty((steps, count))
+  output = plant.output
+  for k in range(steps):
+    now = k * interval
+    errors[k], actuators[k], input = controller.update(output, interval if k else None, now)
+    load = load_step if (now // load_period) % 2 == 0 else -load_step
+    output = plant.step(input, bias + load)
+  with np.errstate(invalid='ignore', over='ignore'):
+    costs, metrics = batch_score(errors, actuators, interval, weights)
+  costs = np.where(np.isfinite(costs), costs, math.inf)
+  return [(float(costs[i]), {name: float(value[i]) for name, value in metrics.items()}) for i in range(count)]
+
+# worker process state, see init_worker
+worker = {}
+
+def init_worker(target_name, hours, step, start):
+  import simulate
+  simulated_clock, model = simulate.setup(start)
+  # candidates get fresh controllers, this one only provides the current parameters
+  instance = simulate.load_controllers([target_name])[target_name]
+  worker.update(target=targets[target_name], controller_class=type(instance), defaults=instance.get_parameters(),
+                clock=simulated_clock, model=model, hours=hours, step=step,
+                interval=simulate.intervals.get(target_name, 30))
+
+def evaluate(values, weights):
+  target = worker['target']
+  simulated_clock = worker['clock']
+  # every run starts at the same time of day; the clock never goes back
+  simulated_clock.advance(86400 * math.ceil(simulated_clock.monotonic() / 86400 + 1e-9) - simulated_clock.monotonic())
+  worker['model'].reset()
+  controller = worker['controller_class']()
+  try:
+    # the saved parameters, with the searched ones replaced, as evaluate_batch uses them
+    controller._set_module_parameters(merged(worker['defaults'], to_params(target, values)))
+    controller.enabled = True
+    samples = []
+    interval = worker['interval']
+    steps_per_cycle = max(1, round(interval / worker['step']))
+    for _ in range(int(worker['hours'] * 3600 / interval)):
+      diagnostics = controller.control_loop()
+      if 'exception' in diagnostics:
+        return math.inf, {'exception': diagnostics['exception']}
+      if (sample := target.sample(diagnostics)) is not None:
+        samples.append(sample)
+      for _ in range(steps_per_cycle):
+        worker['model'].step(interval / steps_per_cycle)
+        simulated_clock.advance(interval / steps_per_cycle)
+    return score(samples, interval, weights)
+  finally:
+    controller.plc.release()
+
+def grid_candidates(target, points):
+  return [list(values) for values in itertools.product(*(p.grid(points) for p in target.parameters))]
+
+def random_candidates(target, samples, rng):
+  return [[p.sample(rng) for p in target.parameters] for _ in range(samples)]
+
+def refine_candidates(target, ranked, count, scale, rng):
+  parents = [values for _, _, values in ranked[:max(1, len(ranked) // 10)]]
+  return [[p.perturb(v, scale, rng) for p, v in zip(target.parameters, rng.choice(parents))] for _ in range(count)]
+
+def search(run, target, current, args, rng):
+  """Ranked (cost, metrics, values) of the current parameters and the candidates of args.method"""
+  ranked = run([from_params(target, current)])
+  if args.method == 'grid':
+    ranked += run(grid_candidates(target, args.points))
+  else:
+    ranked += run(random_candidates(target, args.samples, rng))
+  ranked.sort(key=lambda result: result[0])
+  if args.method == 'refine':
+    for i in range(args.rounds):
+      ranked += run(refine_candidates(target, ranked, args.samples, 0.5 / (i + 1), rng))
+      ranked.sort(key=lambda result: result[0])
+  return ranked
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('target', choices=sorted(targets))
+  parser.add_argument('--method', choices=['grid', 'random', 'refine'], default='refine',
+                      help='refine: random search followed by rounds of local search around the best candidates')
+  parser.add_argument('--points', type=int, default=4, help='grid points per parameter')
+  parser.add_argument('--samples', type=int, default=200, help='random candidates, and candidates per refine round')
+  parser.add_argument('--rounds', type=int, default=3, help='refine rounds')
+  parser.add_argument('--hours', type=float, default=24, help='simulated hours per candidate')
+  parser.add_argument('--step', type=float, default=5, help='plant model step in seconds')
+  parser.add_argument('--start', type=datetime.datetime.fromisoformat, default=datetime.datetime(2026, 1, 15, 6, 0))
+  parser.add_argument('--fopdt', help='GAIN,TAU,DEAD_TIME: evaluate all candidates at once against this plant instead of the plant model')
+  parser.add_argument('--confirm', type=int, default=0, help='with --fopdt, run this many of the best candidates against the plant model')
+  parser.add_argument('--weights', default='iae=1,overshoot=0.5,travel=0.01')
+  parser.add_argument('--workers', type=int, default=os.cpu_count())
+  parser.add_argument('--top', type=int, default=10)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--output', help='write the ranked parameter sets to this JSON file')
+  args = parser.parse_args()
+
+  target = targets[args.target]
+  weights = {'iae': 0, 'overshoot': 0, 'travel': 0}
+  weights.update({name: float(value) for name, value in (item.split('=') for item in args.weights.split(','))})
+  rng = random.Random(args.seed)
+  started = time.perf_counter()
+
+  def run_pool(executor, candidates):
+    results = executor.map(evaluate, candidates, itertools.repeat(weights), chunksize=max(1, len(candidates) // (4 * args.workers)))
+    return [(cost, metrics, values) for values, (cost, metrics) in zip(candidates, results)]
+
+  if args.fopdt:
+    import simulate
+    simulate.setup(args.start)
+    instance = simulate.load_controllers([args.target])[args.target]
+    # forked workers set up their own fake PLC
+    instance.plc.release()
+    fopdt = [float(x) for x in args.fopdt.split(',')]
+    interval = simulate.intervals.get(args.target, 30)
+    current = instance.get_parameters()
+
+    def run(candidates):
+      results = evaluate_batch(target, candidates, instance, fopdt, args.hours, interval, weights)
+      return [(cost, metrics, values) for values, (cost, metrics) in zip(candidates, results)]
+
+    ranked = search(run, target, current, args, rng)
+    baseline = next(result for result in ranked if result[2] == from_params(target, current))
+    print(f"Evaluated {len(ranked)} candidates against the FOPDT plant in {time.perf_counter() - started:.1f} s")
+    if args.confirm:
+      best = [baseline[2]] + [values for _, _, values in ranked if values != baseline[2]][:args.confirm]
+      with ProcessPoolExecutor(args.workers, initializer=init_worker,
+                               initargs=(args.target, args.hours, args.step, args.start)) as executor:
+        confirmed = run_pool(executor, best)
+      fopdt_costs = {tuple(values): cost for cost, _, values in ranked}
+      for _, metrics, values in confirmed:
+        metrics['fopdt_cost'] = fopdt_costs[tuple(values)]
+      baseline = confirmed[0]
+      ranked = sorted(confirmed, key=lambda result: result[0])
+      print(f"Ran {len(best)} of them against the plant model in {time.perf_counter() - started:.0f} s")
+  else:
+    with ProcessPoolExecutor(args.workers, initializer=init_worker,
+                             initargs=(args.target, args.hours, args.step, args.start)) as executor:
+      # the current parameters are the baseline every candidate competes with
+      current = executor.submit(current_parameters, args.target).result()
+      ranked = search(lambda candidates: run_pool(executor, candidates), target, current, args, rng)
+      baseline = next(result for result in ranked if result[2] == from_params(target, current))
+    print(f"Evaluated {len(ranked)} candidates in {time.perf_counter() - started:.0f} s")
+
+  results = [
+    {'rank': rank + 1, 'cost': cost, 'metrics': metrics, 'parameters': to_params(target, values)}
+    for rank, (cost, metrics, values) in enumerate(ranked[:args.top])
+  ]
+  print(f"Current parameters: cost {baseline[0]:.4g} {json.dumps(baseline[1])}")
+  print(json.dumps(results, indent=2))
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=2)
+  return 0
+
+def current_parameters(target_name):
+  return worker['defaults']
+
+if __name__ == '__main__':
+  exit(main())
@@ -23,7 +23,7 @@ class Tww11(BaseControlModule):
       param_filename='tww_11_params.json'
     )
     self.set_point = 56 # degrees
-    self.pump_pwm = PumpPWM(self.plc, control_bws_name, control_value_name)
+    self.pump_pwm = PumpPWM(self.writes, control_bws_name, control_value_name)
     self.last_update = None
     self.pid = PID(
       Kp = 1 / 60,
@@ -44,16 +44,19 @@ class Tww11(BaseControlModule):
       'pump': self.pump_pwm.parameters(),
     }
 
+  def read_symbols(self):
+    return [circulation_value_name] + self.pump_pwm.symbols()
+
   def _control_action(self, now):
     diagnostics = {}
     dt = (now - self.last_update).total_seconds() if self.last_update else None
     self.last_update = now
 
-    actual_value = self.plc.read_by_name(circulation_value_name)
+    actual_value = self.values[circulation_value_name]
     control_output = self.pid.update(self.set_point - actual_value, dt)
 
     diagnostics |= {
-      'pump': self.pump_pwm.update(now, control_output * dt if dt else 0)
+      'pump': self.pump_pwm.update(now, control_output * dt if dt else 0, self.values)
     }
 
     diagnostics |= {
@@ -72,12 +75,16 @@ class Tww11(BaseControlModule):
     }
     return diagnostics
 
-tww_11 = Tww11()
+def create():
+  controller = Tww11()
+  controller.load_parameters()
+  return controller
 
 async def main(stop_requested):
+  tww_11 = create()
   tww_11.enabled = True
   while not stop_requested():
-    diagnostics = tww_11.control_loop()
+    diagnostics = await tww_11.control_loop_async()
     print(diagnostics, flush=True)
     print(flush=True)
     try:
@@ -86,7 +93,5 @@ async def main(stop_requested):
       break
   return 0
 
-tww_11.load_parameters()
-
 if __name__ == '__main__':
   asyncio.run(main(lambda: False))
@@ -1,33 +1,50 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
 from typing import Dict, List, Callable, Any, Optional
+import os
 import threading
 import time
-import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
-
-# Import control modules
-from return_mixin import return_mixin
-from bwk_onoff import bwk_onoff
-from pk_onoff import pk_onoff
-from bhkw_onoff import bhkw_onoff
-from feed_121517 import feed_121517
-from tww_11 import tww_11
+import metrics
+import parameter_store
+from ads_stats import ads_stats
+from scheduler import Scheduler
+from columnar_buffer import ColumnarBuffer
+from diagnostics_stream import DiagnosticsBroadcaster
+from diagnostics_store import DiagnosticsStore
+from history import HistoryQuery, MAX_POINTS, MAX_ROWS
+
+# Import control modules, their controllers are created on start
+import return_mixin
+import bwk_onoff
+import pk_onoff
+import bhkw_onoff
+import feed_121517
+import tww_11
 import restart_wp_11
 
+loop_errors = metrics.registry.counter('control_loop_errors', 'Control loop runs that raised', ['controller'])
+http_request_seconds = metrics.registry.histogram('http_request_seconds', 'Duration of HTTP handlers until the response starts',
+                                                  ['endpoint', 'method', 'status'])
+
 @dataclass
 class ControllerConfig:
   """Configuration for a control module"""
   name: str
   title: str
-  module: Any
+  factory: Optional[Callable] = None  # creates the controller
+  module: Any = None  # the controller, once created
   sleep_interval: int = 30
   max_diagnostics: int = 100
+  retention_days: int = 90  # history kept in the on-disk diagnostics store
   template: str = "control_basic.html"
-  control_loop_handler: Optional[Callable] = None
+  event_loop: bool = False  # run cycles on the scheduler's asyncio loop, with the PLC I/O in threads
+  setup: Optional[Callable] = None  # coroutine function awaited with the controller on that loop before the first cycle
 
   @property
   def api_path(self) -> str:
@@ -42,103 +59,270 @@ class ControllerConfig:
 class ControllerManager:
   """Manages control modules and their common operations"""
 
-  def __init__(self):
+  def __init__(self, event_loop: bool = False):
     self.controllers: Dict[str, ControllerConfig] = {}
-    self.diagnostics: Dict[str, List] = {}
-    self.locks: Dict[str, threading.Lock] = {}
+    self.event_loop = event_loop  # run all controllers on the scheduler's asyncio loop
+    self.io_executor = ThreadPoolExecutor(4, thread_name_prefix='plc-io')  # PLC I/O of the cycles on that loop
+    self.diagnostics: Dict[str, ColumnarBuffer] = {}
+    self.groups: Dict[str, List[str]] = {}
+    self.scheduler = Scheduler()
+    self.broadcaster = DiagnosticsBroadcaster()
+    self.store: Optional[DiagnosticsStore] = None
+    self.states: Dict[str, Dict] = {}
+    self.started: set = set()  # controllers whose PLC is up
+    self.startup_lock = threading.Lock()
+    self.stopped = threading.Event()
 
   def register_controller(self, config: ControllerConfig):
     """Register a new controller"""
     self.controllers[config.name] = config
-    self.diagnostics[config.name] = []
-    self.locks[config.name] = threading.Lock()
+    self.diagnostics[config.name] = ColumnarBuffer(config.max_diagnostics)
+    self.set_state(config.name, 'stopped')
+
+  def set_state(self, controller_name: str, state: str, error: Optional[str] = None):
+    """Startup state of a controller: stopped, connecting, running or failed"""
+    self.states[controller_name] = {'state': state, 'since': time.time(), 'error': error}
+
+  def attach_store(self, store: DiagnosticsStore):
+    """Persist all diagnostic entries in the given store"""
+    self.store = store
+    for config in self.controllers.values():
+      store.set_retention(config.name, config.retention_days)
+
+  def register_group(self, group_name: str, controller_names: List[str]):
+    """Run the given controllers one after another in a single loop, in the given order"""
+    self.groups[group_name] = controller_names
 
   def get_diagnostics(self, controller_name: str):
     """Get diagnostics for a controller"""
-    with self.locks[controller_name]:
-      return self.diagnostics[controller_name].copy()
-
-  def add_diagnostic_entry(self, controller_name: str, entry: Dict):
-    """Add a diagnostic entry for a controller"""
-    config = self.controllers[controller_name]
-    with self.locks[controller_name]:
-      self.diagnostics[controller_name].append(entry)
-      if len(self.diagnostics[controller_name]) > config.max_diagnostics:
-        self.diagnostics[controller_name].pop(0)
+    return [entry for _, entry in self.diagnostics[controller_name].read()]
+
+  def get_diagnostics_since(self, controller_name: str, since: int, limit: Optional[int] = None) -> Dict:
+    """Get diagnostics newer than the cursor since, and the cursor to continue from"""
+    buffer = self.diagnostics[controller_name]
+    # a cursor ahead of the buffer stems from before a restart
+    reset = since > buffer.last_seq
+    if reset:
+      since = 0
+    entries = buffer.read(since, limit)
+    return {
+      'cursor': entries[-1][0] if entries else since,
+      'reset': reset,
+      'entries': [entry for _, entry in entries],
+    }
+
+  def add_diagnostic_entry(self, controller_name: str, entry: Dict) -> int:
+    """Add a diagnostic entry for a controller and return its sequence number"""
+    seq = self.diagnostics[controller_name].append(entry)
+    self.broadcaster.publish(controller_name, seq, entry)
+    if self.store is not None:
+      self.store.append(controller_name, seq, entry)
+    return seq
+
+  def stream_diagnostics(self, controller_name: str, since: int):
+    """Server-sent events with entries newer than since, followed by live entries"""
+    subscriber = self.broadcaster.subscribe({controller_name})
+    buffer = self.diagnostics[controller_name]
+    reset = since > buffer.last_seq
+    backlog = [(controller_name, seq, entry) for seq, entry in buffer.read(0 if reset else since)]
+    if reset:
+      yield 'event: reset\ndata: {}\n\n'
+    yield from self.broadcaster.stream(subscriber, backlog,
+                                       lambda name, seq, data: f'id: {seq}\ndata: {data}\n\n')
+
+  def stream_all_diagnostics(self, controller_names: Optional[List[str]] = None):
+    """Server-sent events with live entries of several controllers, one event type per controller"""
+    subscriber = self.broadcaster.subscribe(set(controller_names) if controller_names else None)
+    yield from self.broadcaster.stream(subscriber, [],
+                                       lambda name, seq, data: f'event: {name}\ndata: {data}\n\n')
 
   def start_control_loops(self):
-    """Start all control loops"""
+    """Start the scheduler and bring the controllers up in the background
+
+    Returns right away; the controllers of each PLC start cycling as soon as
+    that PLC answers, independently of the other PLCs.
+    """
+    if self.store is not None:
+      self.store.start()
+    self.scheduler.start()
+    threading.Thread(target=self._start_controllers, name='startup', daemon=True).start()
+
+  def stop_control_loops(self):
+    self.stopped.set()
+    self.scheduler.stop()
+    self.io_executor.shutdown(wait=False)
+    parameter_store.flush_all()
+    if self.store is not None:
+      self.store.stop()
+
+  def _start_controllers(self):
+    connections = {}
     for name, config in self.controllers.items():
-      if config.control_loop_handler:
-        thread = threading.Thread(target=config.control_loop_handler)
-      else:
-        thread = threading.Thread(target=self._default_control_loop, args=(name,))
-      thread.daemon = True
-      thread.start()
-
-  def _default_control_loop(self, controller_name: str):
-    """Default control loop implementation"""
-    config = self.controllers[controller_name]
-    while True:
+      self.set_state(name, 'connecting')
       try:
-        diagnostics = config.module.control_loop()
-
-        # Handle different diagnostic formats
-        if isinstance(diagnostics, dict):
-          if 'timestamp' in diagnostics and controller_name in ['bwk-onoff', 'pk-onoff', 'bhkw-onoff']:
-            # For on/off controllers, separate timestamp from data
-            timestamp = diagnostics.pop('timestamp')
-            entry = {'timestamp': timestamp, 'data': diagnostics}
-          else:
-            entry = diagnostics
-        else:
-          entry = diagnostics
-
-        self.add_diagnostic_entry(controller_name, entry)
-
+        if config.module is None:
+          config.module = config.factory()
+      except Exception as e:
+        self.set_state(name, 'failed', repr(e))
+        print(f"Failed to create {name}: {e!r}")
+        continue
+      connections.setdefault(config.module.plc.shared, []).append(name)
+    # one health check per PLC, in parallel
+    for shared, names in connections.items():
+      threading.Thread(target=self._start_when_running, args=(shared, names),
+                       name=f'startup-{shared.label}', daemon=True).start()
+
+  def _start_when_running(self, shared, controller_names: List[str]):
+    if not shared.wait_until_running(stopped=self.stopped):
+      return
+    for name in controller_names:
+      # a group member stays connecting until the last member is up and the group task is added
+      members = self._ready_to_schedule(name)
+      if not members:
+        continue
+      try:
+        self._schedule_controller(name)
       except Exception as e:
-        print(f"Error in {controller_name} control loop: {e}")
+        for member in members:
+          self.set_state(member, 'failed', repr(e))
+        print(f"Failed to start {name}: {e!r}")
+        continue
+      for member in members:
+        self.set_state(member, 'running')
+
+  def _group_of(self, controller_name: str):
+    return next(((group_name, names) for group_name, names in self.groups.items() if controller_name in names), None)
+
+  def _ready_to_schedule(self, controller_name: str) -> List[str]:
+    """Mark a controller as up; returns the controllers to schedule now, none while its group waits for others"""
+    with self.startup_lock:
+      self.started.add(controller_name)
+      group = self._group_of(controller_name)
+      if group is None:
+        return [controller_name]
+      if not all(name in self.started or self.states[name]['state'] == 'failed' for name in group[1]):
+        return []
+      return [name for name in group[1] if name in self.started]
+
+  def _schedule_controller(self, controller_name: str):
+    """Add the task of a controller, or of its group"""
+    config = self.controllers[controller_name]
+    group = self._group_of(controller_name)
+    if group is not None:
+      group_name, names = group
+      if self.event_loop or all(self.controllers[name].event_loop for name in names):
+        self.scheduler.add_task(group_name, self.controllers[names[0]].sleep_interval,
+                                lambda names=names: self._run_group_async(names), is_async=True)
+      else:
+        self.scheduler.add_task(group_name, self.controllers[names[0]].sleep_interval,
+                                lambda names=names: self._run_group(names))
+    elif self.event_loop or config.event_loop:
+      setup = (lambda: config.setup(config.module)) if config.setup else None
+      self.scheduler.add_task(controller_name, config.sleep_interval,
+                              lambda name=controller_name: self._run_control_loop_async(name),
+                              is_async=True, setup=setup)
+    else:
+      self.scheduler.add_task(controller_name, config.sleep_interval,
+                              lambda name=controller_name: self._run_control_loop(name))
+
+  def _run_control_loop(self, controller_name: str):
+    """Run one control cycle and record its diagnostics"""
+    config = self.controllers[controller_name]
+    try:
+      self._record_cycle(controller_name, config.module.control_loop())
+    except Exception as e:
+      self._control_loop_failed(controller_name, e)
 
-      time.sleep(config.sleep_interval)
+  async def _run_control_loop_async(self, controller_name: str):
+    """Run one control cycle on the event loop, with its PLC I/O in the I/O executor"""
+    config = self.controllers[controller_name]
+    try:
+      self._record_cycle(controller_name, await config.module.control_loop_async(self.io_executor))
+    except Exception as e:
+      self._control_loop_failed(controller_name, e)
+
+  def _record_cycle(self, controller_name: str, diagnostics):
+    # Handle different diagnostic formats
+    if isinstance(diagnostics, dict):
+      if 'timestamp' in diagnostics and controller_name in ['bwk-onoff', 'pk-onoff', 'bhkw-onoff']:
+        # For on/off controllers, separate timestamp from data
+        timestamp = diagnostics.pop('timestamp')
+        entry = {'timestamp': timestamp, 'data': diagnostics}
+      else:
+        entry = diagnostics
+    else:
+      entry = diagnostics
+
+    self.add_diagnostic_entry(controller_name, entry)
+
+  def _control_loop_failed(self, controller_name: str, e: Exception):
+    loop_errors.labels(controller_name).inc()
+    print(f"Error in {controller_name} control loop: {e}")
+
+  def collect_metrics(self):
+    """Diagnostics buffer and scheduler values, for the metrics registry"""
+    buffers = list(self.diagnostics.items())
+    yield ('diagnostics_buffer_entries', 'Entries in the in-memory diagnostics history', 'gauge',
+           [({'controller': name}, len(buffer)) for name, buffer in buffers])
+    yield ('diagnostics_buffer_bytes', 'Memory of the in-memory diagnostics history', 'gauge',
+           [({'controller': name}, buffer.nbytes()) for name, buffer in buffers])
+    tasks = list(self.scheduler.stats().items())
+    yield ('scheduler_overruns_total', 'Deadlines skipped because the previous run was still busy', 'counter',
+           [({'task': name}, stats['overruns']) for name, stats in tasks])
+    yield ('scheduler_missed_total', 'Periods skipped because the scheduler fell behind', 'counter',
+           [({'task': name}, stats['missed']) for name, stats in tasks])
+
+  def _run_group(self, controller_names: List[str]):
+    """Run one cycle of a group of controllers sharing one tick"""
+    for controller_name in controller_names:
+      if self.controllers[controller_name].module is not None:
+        self._run_control_loop(controller_name)
+
+  async def _run_group_async(self, controller_names: List[str]):
+    for controller_name in controller_names:
+      if self.controllers[controller_name].module is not None:
+        await self._run_control_loop_async(controller_name)
 
 # Initialize Flask app and controller manager
 app = Flask(__name__)
 app.template_folder = 'templates'
 app.static_folder = 'static'
 
-controller_manager = ControllerManager()
+# CONTROL_EVENT_LOOP=1 runs all controllers on one asyncio loop, with the PLC I/O in threads
+controller_manager = ControllerManager(event_loop=os.getenv('CONTROL_EVENT_LOOP', '0') == '1')
+metrics.registry.collector(controller_manager.collect_metrics)
 
 # Controller configurations
 CONTROLLER_CONFIGS = [
   ControllerConfig(
     name="return-mixin",
     title="Return Mix-in",
-    module=return_mixin,
+    factory=return_mixin.create,
     sleep_interval=5,
     template="return_mixin.html"
   ),
   ControllerConfig(
     name="bwk-onoff",
     title="BWK On/Off Control",
-    module=bwk_onoff,
+    factory=bwk_onoff.create,
     template="onoff_control.html"
   ),
   ControllerConfig(
     name="pk-onoff",
     title="PK On/Off Control",
-    module=pk_onoff,
+    factory=pk_onoff.create,
     template="onoff_control.html"
   ),
   ControllerConfig(
     name="bhkw-onoff",
     title="BHKW On/Off Control",
-    module=bhkw_onoff,
+    factory=bhkw_onoff.create,
     template="onoff_control.html"
   ),
   ControllerConfig(
     name="restart-wp-11",
     title="Restart WP 11 Control",
-    module=restart_wp_11,
+    factory=restart_wp_11.create,
     sleep_interval=5,
     max_diagnostics=1000,
     template="restart_wp_11.html"
@@ -146,31 +330,22 @@ CONTROLLER_CONFIGS = [
   ControllerConfig(
     name="tww-11",
     title="TWW 11 Control",
-    module=tww_11,
+    factory=tww_11.create,
     max_diagnostics=1000,
     template="tww_11.html"
   )
 ]
 
-# Special handling for feed_121517
-def feed_121517_control_loop():
-  async def combined_loop():
-    await feed_121517.setup_mqtt()
-    while True:
-      diagnostics = feed_121517.control_loop()
-      controller_manager.add_diagnostic_entry("feed-121517", diagnostics)
-      await asyncio.sleep(30)
-
-  asyncio.run(combined_loop())
-
+# feed_121517 runs on the asyncio loop that also serves its MQTT client
 CONTROLLER_CONFIGS.append(
   ControllerConfig(
     name="feed-121517",
     title="Feed 12/15/17 Control",
-    module=feed_121517,
+    factory=feed_121517.create,
     max_diagnostics=1000,
     template="feed_121517.html",
-    control_loop_handler=feed_121517_control_loop
+    event_loop=True,
+    setup=feed_121517.Feed121517.setup_mqtt
   )
 )
 
@@ -178,11 +353,29 @@ CONTROLLER_CONFIGS.append(
 for config in CONTROLLER_CONFIGS:
   controller_manager.register_controller(config)
 
+controller_manager.attach_store(DiagnosticsStore(
+  os.getenv('DIAGNOSTICS_DB', os.path.join(os.path.dirname(__file__), 'diagnostics.sqlite3'))))
+history_query = HistoryQuery(controller_manager.store)
+
+# The on/off controllers share one plant state and decide in this order:
+# PK first, then BWK top-up, then BHKW, which yields to a producing PK
+controller_manager.register_group("plant-onoff", ["pk-onoff", "bwk-onoff", "bhkw-onoff"])
+
+@app.before_request
+def start_timer():
+  g.started = time.perf_counter()
+
+@app.after_request
+def record_duration(response):
+  if 'started' in g:
+    http_request_seconds.labels(request.endpoint, request.method, response.status_code).observe(time.perf_counter() - g.started)
+  return response
+
 @app.route('/')
 def home():
   """Home page with links to all controllers"""
   controllers = list(controller_manager.controllers.values())
-  return render_template('home.html', controllers=controllers)
+  return render_template('home.html', controllers=controllers, states=controller_manager.states)
 
 def create_routes():
   """Dynamically create routes for all controllers"""
@@ -194,7 +387,8 @@ def create_routes():
         return render_template(config.template,
                    title=config.title,
                    api_path=config.api_path,
-                   controller_name=config.name)
+                   controller_name=config.name,
+                   max_diagnostics=config.max_diagnostics)
       return view_handler
 
     app.add_url_rule(f'/{config.route_path}',
@@ -204,25 +398,105 @@ def create_routes():
     # Create diagnostics API route
     def make_diagnostics_handler(config):
       def diagnostics_handler():
-        return jsonify(controller_manager.get_diagnostics(config.name))
+        since = request.args.get('since', type=int)
+        if since is None:
+          return jsonify(controller_manager.get_diagnostics(config.name))
+        limit = request.args.get('limit', type=int)
+        return jsonify(controller_manager.get_diagnostics_since(config.name, since, limit))
       return diagnostics_handler
 
     app.add_url_rule(f'/api/{config.api_path}/diagnostics',
             f'get_{config.name}_diagnostics',
             make_diagnostics_handler(config))
 
+    # Create diagnostics history route
+    def make_history_handler(config):
+      def history_handler():
+        if controller_manager.store is None:
+          return jsonify({'error': 'no diagnostics store'}), 404
+        try:
+          start = parse_time(request.args.get('start'))
+          end = parse_time(request.args.get('end'))
+        except ValueError:
+          return jsonify({'error': 'start and end must be epoch seconds or ISO 8601'}), 400
+        if start is not None and end is not None and start > end:
+          return jsonify({'error': 'start is after end'}), 400
+        limit = request.args.get('limit', MAX_ROWS, type=int)
+        if limit < 1:
+          return jsonify({'error': 'limit must be positive'}), 400
+        rows = controller_manager.store.query(config.name, start, end, min(limit, MAX_ROWS))
+        return jsonify([{'ts': ts, 'data': entry} for ts, entry in rows])
+      return history_handler
+
+    app.add_url_rule(f'/api/{config.api_path}/history',
+            f'get_{config.name}_history',
+            make_history_handler(config))
+
+    # Create downsampled history route
+    def make_downsampled_history_handler(config):
+      def downsampled_history_handler():
+        fields = request.args.get('fields')
+        if not fields:
+          return jsonify({'error': 'fields missing'}), 400
+        try:
+          end = parse_time(request.args.get('end'))
+          start = parse_time(request.args.get('start'))
+        except ValueError:
+          return jsonify({'error': 'start and end must be epoch seconds or ISO 8601'}), 400
+        if end is None:
+          end = time.time()
+        if start is None:
+          start = end - 86400
+        if start > end:
+          return jsonify({'error': 'start is after end'}), 400
+        points = request.args.get('points', 500, type=int)
+        if points < 1:
+          return jsonify({'error': 'points must be positive'}), 400
+        points = min(points, MAX_POINTS)
+        method = request.args.get('method', 'minmax')
+        if method == 'lttb':
+          return jsonify(history_query.lttb(config.name, fields.split(','), start, end, points))
+        return jsonify(history_query.buckets(config.name, fields.split(','), start, end, points))
+      return downsampled_history_handler
+
+    app.add_url_rule(f'/api/{config.api_path}/history/downsampled',
+            f'get_{config.name}_downsampled_history',
+            make_downsampled_history_handler(config))
+
+    # Create diagnostics stream route
+    def make_diagnostics_stream_handler(config):
+      def diagnostics_stream_handler():
+        # browsers resume a dropped stream with the Last-Event-ID header
+        since = request.headers.get('Last-Event-ID', type=int)
+        if since is None:
+          since = request.args.get('since', 0, type=int)
+        return event_stream(controller_manager.stream_diagnostics(config.name, since))
+      return diagnostics_stream_handler
+
+    app.add_url_rule(f'/api/{config.api_path}/diagnostics/stream',
+            f'stream_{config.name}_diagnostics',
+            make_diagnostics_stream_handler(config))
+
+    # Create startup state route
+    def make_status_handler(config):
+      def status_handler():
+        return jsonify(controller_manager.states[config.name])
+      return status_handler
+
+    app.add_url_rule(f'/api/{config.api_path}/status',
+            f'{config.name}_status',
+            make_status_handler(config))
+
     # Create parameters API route
     def make_parameters_handler(config):
       def parameters_handler():
+        if config.module is None:
+          return jsonify(controller_manager.states[config.name]), 503
         if request.method == 'POST':
-          if hasattr(config.module, 'set_parameters'):
-            config.module.set_parameters(request.json)
-          else:
-            # Handle restart_wp_11 special case
-            params = request.get_json(force=True)
-            config.module.set_parameters(params)
-            return jsonify({'status': 'ok'})
-
+          params = request.get_json(silent=True)
+          if not isinstance(params, dict):
+            return jsonify({'error': 'parameters must be a JSON object'}), 400
+          config.module.set_parameters(params)
         return jsonify(config.module.get_parameters())
       return parameters_handler
 
@@ -231,6 +505,78 @@ def create_routes():
             make_parameters_handler(config),
             methods=['GET', 'POST'])
 
+    # Create parameters journal and rollback routes
+    def make_journal_handler(config):
+      def journal_handler():
+        if config.module is None:
+          return jsonify(controller_manager.states[config.name]), 503
+        return jsonify(config.module.parameter_store.entries(config.module.module_name))
+      return journal_handler
+
+    app.add_url_rule(f'/api/{config.api_path}/parameters/journal',
+            f'{config.name}_parameters_journal',
+            make_journal_handler(config))
+
+    def make_rollback_handler(config):
+      def rollback_handler():
+        if config.module is None:
+          return jsonify(controller_manager.states[config.name]), 503
+        body = request.get_json(silent=True) or {}
+        version = body.get('version') if isinstance(body, dict) else None
+        if not isinstance(version, int) or isinstance(version, bool):
+          return jsonify({'error': 'version must be an integer'}), 400
+        if not config.module.rollback_parameters(version):
+          return jsonify({'error': f'version {version} is not in the journal'}), 404
+        return jsonify(config.module.get_parameters())
+      return rollback_handler
+
+    app.add_url_rule(f'/api/{config.api_path}/parameters/rollback',
+            f'{config.name}_parameters_rollback',
+            make_rollback_handler(config),
+            methods=['POST'])
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+  """Parse a query time given as epoch seconds or ISO 8601 (local time unless an offset is given)"""
+  if value is None:
+    return None
+  try:
+    return float(value)
+  except ValueError:
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+def event_stream(events):
+  """Wrap a generator of server-sent events in a streaming response"""
+  return Response(stream_with_context(events), mimetype='text/event-stream',
+          headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/diagnostics/stream')
+def all_diagnostics_stream():
+  """Live diagnostics of all (or ?controllers=a,b) controllers in one stream"""
+  names = request.args.get('controllers')
+  return event_stream(controller_manager.stream_all_diagnostics(names.split(',') if names else None))
+
+@app.route('/api/status')
+def controller_states():
+  """Startup state of all controllers: stopped, connecting, running or failed"""
+  return jsonify(controller_manager.states)
+
+@app.route('/api/scheduler')
+def scheduler_stats():
+  """Jitter and overrun statistics of the scheduled control loops"""
+  return jsonify(controller_manager.scheduler.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+  """Cycle, ADS, scheduler, diagnostics and HTTP metrics in the Prometheus text format"""
+  return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/ads/stats', methods=['GET', 'DELETE'])
+def ads_statistics():
+  """ADS calls, latency percentiles, bytes and errors per module, method and symbol; DELETE starts over"""
+  if request.method == 'DELETE':
+    ads_stats.reset()
+  return jsonify(ads_stats.snapshot())
+
 # Create all routes
 create_routes()
 
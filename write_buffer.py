@@ -0,0 +1,54 @@
+import math
+import clock
+
+def same_value(read, written):
+  # REAL symbols read back rounded to single precision
+  if isinstance(read, float) or isinstance(written, float):
+    return math.isclose(read, written, rel_tol=1e-6, abs_tol=1e-6)
+  return read == written
+
+class WriteBuffer:
+  """Collects a module's PLC writes during a cycle and commits the changed ones in one sum-write"""
+
+  def __init__(self, plc, refresh_interval=60):
+    self.plc = plc
+    self.refresh_interval = refresh_interval # seconds after which unchanged values are written again
+    self.pending = {}
+    self.confirmed = {} # name -> (value, monotonic time of the last successful write)
+    self.requested = {} # all writes of the last commit, changed or not
+
+  def write(self, name, value):
+    self.pending[name] = value
+
+  def is_confirmed(self, name, value, now, read=None):
+    """Whether value was written within the refresh interval and, if read this cycle, nobody changed it since"""
+    if name not in self.confirmed:
+      return False
+    confirmed_value, confirmed_time = self.confirmed[name]
+    if read is not None and name in read and not same_value(read[name], confirmed_value):
+      return False
+    return confirmed_value == value and now - confirmed_time < self.refresh_interval
+
+  def commit(self, read=None):
+    """Write the pending values that are not confirmed; read holds the values read this cycle"""
+    pending, self.pending = self.pending, {}
+    self.requested = pending
+    now = clock.monotonic()
+    writes = {name: value for name, value in pending.items() if not self.is_confirmed(name, value, now, read)}
+    if not writes:
+      return writes
+    results = self.plc.write_list_by_name(writes)
+    for name, value in writes.items():
+      if results.get(name) == 'no error':
+        self.confirmed[name] = (value, now)
+      else:
+        self.confirmed.pop(name, None)
+        print(f"Failed to write {name}: {results.get(name)}")
+    return writes
+
+  def discard(self):
+    self.pending = {}
+
+  def invalidate(self):
+    self.pending = {}
+    self.confirmed = {}